@@ -0,0 +1,197 @@
+"""
+Benchmark de los modos de extracción contra la réplica local (`sitio_simulado`).
+
+Uso (desde la carpeta Extraccion):
+    python -m utils.benchmark_crawl --marcas 10 --paginas 5 --latencia 0.05 --prob-429 0.02
+
+Para cada modo muestra páginas/segundo, latencia p50/p99, los 429 y errores de red
+que ha encontrado, cuántos reintentos ha hecho y si ha conseguido todos los
+anuncios y detalles del sitio pese a los fallos.
+"""
+import os
+import time
+import argparse
+import tempfile
+import requests
+import pandas as pd
+
+from utils.parseo import HEADERS, extraer_marcas, url_pagina, parsear_listado, parsear_detalles
+from utils.ritmo import ControladorRitmo, peticion
+from utils.sitio_simulado import SitioSimulado, RUTA_PORTADA
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+
+def _listados_secuencial(marcas, controlador, dominio):
+    """El bucle de `extraer_anuncios_de_marca` (01_extraccion_anuncios) con deduplicado global"""
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+    anuncios_totales = []
+    urls_vistas_global = set()
+    for marca, url_base in marcas.items():
+        urls_vistas = set()
+        num_paginas = 1
+        pagina = 1
+        while pagina <= num_paginas:
+            try:
+                resp = peticion(sesion, url_pagina(url_base, pagina), controlador, timeout=10)
+            except requests.RequestException:
+                break
+            if resp.status_code != 200:
+                break
+            num_paginas_html, nuevos = parsear_listado(resp.text, marca, urls_vistas, dominio)
+            if pagina == 1:
+                num_paginas = num_paginas_html
+            if not nuevos:
+                break
+            for anuncio in nuevos:
+                if anuncio["id_extraccion"] not in urls_vistas_global:
+                    anuncios_totales.append(anuncio)
+                    urls_vistas_global.add(anuncio["id_extraccion"])
+            pagina += 1
+    sesion.close()
+    return anuncios_totales
+
+
+def _detalles_secuencial(urls, controlador):
+    """El bucle de `extraer_detalles` (02_extraccion_detalles) URL a URL"""
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+    completos = 0
+    for url in urls:
+        try:
+            resp = peticion(sesion, url, controlador, timeout=10)
+            resp.raise_for_status()
+        except requests.RequestException:
+            continue
+        if parsear_detalles(resp.text)["detalles_ficha"]:
+            completos += 1
+    sesion.close()
+    return completos
+
+
+def modo_secuencial(marcas, controlador, dominio, carpeta, workers):
+    anuncios = _listados_secuencial(marcas, controlador, dominio)
+    completos = _detalles_secuencial([a["url"] for a in anuncios], controlador)
+    return len(anuncios), completos
+
+
+def modo_async_frontera(marcas, controlador, dominio, carpeta, workers):
+    """Listados con `crawler_async` y detalles con la frontera SQLite"""
+    from utils.crawler_async import extraer_anuncios
+    from utils.frontera import procesar_frontera, HECHO
+
+    anuncios = extraer_anuncios(marcas, dominio=dominio, controlador=controlador)
+    conteo = procesar_frontera([a["url"] for a in anuncios], ruta=os.path.join(carpeta, "frontera.db"),
+                               num_workers=workers, controlador=controlador)
+    return len(anuncios), conteo.get(HECHO, 0)
+
+
+def modo_pipeline(marcas, controlador, dominio, carpeta, workers):
+    from utils.pipeline import ejecutar_pipeline
+
+    csv_salida = os.path.join(carpeta, "anuncios_completo.csv")
+    total = ejecutar_pipeline(marcas, csv_salida, os.path.join(carpeta, "anuncios.csv"),
+                              num_workers=workers, controlador=controlador, dominio=dominio)
+    if not total:
+        return 0, 0
+    df = pd.read_csv(csv_salida)
+    return total, int((df["detalles_ficha"] != "[]").sum())
+
+
+def preparar_incremental(marcas, dominio, carpeta):
+    """La primera pasada llena las huellas y los ETag; no se mide"""
+    from utils.incremental import extraer_anuncios_incremental
+
+    extraer_anuncios_incremental(marcas, os.path.join(carpeta, "huellas.db"),
+                                 ControladorRitmo(ritmo_inicial=500.0, ritmo_max=500.0), dominio=dominio)
+
+
+def modo_incremental(marcas, controlador, dominio, carpeta, workers):
+    """Segunda pasada incremental: las páginas sin cambios vuelven como 304"""
+    from utils.incremental import extraer_anuncios_incremental, conectar, ACTIVO
+
+    ruta = os.path.join(carpeta, "huellas.db")
+    extraer_anuncios_incremental(marcas, ruta, controlador, dominio=dominio)
+    conn = conectar(ruta)
+    activos = conn.execute("SELECT COUNT(*) FROM anuncios WHERE estado = ?", (ACTIVO,)).fetchone()[0]
+    conn.close()
+    return activos, None
+
+
+# modo: (preparación sin medir, extracción medida)
+MODOS = {
+    "secuencial": (None, modo_secuencial),
+    "async_frontera": (None, modo_async_frontera),
+    "pipeline": (None, modo_pipeline),
+    "incremental": (preparar_incremental, modo_incremental),
+}
+
+
+def ejecutar(modos=tuple(MODOS), num_marcas=10, paginas=5, anuncios=20, latencia=0.0, prob_429=0.0,
+             prob_timeout=0.0, ritmo=50.0, ritmo_max=500.0, workers=8):
+    resultados = []
+    with SitioSimulado(num_marcas, paginas, anuncios, latencia=latencia, prob_429=prob_429,
+                       retry_after=0.2, prob_timeout=prob_timeout) as sitio:
+        dominio = sitio.dominio
+        marcas = extraer_marcas(requests.get(dominio + RUTA_PORTADA).text, dominio)
+        esperados = len(sitio.anuncios_esperados())
+
+        for modo in modos:
+            preparar, extraer = MODOS[modo]
+            controlador = ControladorRitmo(ritmo_inicial=ritmo, ritmo_max=ritmo_max, espera_base=0.1, espera_max=2.0)
+            with tempfile.TemporaryDirectory() as carpeta:
+                try:
+                    if preparar is not None:
+                        preparar(marcas, dominio, carpeta)
+                    antes = sitio.estadisticas.copy()
+                    inicio = time.perf_counter()
+                    n_anuncios, n_detalles = extraer(marcas, controlador, dominio, carpeta, workers)
+                except ImportError as e:
+                    print(f"{modo}: se omite ({e})")
+                    continue
+                duracion = time.perf_counter() - inicio
+
+            servidor = sitio.estadisticas - antes
+            r = controlador.resumen()
+            fila = {
+                "modo": modo,
+                "segundos": round(duracion, 2),
+                "peticiones": r["peticiones"],
+                "paginas_por_segundo": round(r["peticiones"] / duracion, 1) if duracion else None,
+                "p50_ms": round(1000 * _percentil(controlador.latencias, 0.50), 1) if controlador.latencias else None,
+                "p99_ms": round(1000 * _percentil(controlador.latencias, 0.99), 1) if controlador.latencias else None,
+                "429": r["codigos"].get(429, 0),
+                "errores_red": r["codigos"].get(None, 0),
+                "reintentos": r["reintentos"],
+                "304": servidor.get(304, 0),
+                "anuncios": f"{n_anuncios}/{esperados}",
+                "detalles": f"{n_detalles}/{esperados}" if n_detalles is not None else "-",
+            }
+            resultados.append(fila)
+
+    df = pd.DataFrame(resultados)
+    print()
+    print(df.to_string(index=False))
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de los modos de extracción sin red")
+    parser.add_argument("--modos", nargs="+", default=list(MODOS), choices=list(MODOS))
+    parser.add_argument("--marcas", type=int, default=10)
+    parser.add_argument("--paginas", type=int, default=5)
+    parser.add_argument("--anuncios", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.0, help="Latencia media del servidor en segundos")
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    parser.add_argument("--prob-timeout", type=float, default=0.0)
+    parser.add_argument("--ritmo", type=float, default=50.0, help="Ritmo inicial del controlador (pet/s)")
+    parser.add_argument("--ritmo-max", type=float, default=500.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    ejecutar(args.modos, args.marcas, args.paginas, args.anuncios, args.latencia, args.prob_429,
+             args.prob_timeout, args.ritmo, args.ritmo_max, args.workers)
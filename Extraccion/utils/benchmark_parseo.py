@@ -0,0 +1,89 @@
+"""
+Benchmark de los backends de parseo sobre páginas guardadas en disco.
+
+Uso (desde la carpeta Extraccion):
+    python -m utils.benchmark_parseo --detalles paginas/detalles --listados paginas/listados
+
+Para cada backend muestra páginas/segundo y si su salida coincide con la del
+parser de referencia (html.parser).
+"""
+import os
+import time
+import argparse
+
+from utils.parseo import BACKENDS, parsear_listado, parsear_detalles
+
+REFERENCIA = "html.parser"
+
+
+def leer_paginas(carpeta):
+    paginas = []
+    if not carpeta:
+        return paginas
+    for archivo in sorted(os.listdir(carpeta)):
+        if archivo.endswith(".html"):
+            with open(os.path.join(carpeta, archivo), "r", encoding="utf-8") as f:
+                paginas.append((archivo, f.read()))
+    return paginas
+
+
+def _sin_timestamp(resultado):
+    num_paginas, anuncios = resultado
+    return num_paginas, [{k: v for k, v in a.items() if k != "timestamp_extraccion"} for a in anuncios]
+
+
+def _parsear(tipo, html, backend):
+    if tipo == "listado":
+        return _sin_timestamp(parsear_listado(html, "MARCA", set(), backend=backend))
+    return parsear_detalles(html, backend=backend)
+
+
+def medir(tipo, paginas, backend, repeticiones):
+    """Devuelve páginas/segundo del mejor de `repeticiones` pasadas"""
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        for _, html in paginas:
+            _parsear(tipo, html, backend)
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return len(paginas) / mejor if mejor > 0 else float("inf")
+
+
+def comprobar_paridad(tipo, paginas, backend):
+    """Lista de páginas en las que el backend no da lo mismo que el parser de referencia"""
+    return [
+        archivo for archivo, html in paginas
+        if _parsear(tipo, html, backend) != _parsear(tipo, html, REFERENCIA)
+    ]
+
+
+def ejecutar(carpeta_detalles=None, carpeta_listados=None, repeticiones=3):
+    resultados = []
+    for tipo, carpeta in [("detalle", carpeta_detalles), ("listado", carpeta_listados)]:
+        paginas = leer_paginas(carpeta)
+        if not paginas:
+            continue
+        for backend in BACKENDS:
+            velocidad = medir(tipo, paginas, backend, repeticiones)
+            distintas = comprobar_paridad(tipo, paginas, backend) if backend != REFERENCIA else []
+            resultados.append({
+                "tipo": tipo,
+                "backend": backend,
+                "paginas": len(paginas),
+                "paginas_por_segundo": round(velocidad, 1),
+                "distintas": len(distintas),
+            })
+            print(f"{tipo:8} {backend:12} {velocidad:10.1f} pág/s   "
+                  f"{len(paginas)} páginas, {len(distintas)} distintas a {REFERENCIA}")
+            for archivo in distintas[:10]:
+                print(f"    distinta: {archivo}")
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de backends de parseo")
+    parser.add_argument("--detalles", help="Carpeta con páginas de detalle (.html)")
+    parser.add_argument("--listados", help="Carpeta con páginas de listado (.html)")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+    ejecutar(args.detalles, args.listados, args.repeticiones)
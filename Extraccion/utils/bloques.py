@@ -0,0 +1,148 @@
+import os
+import json
+import sqlite3
+import tempfile
+import pandas as pd
+
+from utils.campos import COLUMNAS_DETALLE, campos_detalle
+
+TAMANO_LOTE = 50_000
+
+
+def _registro(resultado):
+    """Resultado de detalle con sus campos tipados (los bloques antiguos no los traen: se calculan)"""
+    registro = {
+        "url": resultado["url"],
+        "detalles_ficha": resultado.get("detalles_ficha") or [],
+        "precios": resultado.get("precios") or []
+    }
+    if all(c in resultado for c in COLUMNAS_DETALLE):
+        registro.update((c, resultado[c]) for c in COLUMNAS_DETALLE[2:])
+    else:
+        registro.update(campos_detalle(registro["detalles_ficha"], registro["precios"]))
+    return registro
+
+
+class EscritorBloque:
+    """
+    Fichero de bloque en formato JSON Lines: un resultado por línea, añadido y
+    volcado a disco en cuanto se obtiene. Si el proceso se cae, como mucho se
+    pierde la última línea a medias (que `leer_bloques` ignora).
+    """
+
+    def __init__(self, ruta, modo="w"):
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        self.ruta = ruta
+        self._f = open(ruta, modo, encoding="utf-8")
+
+    def escribir(self, resultado):
+        self._f.write(json.dumps(_registro(resultado), ensure_ascii=False) + "\n")
+        self._f.flush()
+
+    def cerrar(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def escribir_bloques(resultados, carpeta, tamano_bloque, prefijo="bloque"):
+    """
+    Escribe los resultados de detalle ({url, detalles_ficha, precios, campos tipados}) en ficheros
+    `<prefijo>_N.jsonl` de `tamano_bloque` elementos.
+    `resultados` puede ser cualquier iterable; se consume sin cargarlo entero.
+    """
+    n_bloques = 0
+    escritor = None
+    for i, resultado in enumerate(resultados):
+        if i % tamano_bloque == 0:
+            if escritor is not None:
+                escritor.cerrar()
+            n_bloques += 1
+            escritor = EscritorBloque(os.path.join(carpeta, f"{prefijo}_{n_bloques}.jsonl"))
+        escritor.escribir(resultado)
+    if escritor is not None:
+        escritor.cerrar()
+
+    print(f"{n_bloques} bloques escritos en {carpeta}")
+    return n_bloques
+
+
+def leer_bloques(carpeta):
+    """
+    Recorre uno a uno los resultados de todos los bloques de la carpeta, en orden
+    de nombre. Lee tanto el formato actual (.jsonl) como los bloques .json antiguos.
+    """
+    for archivo in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, archivo)
+        if archivo.endswith(".jsonl"):
+            with open(ruta, "r", encoding="utf-8") as f:
+                for n_linea, linea in enumerate(f, start=1):
+                    if not linea.strip():
+                        continue
+                    try:
+                        yield json.loads(linea)
+                    except json.JSONDecodeError:
+                        print(f"Línea {n_linea} incompleta en {archivo}, se ignora")
+        elif archivo.endswith(".json"):
+            with open(ruta, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+
+
+# Una URL puede salir varias veces (modo incremental, reintentos de detalles que fallaron,
+# bloques retomados tras un corte): gana la última con ficha y una vacía nunca pisa a una buena
+_INSERTAR_DETALLE = """
+    INSERT INTO detalles VALUES (?, ?, ?) ON CONFLICT(url) DO UPDATE
+    SET datos = excluded.datos, con_ficha = excluded.con_ficha
+    WHERE excluded.con_ficha OR NOT detalles.con_ficha
+"""
+
+
+def _indexar_detalles(carpeta, conn):
+    """Vuelca los bloques a una tabla SQLite en disco con clave `url` (gana el último con ficha)"""
+    conn.execute("CREATE TABLE detalles (url TEXT PRIMARY KEY, datos TEXT, con_ficha INTEGER)")
+    lote = []
+    for registro in leer_bloques(carpeta):
+        registro = _registro(registro)
+        url = str(registro.pop("url"))
+        lote.append((url, json.dumps(registro, ensure_ascii=False), bool(registro["detalles_ficha"])))
+        if len(lote) >= 10_000:
+            conn.executemany(_INSERTAR_DETALLE, lote)
+            lote = []
+    conn.executemany(_INSERTAR_DETALLE, lote)
+    conn.commit()
+
+
+def unir_datos_por_lotes(csv_principal, carpeta_bloques, csv_salida, tamano_lote=TAMANO_LOTE):
+    """
+    Une cada anuncio del CSV principal con su detalle de los bloques por `url` (left join;
+    si una URL sale en varios bloques, el último con ficha) sin tener nada entero en memoria:
+    los detalles se indexan por `url` en un SQLite temporal y el CSV principal se lee
+    y se escribe por lotes de `tamano_lote` filas. Devuelve el número de filas escritas.
+    """
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "detalles.db"))
+        _indexar_detalles(carpeta_bloques, conn)
+
+        for i, df_base in enumerate(pd.read_csv(csv_principal, chunksize=tamano_lote)):
+            df_base["url"] = df_base["url"].astype(str)
+
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS claves (url TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM claves")
+            conn.executemany("INSERT OR IGNORE INTO claves VALUES (?)", ((u,) for u in df_base["url"]))
+            filas = conn.execute(
+                "SELECT d.url, d.datos FROM claves c JOIN detalles d ON d.url = c.url"
+            ).fetchall()
+            df_detalles = pd.DataFrame([{"url": url, **json.loads(datos)} for url, datos in filas],
+                                       columns=["url"] + COLUMNAS_DETALLE)
+
+            df_final = df_base.merge(df_detalles, on="url", how="left")
+            df_final.to_csv(csv_salida, mode="w" if i == 0 else "a", header=(i == 0),
+                            index=False, encoding="utf-8")
+            total += len(df_final)
+        conn.close()
+    return total
@@ -0,0 +1,191 @@
+import os
+import gzip
+import time
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.parseo import DOMINIO, parsear_listado, parsear_detalles
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CARPETA_CACHE = "cache_html"
+
+LISTADO = "listado"
+DETALLE = "detalle"
+
+
+def _comprimir(datos):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(datos), ".zst"
+    return gzip.compress(datos, compresslevel=6), ".gz"
+
+
+def _leer_objeto(ruta):
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    if ruta.endswith(".zst"):
+        return zstandard.ZstdDecompressor().decompress(datos).decode("utf-8")
+    return gzip.decompress(datos).decode("utf-8")
+
+
+class CacheHTML:
+    """
+    Almacén local de todas las páginas descargadas.
+    El contenido se guarda comprimido (zstd si está instalado, si no gzip) y
+    direccionado por su SHA-256, así que una página que no cambia entre
+    ejecuciones ocupa lo mismo que una sola copia. Un índice SQLite relaciona
+    cada (url, fecha de descarga) con su contenido.
+    """
+
+    def __init__(self, carpeta=CARPETA_CACHE):
+        self.carpeta = carpeta
+        os.makedirs(os.path.join(carpeta, "objetos"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(carpeta, "indice.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS paginas (
+                url TEXT NOT NULL,
+                fecha REAL NOT NULL,
+                tipo TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                ruta TEXT NOT NULL,
+                marca TEXT,
+                pagina INTEGER,
+                PRIMARY KEY (url, fecha)
+            );
+            CREATE INDEX IF NOT EXISTS idx_paginas_tipo ON paginas (tipo, url, fecha);
+        """)
+
+    def guardar(self, url, html, tipo, marca=None, pagina=None):
+        """Guarda una página descargada y devuelve su hash"""
+        datos = html.encode("utf-8")
+        sha = hashlib.sha256(datos).hexdigest()
+        relativa = self._ruta_existente(sha)
+        if relativa is None:
+            comprimido, extension = _comprimir(datos)
+            relativa = os.path.join("objetos", sha[:2], sha + extension)
+            destino = os.path.join(self.carpeta, relativa)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporal = f"{destino}.{threading.get_ident()}.tmp"
+            with open(temporal, "wb") as f:
+                f.write(comprimido)
+            os.replace(temporal, destino)
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO paginas (url, fecha, tipo, sha256, ruta, marca, pagina) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, time.time(), tipo, sha, relativa, marca, pagina),
+            )
+            self._conn.commit()
+        return sha
+
+    def _ruta_existente(self, sha):
+        for extension in (".zst", ".gz"):
+            relativa = os.path.join("objetos", sha[:2], sha + extension)
+            if os.path.exists(os.path.join(self.carpeta, relativa)):
+                return relativa
+        return None
+
+    def leer(self, url):
+        """Última versión guardada de una URL (o None)"""
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT ruta FROM paginas WHERE url = ? ORDER BY fecha DESC LIMIT 1", (url,)
+            ).fetchone()
+        return _leer_objeto(os.path.join(self.carpeta, fila[0])) if fila else None
+
+    def ultimas(self, tipo, desde=0, hasta=None):
+        """
+        Última descarga de cada URL de un tipo dentro de [desde, hasta] (timestamps).
+        Devuelve filas (url, fecha, ruta absoluta, marca, pagina).
+        """
+        hasta = hasta if hasta is not None else time.time()
+        with self._lock:
+            filas = self._conn.execute(
+                """SELECT url, MAX(fecha), ruta, marca, pagina FROM paginas
+                   WHERE tipo = ? AND fecha BETWEEN ? AND ?
+                   GROUP BY url ORDER BY MAX(fecha)""",
+                (tipo, desde, hasta),
+            ).fetchall()
+        return [(url, fecha, os.path.join(self.carpeta, ruta), marca, pagina)
+                for url, fecha, ruta, marca, pagina in filas]
+
+    def cerrar(self):
+        self._conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Modo replay: volver a parsear la caché en todos los núcleos, sin red
+# ---------------------------------------------------------------------------
+
+def _reparsear_detalle(args):
+    url, ruta = args
+    return {"url": url, **parsear_detalles(_leer_objeto(ruta))}
+
+
+def _reparsear_listado(args):
+    ruta, marca, fecha, dominio = args
+    _, anuncios = parsear_listado(_leer_objeto(ruta), marca, set(), dominio)
+    # El timestamp es el de la descarga, no el del reparseo
+    marca_tiempo = datetime.fromtimestamp(fecha).isoformat()
+    for anuncio in anuncios:
+        anuncio["timestamp_extraccion"] = marca_tiempo
+    return anuncios
+
+
+def reprocesar_detalles(cache, procesos=None, desde=0, hasta=None):
+    """Vuelve a extraer los detalles de la última versión de cada página de detalle"""
+    tareas = [(url, ruta) for url, _, ruta, _, _ in cache.ultimas(DETALLE, desde, hasta)]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        resultados = list(pool.map(_reparsear_detalle, tareas, chunksize=64))
+    print(f"{len(resultados)} páginas de detalle reprocesadas")
+    return resultados
+
+
+def reprocesar_listados(cache, procesos=None, desde=0, hasta=None, dominio=DOMINIO):
+    """
+    Vuelve a extraer los anuncios de las páginas de listado guardadas.
+    Las páginas se parsean en paralelo y luego se recorren en orden por marca
+    con los mismos cortes y deduplicados que `extraer_anuncios_de_marca`.
+    Con `desde`/`hasta` se elige la ejecución a reproducir.
+    """
+    filas = cache.ultimas(LISTADO, desde, hasta)
+    # Las marcas en el orden en que se descargaron, y sus páginas en orden
+    primera_descarga = {}
+    for _, fecha, _, marca, _ in filas:
+        primera_descarga[marca] = min(fecha, primera_descarga.get(marca, fecha))
+    filas.sort(key=lambda f: (primera_descarga[f[3]], f[3] or "", f[4] or 0))
+    tareas = [(ruta, marca, fecha, dominio) for _, fecha, ruta, marca, _ in filas]
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        por_pagina = list(pool.map(_reparsear_listado, tareas, chunksize=16))
+
+    anuncios_totales = []
+    urls_vistas_global = set()
+    marca_actual, urls_vistas, cortada, pagina_esperada = None, set(), False, 1
+    for (_, _, _, marca, pagina), anuncios in zip(filas, por_pagina):
+        if marca != marca_actual:
+            marca_actual, urls_vistas, cortada, pagina_esperada = marca, set(), False, 1
+        # Un hueco en la numeración es una página que falló al descargar: ahí se cortó
+        if cortada or (pagina or 1) != pagina_esperada:
+            cortada = True
+            continue
+        pagina_esperada += 1
+        nuevos = [a for a in anuncios if a["url"] not in urls_vistas]
+        urls_vistas.update(a["url"] for a in nuevos)
+        if not nuevos:
+            cortada = True
+            continue
+        for anuncio in nuevos:
+            if anuncio["id_extraccion"] not in urls_vistas_global:
+                anuncios_totales.append(anuncio)
+                urls_vistas_global.add(anuncio["id_extraccion"])
+
+    print(f"{len(anuncios_totales)} anuncios reprocesados de {len(filas)} páginas de listado")
+    return anuncios_totales
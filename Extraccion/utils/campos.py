@@ -0,0 +1,115 @@
+"""
+Campos tipados que se sacan de las listas `tags`, `precios` y `detalles_ficha`
+en el momento de extraer, para que la limpieza no tenga que volver a parsear
+cada fila con `ast.literal_eval`.
+Las reglas (`comun/reglas.py`) son las mismas que usa la limpieza para los CSV
+antiguos; un valor que no aparece queda como None (NaN en el CSV).
+"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from comun.reglas import (COMBUSTIBLES, CLAVES_PRECIO, CARROCERIAS, RE_AÑO, RE_KM, RE_KM0, RE_NUMERO, RE_GARANTIA_NO,
+                          RE_GARANTIA_SI, RE_GARANTIA_MESES, RE_MATRICULACION, RE_MES, RE_POTENCIA, RE_PUERTAS,
+                          RE_ASIENTOS, normalizar_texto)
+
+COLUMNAS_TARJETA = ["es_demo", "es_km0", "año", "combustible", "kilometraje", "ubicacion"]
+COLUMNAS_PRECIOS = ["precio_contado", "precio_financiado", "precio_nuevo"]
+COLUMNAS_FICHA = ["garantia", "transmision", "matriculacion", "potencia_cv", "puertas", "asientos",
+                  "tipo_carroceria", "mes"]
+# Columnas que aporta la página de detalle, en el orden en que se escriben
+COLUMNAS_DETALLE = ["detalles_ficha", "precios"] + COLUMNAS_PRECIOS + COLUMNAS_FICHA
+
+
+def _primero(items, patron, convertir=int):
+    for item in items:
+        m = patron.search(item)
+        if m:
+            return convertir(m.group(1))
+    return None
+
+
+def campos_tarjeta(tags):
+    """Año, combustible, kilometraje, ubicación y marcas demo / km 0 de la tarjeta del listado"""
+    textos = [t for t in tags if isinstance(t, str)]
+    kilometraje = None
+    for t in textos:
+        m = RE_KM.match(t.lower())
+        if m:
+            kilometraje = float(m.group(1).replace(".", ""))
+            break
+    return {
+        "es_demo": int(any("demo" in str(t).lower() for t in tags)),
+        "es_km0": int(any(RE_KM0.search(str(t).lower()) for t in tags)),
+        "año": next((int(t) for t in textos if RE_AÑO.match(t)), None),
+        "combustible": next((t for t in textos if t in COMBUSTIBLES), None),
+        "kilometraje": kilometraje,
+        "ubicacion": tags[-1] if tags else None,
+    }
+
+
+def _numero(texto):
+    m = RE_NUMERO.search(texto)
+    digitos = m.group(0).replace(".", "") if m else ""
+    return int(digitos) if digitos else None
+
+
+def campos_precios(precios):
+    """Precio al contado, financiado y de venta nuevo en euros"""
+    campos = {}
+    for columna, clave in CLAVES_PRECIO.items():
+        texto = next((p for p in precios if clave in p), None)
+        campos[columna] = _numero(texto) if texto is not None else None
+    return campos
+
+
+def campos_ficha(detalles):
+    """Garantía (meses, 0 = sí sin plazo), transmisión, matriculación, potencia, puertas, asientos y carrocería"""
+    garantia = None
+    for detalle in detalles:
+        if "Garantía:" in detalle:
+            if RE_GARANTIA_NO.search(detalle):
+                garantia = None
+            elif RE_GARANTIA_SI.search(detalle):
+                garantia = 0
+            else:
+                m = RE_GARANTIA_MESES.search(detalle)
+                if not m:
+                    continue
+                garantia = int(m.group(1))
+            break
+
+    transmision = None
+    for detalle in detalles:
+        normalizado = normalizar_texto(detalle)
+        if normalizado == "automatico":
+            transmision = "Automático"
+            break
+        if normalizado == "manual":
+            transmision = "Manual"
+            break
+
+    # Si hay varias, gana la última (como en la limpieza original)
+    tipo_carroceria = None
+    for detalle in detalles:
+        tipo_carroceria = CARROCERIAS.get(detalle, tipo_carroceria)
+
+    return {
+        "garantia": garantia,
+        "transmision": transmision,
+        "matriculacion": _primero(detalles, RE_MATRICULACION, str),
+        "potencia_cv": _primero(detalles, RE_POTENCIA),
+        "puertas": _primero(detalles, RE_PUERTAS),
+        "asientos": _primero(detalles, RE_ASIENTOS),
+        "tipo_carroceria": tipo_carroceria,
+        "mes": _primero(detalles, RE_MES),
+    }
+
+
+def campos_detalle(detalles_ficha, precios):
+    return {**campos_precios(precios), **campos_ficha(detalles_ficha)}
+
+
+def detalles_vacios():
+    """Resultado de detalle cuando la página no se ha podido descargar"""
+    return {"detalles_ficha": [], "precios": [], **campos_detalle([], [])}
@@ -0,0 +1,100 @@
+import asyncio
+import aiohttp
+
+from utils.parseo import HEADERS, DOMINIO, url_pagina, parsear_listado
+from utils.ritmo import ControladorRitmo, peticion_async, traza_conexiones
+from utils.cache_html import LISTADO
+
+# Límites de peticiones en vuelo: globales y por host
+MAX_CONCURRENCIA = 16
+MAX_POR_HOST = 8
+TIMEOUT = 30
+# Páginas del listado de una marca que se piden a la vez
+VENTANA_PAGINAS = 8
+
+
+async def _guardar_en_cache(cache, url, html, marca, pagina):
+    """`cache.guardar` en un hilo: comprime y escribe en disco sin parar el bucle de eventos"""
+    await asyncio.get_running_loop().run_in_executor(None, cache.guardar, url, html, LISTADO, marca, pagina)
+
+
+async def _extraer_marca(sesion, controlador, marca, url_base, dominio, cache, ventana):
+    print(f"\nExtrayendo anuncios para {marca}...")
+
+    status, html = await peticion_async(sesion, url_base, controlador)
+    if status != 200:
+        print(f"Error HTTP {status} al cargar la primera página de {marca}")
+        return []
+    if cache is not None:
+        await _guardar_en_cache(cache, url_base, html, marca, 1)
+    urls_vistas = set()
+    num_paginas, anuncios = parsear_listado(html, marca, urls_vistas, dominio)
+    print(f"  {marca}: {num_paginas} páginas")
+    if not anuncios:
+        return anuncios
+
+    # La primera página ya está descargada; el resto se pide de `ventana` en `ventana`
+    # páginas a la vez, y en cuanto una ventana llega al corte no se piden más
+    for desde in range(2, num_paginas + 1, ventana):
+        paginas = range(desde, min(desde + ventana, num_paginas + 1))
+        respuestas = await asyncio.gather(*(
+            peticion_async(sesion, url_pagina(url_base, pagina), controlador) for pagina in paginas
+        ))
+
+        # Se recorren las páginas en orden con los mismos cortes que el modo secuencial,
+        # así las filas resultantes son las mismas
+        for pagina, (status, html) in zip(paginas, respuestas):
+            if status != 200:
+                print(f"  Error HTTP {status} en la página {pagina} de {marca}")
+                return anuncios
+            if cache is not None:
+                await _guardar_en_cache(cache, url_pagina(url_base, pagina), html, marca, pagina)
+            _, nuevos = parsear_listado(html, marca, urls_vistas, dominio)
+            if not nuevos:
+                print(f"  {marca}: no se encontraron más anuncios en la página {pagina}.")
+                return anuncios
+            anuncios.extend(nuevos)
+
+    return anuncios
+
+
+async def extraer_anuncios_async(marcas, max_concurrencia=MAX_CONCURRENCIA,
+                                 max_por_host=MAX_POR_HOST, dominio=DOMINIO, controlador=None, cache=None,
+                                 ventana=VENTANA_PAGINAS):
+    """
+    Extrae los anuncios de todas las marcas a la vez.
+    Usa una única sesión con conexiones keep-alive reutilizadas, limitada a
+    `max_concurrencia` peticiones en vuelo en total y `max_por_host` por host.
+    El ritmo de peticiones lo marca `controlador` (uno nuevo si no se pasa).
+    Si se pasa una `cache` (CacheHTML), cada página descargada se guarda en ella (en un
+    hilo aparte, para no bloquear las demás descargas).
+    Las páginas de cada marca se piden en ventanas de `ventana`: si el listado se acaba
+    antes de lo que decía la primera página, como mucho se pide una ventana de más.
+    Devuelve la misma lista de anuncios que el bucle secuencial del notebook.
+    """
+    if controlador is None:
+        controlador = ControladorRitmo()
+    conector = aiohttp.TCPConnector(limit=max_concurrencia, limit_per_host=max_por_host)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    async with aiohttp.ClientSession(headers=HEADERS, connector=conector, timeout=timeout,
+                                     trace_configs=[traza_conexiones()]) as sesion:
+        resultados = await asyncio.gather(*(
+            _extraer_marca(sesion, controlador, marca, url, dominio, cache, ventana) for marca, url in marcas.items()
+        ))
+
+    controlador.informe()
+
+    # Deduplicado global respetando el orden de las marcas
+    anuncios_totales = []
+    urls_vistas_global = set()
+    for anuncios_marca in resultados:
+        for anuncio in anuncios_marca:
+            if anuncio["id_extraccion"] not in urls_vistas_global:
+                anuncios_totales.append(anuncio)
+                urls_vistas_global.add(anuncio["id_extraccion"])
+    return anuncios_totales
+
+
+def extraer_anuncios(marcas, **kwargs):
+    """Versión síncrona para ejecutar fuera de Jupyter (en el notebook usar `await`)"""
+    return asyncio.run(extraer_anuncios_async(marcas, **kwargs))
@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import struct
+import hashlib
+import threading
+
+RUTA_DEDUPE = "urls_descargadas.bloom"
+CAPACIDAD = 5_000_000
+PROB_FALSO_POSITIVO = 0.001
+# Se guarda el filtro cuando pasan GUARDAR_CADA_S segundos desde el último guardado,
+# o antes si se acumulan GUARDAR_CADA registros sin guardar
+GUARDAR_CADA = 10_000
+GUARDAR_CADA_S = 30
+
+_CABECERA = b"BLOOM1"
+
+
+class FiltroBloom:
+    """
+    Conjunto aproximado de URLs en un array de bits de tamaño fijo.
+    Nunca da un falso negativo; la probabilidad de falso positivo se mantiene
+    en `prob_falso_positivo` mientras no se pase de `capacidad` elementos.
+    Con los valores por defecto (5M URLs, 0.1%) ocupa unos 9 MB.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD, prob_falso_positivo=PROB_FALSO_POSITIVO):
+        self.num_bits = max(8, math.ceil(-capacidad * math.log(prob_falso_positivo) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacidad * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.elementos = 0
+
+    def _posiciones(self, clave):
+        digest = hashlib.blake2b(clave.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, clave):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._posiciones(clave))
+
+    def add(self, clave):
+        """Añade la clave; devuelve True si no estaba"""
+        nueva = False
+        for p in self._posiciones(clave):
+            byte, bit = p >> 3, 1 << (p & 7)
+            if not self.bits[byte] & bit:
+                self.bits[byte] |= bit
+                nueva = True
+        if nueva:
+            self.elementos += 1
+        return nueva
+
+    def __len__(self):
+        return self.elementos
+
+    def prob_falso_positivo_actual(self):
+        return (1 - math.exp(-self.num_hashes * self.elementos / self.num_bits)) ** self.num_hashes
+
+    def copia(self):
+        """Otro filtro con una copia de los bits, para guardarlo sin bloquear a quien use este"""
+        filtro = self.__class__.__new__(self.__class__)
+        filtro.num_bits, filtro.num_hashes, filtro.elementos = self.num_bits, self.num_hashes, self.elementos
+        filtro.bits = bytearray(self.bits)
+        return filtro
+
+    def guardar(self, ruta):
+        """Escritura atómica: o queda el fichero anterior o el nuevo completo, nunca uno a medias"""
+        temporal = f"{ruta}.tmp"
+        with open(temporal, "wb") as f:
+            f.write(_CABECERA + struct.pack("<QQQ", self.num_bits, self.num_hashes, self.elementos))
+            f.write(self.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, "rb") as f:
+            if f.read(len(_CABECERA)) != _CABECERA:
+                raise ValueError(f"{ruta} no es un filtro guardado con FiltroBloom")
+            num_bits, num_hashes, elementos = struct.unpack("<QQQ", f.read(24))
+            bits = bytearray(f.read())
+        if len(bits) != (num_bits + 7) // 8:
+            raise ValueError(f"{ruta} está incompleto")
+        filtro = cls.__new__(cls)
+        filtro.num_bits, filtro.num_hashes, filtro.elementos, filtro.bits = num_bits, num_hashes, elementos, bits
+        return filtro
+
+
+def clave(url, huella=None):
+    """Clave del filtro: la URL con la huella de su tarjeta del listado, si se conoce"""
+    return url if huella is None else f"{url}#{huella}"
+
+
+class DeduplicadorURLs:
+    """
+    Registro global de las URLs cuyo detalle ya está descargado y guardado en disco,
+    compartido por todos los hilos y persistente entre ejecuciones.
+
+    - `vista(url, huella)` consulta si ya se descargó (y cuenta la descarga que nos ahorramos)
+    - `registrar(url, huella)` se llama solo después de escribir en disco un detalle
+      con ficha; los que fallan no se registran y se vuelven a pedir
+
+    Con `huella` (la de `huella_anuncio`) la clave es la URL junto con la huella de la
+    tarjeta: si el anuncio cambia en el listado, su clave es otra y se vuelve a pedir.
+
+    El filtro se guarda de forma atómica al cerrar y, mientras tanto, cuando hay
+    `guardar_cada` registros pendientes o han pasado `guardar_cada_s` segundos desde
+    el último guardado. Lo que hay en `ruta` es siempre un subconjunto de lo ya
+    escrito: si el proceso se cae, como mucho se repiten las últimas descargas, nunca
+    se pierde una. Los bits se copian con el lock cogido y se escriben fuera de él,
+    así que `vista` no espera a la escritura del fichero (unos 9 MB con fsync).
+    Con `ruta=None` funciona solo en memoria.
+    """
+
+    def __init__(self, ruta=RUTA_DEDUPE, capacidad=CAPACIDAD, prob_falso_positivo=PROB_FALSO_POSITIVO,
+                 guardar_cada=GUARDAR_CADA, guardar_cada_s=GUARDAR_CADA_S):
+        self.ruta = ruta
+        self.guardar_cada = guardar_cada
+        self.guardar_cada_s = guardar_cada_s
+        if ruta and os.path.exists(ruta):
+            self.filtro = FiltroBloom.cargar(ruta)
+            print(f"{len(self.filtro)} URLs ya descargadas en {ruta}")
+        else:
+            self.filtro = FiltroBloom(capacidad, prob_falso_positivo)
+        self._lock = threading.Lock()
+        # Un guardado cada vez, para que uno más antiguo no pise a uno más reciente
+        self._lock_guardar = threading.Lock()
+        self._sin_guardar = 0
+        self._ultimo_guardado = time.monotonic()
+        self.consultas = 0
+        self.ahorradas = 0
+
+    def vista(self, url, huella=None):
+        with self._lock:
+            self.consultas += 1
+            if clave(url, huella) in self.filtro:
+                self.ahorradas += 1
+                return True
+            return False
+
+    def _toca_guardar(self):
+        """Con el lock cogido: si hay que guardar ya (por registros pendientes o por tiempo)"""
+        return self._sin_guardar and (self._sin_guardar >= self.guardar_cada
+                                      or time.monotonic() - self._ultimo_guardado >= self.guardar_cada_s)
+
+    def registrar(self, url, huella=None):
+        with self._lock:
+            if self.filtro.add(clave(url, huella)):
+                self._sin_guardar += 1
+            guardar = self._toca_guardar()
+        if guardar:
+            self.guardar()
+
+    def registrar_varias(self, pares):
+        """Registra cada (url, huella) de `pares`; guarda el filtro si toca"""
+        with self._lock:
+            for url, huella in pares:
+                if self.filtro.add(clave(url, huella)):
+                    self._sin_guardar += 1
+            guardar = self._toca_guardar()
+        if guardar:
+            self.guardar()
+
+    def guardar(self):
+        if not self.ruta:
+            return
+        with self._lock_guardar:
+            with self._lock:
+                if not self._sin_guardar:
+                    return
+                copia, pendientes = self.filtro.copia(), self._sin_guardar
+                self._sin_guardar = 0
+                self._ultimo_guardado = time.monotonic()
+            try:
+                copia.guardar(self.ruta)
+            except BaseException:
+                with self._lock:
+                    self._sin_guardar += pendientes
+                raise
+
+    def __len__(self):
+        return len(self.filtro)
+
+    def informe(self):
+        print(f"Deduplicado: {self.ahorradas} descargas ahorradas de {self.consultas} consultas, "
+              f"{len(self.filtro)} URLs registradas "
+              f"(falsos positivos ~{self.filtro.prob_falso_positivo_actual():.4%})")
+
+    def cerrar(self):
+        self.guardar()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
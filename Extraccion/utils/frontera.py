@@ -0,0 +1,174 @@
+import json
+import time
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+from utils.parseo import HEADERS, parsear_detalles
+from utils.ritmo import ControladorRitmo, peticion
+from utils.bloques import escribir_bloques
+from utils.cache_html import DETALLE
+
+RUTA_FRONTERA = "frontera_detalles.db"
+NUM_WORKERS = 8
+MAX_INTENTOS = 3
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+HECHO = "hecho"
+FALLIDO = "fallido"
+
+
+def conectar(ruta=RUTA_FRONTERA):
+    """Abre una conexión propia (una por worker). WAL permite leer mientras otro escribe"""
+    conn = sqlite3.connect(ruta, timeout=60, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def crear_frontera(urls, ruta=RUTA_FRONTERA):
+    """
+    Crea la tabla de la frontera (si no existe) y encola las URLs nuevas.
+    Las URLs que ya estaban no se tocan, así que relanzar con el mismo CSV es seguro.
+    """
+    conn = conectar(ruta)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS frontera (
+            url TEXT PRIMARY KEY,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            intentos INTEGER NOT NULL DEFAULT 0,
+            ultimo_error TEXT,
+            resultado TEXT,
+            actualizado REAL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_frontera_estado ON frontera (estado, intentos)")
+    conn.execute("BEGIN IMMEDIATE")
+    conn.executemany("INSERT OR IGNORE INTO frontera (url) VALUES (?)", ((u,) for u in urls))
+    conn.execute("COMMIT")
+    conn.close()
+
+
+def recuperar_en_curso(ruta=RUTA_FRONTERA):
+    """Devuelve a la cola las URLs que se quedaron a medias en una ejecución interrumpida"""
+    conn = conectar(ruta)
+    n = conn.execute(
+        "UPDATE frontera SET estado = ? WHERE estado = ?", (PENDIENTE, EN_CURSO)
+    ).rowcount
+    conn.close()
+    if n:
+        print(f"{n} URLs en curso de la ejecución anterior vuelven a la cola")
+    return n
+
+
+def reclamar_url(conn, max_intentos=MAX_INTENTOS):
+    """Toma una URL pendiente y la marca como en curso en la misma transacción"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        fila = conn.execute(
+            """SELECT url FROM frontera
+               WHERE estado = ? AND intentos < ?
+               ORDER BY intentos, rowid LIMIT 1""",
+            (PENDIENTE, max_intentos),
+        ).fetchone()
+        if fila:
+            conn.execute(
+                "UPDATE frontera SET estado = ?, intentos = intentos + 1, actualizado = ? WHERE url = ?",
+                (EN_CURSO, time.time(), fila[0]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return fila[0] if fila else None
+
+
+def marcar_hecho(conn, url, datos):
+    conn.execute(
+        "UPDATE frontera SET estado = ?, resultado = ?, ultimo_error = NULL, actualizado = ? WHERE url = ?",
+        (HECHO, json.dumps(datos, ensure_ascii=False), time.time(), url),
+    )
+
+
+def marcar_error(conn, url, error, max_intentos=MAX_INTENTOS):
+    """La URL vuelve a pendiente hasta agotar `max_intentos`; después queda como fallida"""
+    conn.execute(
+        """UPDATE frontera
+           SET estado = CASE WHEN intentos >= ? THEN ? ELSE ? END,
+               ultimo_error = ?, actualizado = ?
+           WHERE url = ?""",
+        (max_intentos, FALLIDO, PENDIENTE, str(error)[:500], time.time(), url),
+    )
+
+
+def _worker(ruta, max_intentos, controlador, cache):
+    conn = conectar(ruta)
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+    procesadas = 0
+    try:
+        while True:
+            url = reclamar_url(conn, max_intentos)
+            if url is None:
+                break
+            try:
+                resp = peticion(sesion, url, controlador, timeout=10)
+                resp.raise_for_status()
+                if cache is not None:
+                    cache.guardar(url, resp.text, DETALLE)
+                marcar_hecho(conn, url, parsear_detalles(resp.text))
+            except Exception as e:
+                print(f"Error extrayendo {url}: {e}")
+                marcar_error(conn, url, e, max_intentos)
+            procesadas += 1
+    finally:
+        sesion.close()
+        conn.close()
+    return procesadas
+
+
+def resumen_frontera(ruta=RUTA_FRONTERA):
+    conn = conectar(ruta)
+    conteo = dict(conn.execute("SELECT estado, COUNT(*) FROM frontera GROUP BY estado").fetchall())
+    conn.close()
+    return conteo
+
+
+def procesar_frontera(urls=None, ruta=RUTA_FRONTERA, num_workers=NUM_WORKERS,
+                      max_intentos=MAX_INTENTOS, controlador=None, cache=None):
+    """
+    Extrae los detalles de todas las URLs pendientes con un pool de `num_workers` hilos.
+    Cada worker reclama URLs de forma atómica y guarda el resultado en la misma
+    transacción que lo marca como hecho, así que si el proceso se cae basta con
+    volver a llamar a esta función: no se repite ninguna URL terminada.
+    Todos los workers comparten el mismo `controlador` de ritmo y, si se pasa,
+    la misma `cache` (CacheHTML) donde se guarda cada página descargada.
+    """
+    if controlador is None:
+        controlador = ControladorRitmo()
+    if urls is not None:
+        crear_frontera(urls, ruta)
+    recuperar_en_curso(ruta)
+
+    inicio = time.time()
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        futuros = [pool.submit(_worker, ruta, max_intentos, controlador, cache) for _ in range(num_workers)]
+        procesadas = sum(f.result() for f in futuros)
+
+    conteo = resumen_frontera(ruta)
+    print(f"{procesadas} URLs procesadas en {time.time() - inicio:.1f}s -> {conteo}")
+    controlador.informe()
+    return conteo
+
+
+def exportar_bloques(carpeta, tamano_bloque, ruta=RUTA_FRONTERA):
+    """Vuelca las URLs terminadas a ficheros `bloque_N.json` con el formato de `procesar_bloque`"""
+    conn = conectar(ruta)
+    cursor = conn.execute(
+        "SELECT url, resultado FROM frontera WHERE estado = ? ORDER BY rowid", (HECHO,)
+    )
+    resultados = ({"url": url, **json.loads(resultado)} for url, resultado in cursor)
+    n_bloques = escribir_bloques(resultados, carpeta, tamano_bloque)
+    conn.close()
+    return n_bloques
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from datetime import datetime
+import requests
+import pandas as pd
+
+from utils.parseo import HEADERS, DOMINIO, url_pagina, parsear_listado
+from utils.ritmo import ControladorRitmo, peticion
+from utils.cache_html import LISTADO
+from utils.bloques import EscritorBloque
+
+RUTA_HUELLAS = "huellas_anuncios.db"
+
+ACTIVO = "activo"
+ELIMINADO = "eliminado"
+
+
+def conectar(ruta=RUTA_HUELLAS):
+    conn = sqlite3.connect(ruta, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS anuncios (
+            url TEXT PRIMARY KEY,
+            huella TEXT NOT NULL,
+            estado TEXT NOT NULL,
+            marca TEXT,
+            detalle_al_dia INTEGER NOT NULL DEFAULT 0,
+            primera_vez REAL,
+            ultima_vez REAL,
+            ultimo_cambio REAL
+        );
+        CREATE TABLE IF NOT EXISTS paginas (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            num_paginas INTEGER,
+            urls TEXT
+        );
+    """)
+    # Bases de datos anteriores a la columna `marca`
+    if "marca" not in [c[1] for c in conn.execute("PRAGMA table_info(anuncios)")]:
+        conn.execute("ALTER TABLE anuncios ADD COLUMN marca TEXT")
+    return conn
+
+
+def huella_anuncio(anuncio):
+    """Hash de los campos de la tarjeta del listado: si no cambia, el anuncio no ha cambiado"""
+    contenido = json.dumps([anuncio["titulo"], anuncio["tags"]], ensure_ascii=False)
+    return hashlib.sha1(contenido.encode("utf-8")).hexdigest()
+
+
+def _cabeceras_condicionales(conn, url):
+    fila = conn.execute("SELECT etag, last_modified FROM paginas WHERE url = ?", (url,)).fetchone()
+    cabeceras = {}
+    if fila:
+        etag, last_modified = fila
+        if etag:
+            cabeceras["If-None-Match"] = etag
+        if last_modified:
+            cabeceras["If-Modified-Since"] = last_modified
+    return cabeceras
+
+
+def _guardar_pagina(conn, url, resp, num_paginas, urls):
+    conn.execute(
+        "INSERT OR REPLACE INTO paginas (url, etag, last_modified, num_paginas, urls) VALUES (?, ?, ?, ?, ?)",
+        (url, resp.headers.get("ETag"), resp.headers.get("Last-Modified"), num_paginas, json.dumps(urls)),
+    )
+
+
+def _pagina_en_cache(conn, url):
+    fila = conn.execute("SELECT num_paginas, urls FROM paginas WHERE url = ?", (url,)).fetchone()
+    return fila[0], json.loads(fila[1])
+
+
+def _tocar(conn, urls, ahora, marca):
+    """Marca como vistos en esta ejecución los anuncios de una página que no ha cambiado (304)"""
+    conn.executemany(
+        "UPDATE anuncios SET ultima_vez = ?, estado = ?, marca = COALESCE(marca, ?) WHERE url = ?",
+        ((ahora, ACTIVO, marca, u) for u in urls),
+    )
+
+
+def extraer_marca_incremental(sesion, controlador, conn, marca, url_base, dominio=DOMINIO, cache=None):
+    """
+    Igual que `extraer_anuncios_de_marca`, pero cada página de listado se pide con
+    If-None-Match / If-Modified-Since. Si el servidor responde 304 no se parsea nada
+    y sus anuncios se dan por vistos sin cambios.
+    Devuelve (anuncios de las páginas que sí se descargaron, número de páginas 304,
+    si la marca se ha recorrido entera). Una respuesta de error corta la marca y la deja
+    como incompleta: sus anuncios no vistos no se pueden dar por eliminados.
+    """
+    anuncios = []
+    urls_vistas = set()
+    no_modificadas = 0
+    ahora = time.time()
+    num_paginas = 1
+    pagina = 1
+
+    while pagina <= num_paginas:
+        url = url_pagina(url_base, pagina)
+        resp = peticion(sesion, url, controlador, headers=_cabeceras_condicionales(conn, url), timeout=10)
+
+        if resp.status_code == 304:
+            num_guardado, urls = _pagina_en_cache(conn, url)
+            if pagina == 1:
+                num_paginas = num_guardado
+            _tocar(conn, urls, ahora, marca)
+            urls_vistas.update(urls)
+            no_modificadas += 1
+            encontrados = len(urls)
+        elif resp.status_code == 200:
+            if cache is not None:
+                cache.guardar(url, resp.text, LISTADO, marca, pagina)
+            num_paginas_html, nuevos = parsear_listado(resp.text, marca, urls_vistas, dominio)
+            if pagina == 1:
+                num_paginas = num_paginas_html
+            _guardar_pagina(conn, url, resp, num_paginas, [a["url"] for a in nuevos])
+            anuncios.extend(nuevos)
+            encontrados = len(nuevos)
+        else:
+            print(f"  Error HTTP {resp.status_code} en la página {pagina} de {marca}")
+            conn.commit()
+            return anuncios, no_modificadas, False
+
+        if encontrados == 0:
+            break
+        pagina += 1
+
+    conn.commit()
+    return anuncios, no_modificadas, True
+
+
+def registrar_listado(anuncios, conn):
+    """
+    Compara cada anuncio con su huella guardada.
+    Los nuevos y los cambiados quedan con `detalle_al_dia = 0` para que 02 solo pida esos.
+    """
+    ahora = time.time()
+    nuevos, cambiados, sin_cambios = [], [], 0
+    for anuncio in anuncios:
+        url = anuncio["url"]
+        huella = huella_anuncio(anuncio)
+        fila = conn.execute("SELECT huella FROM anuncios WHERE url = ?", (url,)).fetchone()
+        if fila is None:
+            conn.execute(
+                """INSERT INTO anuncios (url, huella, estado, marca, detalle_al_dia, primera_vez, ultima_vez,
+                   ultimo_cambio) VALUES (?, ?, ?, ?, 0, ?, ?, ?)""",
+                (url, huella, ACTIVO, anuncio["marca"], ahora, ahora, ahora),
+            )
+            nuevos.append(url)
+        elif fila[0] != huella:
+            conn.execute(
+                """UPDATE anuncios SET huella = ?, estado = ?, marca = ?, detalle_al_dia = 0,
+                   ultima_vez = ?, ultimo_cambio = ? WHERE url = ?""",
+                (huella, ACTIVO, anuncio["marca"], ahora, ahora, url),
+            )
+            cambiados.append(url)
+        else:
+            conn.execute(
+                "UPDATE anuncios SET estado = ?, marca = ?, ultima_vez = ? WHERE url = ?",
+                (ACTIVO, anuncio["marca"], ahora, url),
+            )
+            sin_cambios += 1
+    conn.commit()
+    return {"nuevos": nuevos, "cambiados": cambiados, "sin_cambios": sin_cambios}
+
+
+def marcar_eliminados(conn, inicio, marcas_completas, todas_completas=True):
+    """
+    Marca como eliminados los anuncios activos que no han aparecido desde `inicio`, solo
+    de las marcas de `marcas_completas` (las recorridas enteras). Los anuncios sin marca
+    guardada (de bases anteriores a la columna) solo si `todas_completas`.
+    """
+    marcas_completas = list(marcas_completas)
+    huecos = ", ".join("?" * len(marcas_completas))
+    cursor = conn.execute(
+        f"""SELECT url FROM anuncios WHERE estado = ? AND ultima_vez < ?
+            AND (marca IN ({huecos}) OR (marca IS NULL AND ?))""",
+        (ACTIVO, inicio, *marcas_completas, int(todas_completas)),
+    )
+    eliminados = [fila[0] for fila in cursor.fetchall()]
+    conn.executemany("UPDATE anuncios SET estado = ? WHERE url = ?", ((ELIMINADO, u) for u in eliminados))
+    conn.commit()
+    return eliminados
+
+
+def extraer_anuncios_incremental(marcas, ruta=RUTA_HUELLAS, controlador=None, cache=None, dominio=DOMINIO):
+    """
+    Recorre todas las marcas en modo incremental.
+    Devuelve los anuncios descargados (solo de páginas que han cambiado) y un
+    resumen con las URLs nuevas, cambiadas y eliminadas.
+    Solo se pueden marcar eliminados tras recorrer todas las marcas, por eso
+    no conviene llamar a esta función con un subconjunto de `marcas`. Si una marca
+    se corta (error HTTP o de red), ninguno de sus anuncios se da por eliminado.
+    """
+    inicio = time.time()
+    if controlador is None:
+        controlador = ControladorRitmo()
+    conn = conectar(ruta)
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+
+    anuncios_totales = []
+    urls_vistas_global = set()
+    paginas_304 = 0
+    completas, incompletas = [], []
+    for marca, url in marcas.items():
+        try:
+            anuncios_marca, no_modificadas, completa = extraer_marca_incremental(
+                sesion, controlador, conn, marca, url, dominio=dominio, cache=cache)
+        except requests.RequestException as e:
+            print(f"  Error extrayendo la marca {marca}: {e}")
+            conn.commit()
+            incompletas.append(marca)
+            continue
+        (completas if completa else incompletas).append(marca)
+        paginas_304 += no_modificadas
+        for anuncio in anuncios_marca:
+            if anuncio["id_extraccion"] not in urls_vistas_global:
+                anuncios_totales.append(anuncio)
+                urls_vistas_global.add(anuncio["id_extraccion"])
+
+    cambios = registrar_listado(anuncios_totales, conn)
+    cambios["eliminados"] = marcar_eliminados(conn, inicio, completas, todas_completas=not incompletas)
+    cambios["paginas_no_modificadas"] = paginas_304
+    cambios["marcas_incompletas"] = incompletas
+    conn.close()
+    sesion.close()
+
+    print(f"Nuevos: {len(cambios['nuevos'])}, cambiados: {len(cambios['cambiados'])}, "
+          f"sin cambios: {cambios['sin_cambios']}, eliminados: {len(cambios['eliminados'])}, "
+          f"páginas 304: {paginas_304}")
+    if incompletas:
+        print(f"Marcas sin terminar (no se ha eliminado nada de ellas): {', '.join(incompletas)}")
+    return anuncios_totales, cambios
+
+
+def actualizar_csv_anuncios(anuncios, cambios, ruta_csv):
+    """Actualiza el CSV de la etapa 01: quita los eliminados y sustituye/añade los anuncios descargados"""
+    df_nuevo = pd.DataFrame(anuncios)
+    if os.path.exists(ruta_csv):
+        df = pd.read_csv(ruta_csv)
+        quitar = set(cambios["eliminados"]) | set(df_nuevo.get("url", []))
+        df = df[~df["url"].isin(quitar)]
+        df = pd.concat([df, df_nuevo], ignore_index=True)
+    else:
+        df = df_nuevo
+    df.to_csv(ruta_csv, index=False, encoding="utf-8")
+    return df
+
+
+def urls_pendientes(ruta=RUTA_HUELLAS):
+    """URLs activas cuyo detalle falta o está desactualizado"""
+    conn = conectar(ruta)
+    urls = [f[0] for f in conn.execute(
+        "SELECT url FROM anuncios WHERE estado = ? AND detalle_al_dia = 0 ORDER BY rowid", (ACTIVO,)
+    )]
+    conn.close()
+    return urls
+
+
+def marcar_detalles_al_dia(urls, ruta=RUTA_HUELLAS):
+    conn = conectar(ruta)
+    conn.executemany("UPDATE anuncios SET detalle_al_dia = 1 WHERE url = ?", ((u,) for u in urls))
+    conn.commit()
+    conn.close()
+
+
+def procesar_incremental(extraer_detalles, carpeta, ruta=RUTA_HUELLAS):
+    """
+    Pide con `extraer_detalles` solo los anuncios nuevos o cambiados y los guarda en
+    un bloque aparte (`bloque_incr_<fecha>.jsonl`), que 03 combina quedándose con el
+    detalle más reciente de cada URL. El ritmo lo marca el propio `extraer_detalles`.
+    """
+    urls = urls_pendientes(ruta)
+    print(f"{len(urls)} anuncios nuevos o cambiados pendientes de detalle")
+    if not urls:
+        return []
+
+    archivo = os.path.join(carpeta, f"bloque_incr_{datetime.now():%Y%m%d%H%M%S}.jsonl")
+    # Las que fallan (ficha vacía) no se escriben, para no pisar el detalle anterior
+    # en 03, y se quedan pendientes para la próxima ejecución
+    al_dia = []
+    with EscritorBloque(archivo) as bloque:
+        for i, url in enumerate(urls):
+            print(f"  [{i+1}/{len(urls)}] {url}")
+            datos = extraer_detalles(url)
+            if datos.get("detalles_ficha"):
+                bloque.escribir({"url": url, **datos})
+                al_dia.append(url)
+    print(f"Bloque incremental guardado en {archivo}")
+
+    marcar_detalles_al_dia(al_dia, ruta)
+    return al_dia
@@ -0,0 +1,277 @@
+from datetime import datetime
+from bs4 import BeautifulSoup
+
+from utils.campos import campos_tarjeta, campos_detalle
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+DOMINIO = "https://www.autocasion.com"
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                  "AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/114.0.0.0 Safari/537.36",
+    "Referer": "https://www.autocasion.com",
+    "Accept-Language": "es-ES,es;q=0.9",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8"
+}
+
+
+def extraer_marcas(html, dominio=DOMINIO):
+    """Devuelve {MARCA: url} a partir del HTML de la portada de coches de ocasión"""
+    soup = BeautifulSoup(html, "html.parser")
+
+    marcas = {}
+    seccion_marcas = soup.find("div", class_="acordeon brand-acordeon")
+    if seccion_marcas:
+        elementos = seccion_marcas.find_all("a", href=True, class_="icon")
+        for a in elementos:
+            nombre = a.get_text(strip=True).upper()
+            href = a["href"]
+            if "/coches-segunda-mano/" in href:
+                marcas[nombre] = dominio + href
+    else:
+        print("No se encontró la sección de marcas.")
+    return marcas
+
+
+def extraer_num_paginas(soup):
+    div_num = soup.find("div", class_="num")
+    if not div_num:
+        return 1
+    total_pages_a = div_num.find("a", class_="total_pages")
+    if total_pages_a:
+        try:
+            return int(total_pages_a.get_text(strip=True))
+        except:
+            return 1
+    paginas = []
+    for a in div_num.find_all("a", href=True):
+        try:
+            paginas.append(int(a.get_text(strip=True)))
+        except:
+            continue
+    if paginas:
+        return max(paginas)
+    return 1
+
+
+def url_pagina(url_base, pagina):
+    if pagina == 1:
+        return url_base
+    return f"{url_base}?page={pagina}"
+
+
+def parsear_anuncios(soup, marca, urls_vistas, dominio=DOMINIO):
+    """
+    Extrae los anuncios de una página de listado.
+    Las URLs ya presentes en `urls_vistas` se saltan y las nuevas se añaden al set.
+    """
+    anuncios = []
+    for anuncio in soup.find_all("a", href=True):
+        if anuncio.find("p", class_="relacionados"):
+            continue
+
+        titulo_tag = anuncio.find("h2", itemprop="name")
+        if not titulo_tag:
+            continue
+
+        url_anuncio = dominio + anuncio["href"]
+        if url_anuncio in urls_vistas:
+            continue
+        urls_vistas.add(url_anuncio)
+
+        titulo = titulo_tag.get_text(strip=True)
+
+        ul = anuncio.find("ul")
+        tags = [li.get_text(strip=True) for li in ul.find_all("li")] if ul else []
+
+        anuncios.append({
+            "id_extraccion": url_anuncio,
+            "timestamp_extraccion": datetime.now().isoformat(),
+            "marca": marca,
+            "titulo": titulo,
+            "url": url_anuncio,
+            "tags": tags
+        })
+    return anuncios
+
+
+def _parsear_detalles_bs4(html):
+    soup = BeautifulSoup(html, "html.parser")
+
+    ul_ficha = soup.find("ul", class_="datos-basicos-ficha")
+    detalles = [li.get_text(strip=True) for li in ul_ficha.find_all("li")] if ul_ficha else []
+
+    precios = []
+    ul_precios = soup.find("ul", class_="tabla-precio")
+    if ul_precios:
+        for li in ul_precios.find_all("li"):
+            spans = li.find_all("span")
+            if spans:
+                clave = spans[0].get_text(strip=True)
+                valor = spans[1].get_text(strip=True) if len(spans) > 1 else ""
+                precios.append(f"{clave} {valor}")
+
+    return {
+        "detalles_ficha": detalles,
+        "precios": precios
+    }
+
+
+# ---------------------------------------------------------------------------
+# Backend lxml: mismo resultado que las funciones de BeautifulSoup de arriba,
+# pero con el parser en C y XPaths precompilados que solo visitan los nodos
+# que nos interesan.
+# ---------------------------------------------------------------------------
+
+def _clase(nombre):
+    """Equivalente XPath de `class_=nombre` en BeautifulSoup (coincide con una de las clases)"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {nombre} ')"
+
+
+if lxml_html is not None:
+    _XP_TEXTO = etree.XPath(".//text()")
+    _XP_LI = etree.XPath(".//li")
+    _XP_SPAN = etree.XPath(".//span")
+    _XP_FICHA = etree.XPath(f"(//ul[{_clase('datos-basicos-ficha')}])[1]")
+    _XP_PRECIOS = etree.XPath(f"(//ul[{_clase('tabla-precio')}])[1]")
+    _XP_DIV_NUM = etree.XPath(f"(//div[{_clase('num')}])[1]")
+    _XP_TOTAL_PAGINAS = etree.XPath(f"(.//a[{_clase('total_pages')}])[1]")
+    _XP_ENLACES = etree.XPath("//a[@href]")
+    _XP_ENLACES_HIJOS = etree.XPath(".//a[@href]")
+    _XP_RELACIONADOS = etree.XPath(f"(.//p[{_clase('relacionados')}])[1]")
+    _XP_TITULO = etree.XPath("(.//h2[@itemprop='name'])[1]")
+    _XP_UL = etree.XPath("(.//ul)[1]")
+
+
+def _texto(elemento):
+    """Equivalente de `get_text(strip=True)`"""
+    return "".join(t.strip() for t in _XP_TEXTO(elemento))
+
+
+def _documento_lxml(html):
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # Documentos con declaración de encoding: lxml solo los acepta como bytes
+        return lxml_html.document_fromstring(html.encode("utf-8"))
+    except etree.ParserError:
+        return None
+
+
+def _num_paginas_lxml(doc):
+    div_num = _XP_DIV_NUM(doc)
+    if not div_num:
+        return 1
+    total_pages_a = _XP_TOTAL_PAGINAS(div_num[0])
+    if total_pages_a:
+        try:
+            return int(_texto(total_pages_a[0]))
+        except ValueError:
+            return 1
+    paginas = []
+    for a in _XP_ENLACES_HIJOS(div_num[0]):
+        try:
+            paginas.append(int(_texto(a)))
+        except ValueError:
+            continue
+    if paginas:
+        return max(paginas)
+    return 1
+
+
+def _parsear_listado_lxml(html, marca, urls_vistas, dominio):
+    doc = _documento_lxml(html)
+    if doc is None:
+        return 1, []
+
+    anuncios = []
+    for anuncio in _XP_ENLACES(doc):
+        if _XP_RELACIONADOS(anuncio):
+            continue
+
+        titulo_tag = _XP_TITULO(anuncio)
+        if not titulo_tag:
+            continue
+
+        url_anuncio = dominio + anuncio.get("href")
+        if url_anuncio in urls_vistas:
+            continue
+        urls_vistas.add(url_anuncio)
+
+        ul = _XP_UL(anuncio)
+        tags = [_texto(li) for li in _XP_LI(ul[0])] if ul else []
+
+        anuncios.append({
+            "id_extraccion": url_anuncio,
+            "timestamp_extraccion": datetime.now().isoformat(),
+            "marca": marca,
+            "titulo": _texto(titulo_tag[0]),
+            "url": url_anuncio,
+            "tags": tags
+        })
+    return _num_paginas_lxml(doc), anuncios
+
+
+def _parsear_detalles_lxml(html):
+    doc = _documento_lxml(html)
+    if doc is None:
+        return {"detalles_ficha": [], "precios": []}
+
+    ul_ficha = _XP_FICHA(doc)
+    detalles = [_texto(li) for li in _XP_LI(ul_ficha[0])] if ul_ficha else []
+
+    precios = []
+    ul_precios = _XP_PRECIOS(doc)
+    if ul_precios:
+        for li in _XP_LI(ul_precios[0]):
+            spans = _XP_SPAN(li)
+            if spans:
+                clave = _texto(spans[0])
+                valor = _texto(spans[1]) if len(spans) > 1 else ""
+                precios.append(f"{clave} {valor}")
+
+    return {
+        "detalles_ficha": detalles,
+        "precios": precios
+    }
+
+
+# Backends disponibles; por defecto lxml si está instalado
+BACKENDS = ["html.parser"] + (["lxml"] if lxml_html is not None else [])
+BACKEND = "lxml" if lxml_html is not None else "html.parser"
+
+
+def parsear_listado(html, marca, urls_vistas, dominio=DOMINIO, backend=None):
+    """
+    Parsea una página de listado y devuelve (número de páginas, anuncios nuevos).
+    Mismo resultado que `extraer_num_paginas` + `parsear_anuncios` con cualquier backend.
+    Cada anuncio lleva además los campos tipados de sus tags (año, combustible, km...).
+    """
+    if (backend or BACKEND) == "lxml":
+        num_paginas, anuncios = _parsear_listado_lxml(html, marca, urls_vistas, dominio)
+    else:
+        soup = BeautifulSoup(html, "html.parser")
+        num_paginas, anuncios = extraer_num_paginas(soup), parsear_anuncios(soup, marca, urls_vistas, dominio)
+    for anuncio in anuncios:
+        anuncio.update(campos_tarjeta(anuncio["tags"]))
+    return num_paginas, anuncios
+
+
+def parsear_detalles(html, backend=None):
+    """
+    Extrae la ficha básica y la tabla de precios de la página de detalle de un anuncio,
+    junto con sus campos tipados (precios en euros, garantía, potencia...).
+    """
+    if (backend or BACKEND) == "lxml":
+        datos = _parsear_detalles_lxml(html)
+    else:
+        datos = _parsear_detalles_bs4(html)
+    return {**datos, **campos_detalle(datos["detalles_ficha"], datos["precios"])}
@@ -0,0 +1,243 @@
+import os
+import time
+import queue
+import sqlite3
+import tempfile
+import threading
+import requests
+import pandas as pd
+
+from utils.parseo import HEADERS, DOMINIO, url_pagina, parsear_listado, parsear_detalles
+from utils.ritmo import ControladorRitmo, peticion
+from utils.cache_html import LISTADO, DETALLE
+from utils.campos import COLUMNAS_TARJETA, detalles_vacios
+from utils.incremental import huella_anuncio
+from utils.bloques import TAMANO_LOTE
+
+NUM_PRODUCTORES = 4
+NUM_WORKERS_DETALLE = 8
+TAMANO_COLA = 500
+TAMANO_ESCRITURA = 1000
+
+COLUMNAS_ANUNCIO = ["id_extraccion", "timestamp_extraccion", "marca", "titulo", "url", "tags"] + COLUMNAS_TARJETA
+
+# Marca de fin de cola
+FIN = None
+
+
+def _extraer_marca(sesion, controlador, cache, marca, url_base, cola_anuncios, vistos, lock_vistos,
+                   dominio, dedupe):
+    """Recorre las páginas de una marca y va encolando sus anuncios según aparecen"""
+    urls_vistas = set()
+    num_paginas = 1
+    pagina = 1
+    while pagina <= num_paginas:
+        url = url_pagina(url_base, pagina)
+        resp = peticion(sesion, url, controlador, timeout=10)
+        if resp.status_code != 200:
+            print(f"  Error HTTP {resp.status_code} en la página {pagina} de {marca}")
+            break
+        if cache is not None:
+            cache.guardar(url, resp.text, LISTADO, marca, pagina)
+
+        num_paginas_html, nuevos = parsear_listado(resp.text, marca, urls_vistas, dominio)
+        if pagina == 1:
+            num_paginas = num_paginas_html
+        if not nuevos:
+            break
+
+        for anuncio in nuevos:
+            with lock_vistos:
+                if anuncio["id_extraccion"] in vistos:
+                    continue
+                vistos.add(anuncio["id_extraccion"])
+            # Detalle ya descargado en una ejecución anterior, con la tarjeta sin cambios
+            if dedupe is not None and dedupe.vista(anuncio["url"], huella_anuncio(anuncio)):
+                continue
+            # Si los workers de detalle van por detrás, aquí se bloquea (backpressure)
+            cola_anuncios.put(anuncio)
+        pagina += 1
+
+
+def _productor(marcas_pendientes, cola_anuncios, vistos, lock_vistos, controlador, cache, dominio, dedupe):
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+    while True:
+        try:
+            marca, url_base = marcas_pendientes.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            _extraer_marca(sesion, controlador, cache, marca, url_base,
+                           cola_anuncios, vistos, lock_vistos, dominio, dedupe)
+        except Exception as e:
+            print(f"Error extrayendo la marca {marca}: {e}")
+    sesion.close()
+
+
+def _worker_detalle(cola_anuncios, cola_salida, controlador, cache):
+    sesion = requests.Session()
+    sesion.headers.update(HEADERS)
+    try:
+        while True:
+            anuncio = cola_anuncios.get()
+            if anuncio is FIN:
+                break
+            try:
+                resp = peticion(sesion, anuncio["url"], controlador, timeout=10)
+                resp.raise_for_status()
+                if cache is not None:
+                    cache.guardar(anuncio["url"], resp.text, DETALLE)
+                datos = parsear_detalles(resp.text)
+            except Exception as e:
+                print(f"Error extrayendo {anuncio['url']}: {e}")
+                datos = detalles_vacios()
+            cola_salida.put({**anuncio, **datos})
+    finally:
+        sesion.close()
+        cola_salida.put(FIN)
+
+
+def _volcar(filas, csv_anuncios, csv_salida, primera_vez, dedupe):
+    df = pd.DataFrame(filas)
+    modo = "w" if primera_vez else "a"
+    df[COLUMNAS_ANUNCIO].to_csv(csv_anuncios, mode=modo, header=primera_vez, index=False, encoding="utf-8")
+    df.to_csv(csv_salida, mode=modo, header=primera_vez, index=False, encoding="utf-8")
+    # Solo se registran una vez escritas y si tienen ficha: si el proceso se cae antes
+    # o el detalle falló, se vuelven a pedir en la siguiente ejecución
+    if dedupe is not None:
+        dedupe.registrar_varias((f["url"], huella_anuncio(f)) for f in filas if f.get("detalles_ficha"))
+
+
+# Por cada URL, la fila que se queda: la última con ficha, y una sin ficha nunca pisa a una con ficha
+_INSERTAR_ULTIMA = """
+    INSERT INTO ultimas VALUES (?, ?, ?) ON CONFLICT(url) DO UPDATE
+    SET fila = excluded.fila, con_ficha = excluded.con_ficha
+    WHERE excluded.con_ficha OR NOT ultimas.con_ficha
+"""
+
+
+def _leer_por_lotes(ruta, tamano_lote):
+    """El CSV por lotes, como texto para reescribirlo sin cambiar ningún valor"""
+    return pd.read_csv(ruta, chunksize=tamano_lote, dtype=str, keep_default_na=False)
+
+
+def _quitar_repetidas(csv_anuncios, csv_salida, tamano_lote=TAMANO_LOTE):
+    """
+    Deja una fila por URL en los CSV tras añadir filas a los de otra ejecución: la
+    última con ficha (o la última, si ninguna tiene). Se repiten los detalles que
+    fallaron antes y los que se escribieron justo antes de un corte sin llegar al filtro.
+    Como `unir_datos_por_lotes`, no tiene el CSV entero en memoria: una primera pasada
+    apunta en un SQLite temporal qué fila se queda de cada URL y una segunda las copia.
+    """
+    total = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "urls.db"))
+        conn.execute("CREATE TABLE ultimas (url TEXT PRIMARY KEY, fila INTEGER, con_ficha INTEGER)")
+        inicio = 0
+        with _leer_por_lotes(csv_salida, tamano_lote) as lector:
+            for lote in lector:
+                con_ficha = ~lote["detalles_ficha"].isin(["", "[]"])
+                conn.executemany(_INSERTAR_ULTIMA, zip(lote["url"], range(inicio, inicio + len(lote)),
+                                                       con_ficha.tolist()))
+                inicio += len(lote)
+        conn.execute("CREATE INDEX ultimas_fila ON ultimas (fila)")
+        conn.commit()
+
+        inicio = 0
+        with _leer_por_lotes(csv_salida, tamano_lote) as lector:
+            for i, lote in enumerate(lector):
+                quedan = [f - inicio for (f,) in conn.execute(
+                    "SELECT fila FROM ultimas WHERE fila >= ? AND fila < ? ORDER BY fila",
+                    (inicio, inicio + len(lote)))]
+                inicio += len(lote)
+                lote = lote.iloc[quedan]
+                modo = "w" if i == 0 else "a"
+                lote.to_csv(f"{csv_salida}.tmp", mode=modo, header=(i == 0), index=False, encoding="utf-8")
+                lote[COLUMNAS_ANUNCIO].to_csv(f"{csv_anuncios}.tmp", mode=modo, header=(i == 0), index=False,
+                                              encoding="utf-8")
+                total += len(lote)
+        conn.close()
+    os.replace(f"{csv_salida}.tmp", csv_salida)
+    os.replace(f"{csv_anuncios}.tmp", csv_anuncios)
+    return total
+
+
+def ejecutar_pipeline(marcas, csv_salida="anuncios_completo.csv", csv_anuncios="anuncios_unificados1.csv",
+                      num_productores=NUM_PRODUCTORES, num_workers=NUM_WORKERS_DETALLE,
+                      tamano_cola=TAMANO_COLA, controlador=None, cache=None, dominio=DOMINIO, dedupe=None):
+    """
+    Extracción completa (01 + 02 + 03) en una sola pasada.
+    Los productores recorren los listados por marca y encolan cada anuncio nuevo;
+    los workers de detalle lo van completando en cuanto llega, y el hilo principal
+    escribe por lotes tanto el CSV de anuncios como el CSV completo ya unido.
+    Las colas están acotadas a `tamano_cola`, así que si una etapa va más lenta
+    la otra se frena en lugar de acumular en memoria.
+    Las filas son las mismas que con las etapas por separado, pero en orden de llegada.
+    Con un `dedupe` (DeduplicadorURLs) persistente no se vuelven a pedir los anuncios
+    ya escritos en ejecuciones anteriores (salvo si su tarjeta ha cambiado o el detalle
+    falló), las filas nuevas se añaden a los CSV y al final queda una fila por URL.
+    """
+    if controlador is None:
+        controlador = ControladorRitmo()
+
+    marcas_pendientes = queue.Queue()
+    for item in marcas.items():
+        marcas_pendientes.put(item)
+    cola_anuncios = queue.Queue(maxsize=tamano_cola)
+    cola_salida = queue.Queue(maxsize=tamano_cola)
+    vistos = set()
+    lock_vistos = threading.Lock()
+
+    inicio = time.time()
+    productores = [
+        threading.Thread(target=_productor, daemon=True,
+                         args=(marcas_pendientes, cola_anuncios, vistos, lock_vistos, controlador, cache, dominio,
+                               dedupe))
+        for _ in range(num_productores)
+    ]
+    workers = [
+        threading.Thread(target=_worker_detalle, daemon=True,
+                         args=(cola_anuncios, cola_salida, controlador, cache))
+        for _ in range(num_workers)
+    ]
+    for hilo in productores + workers:
+        hilo.start()
+
+    def _cerrar_cola_anuncios():
+        for hilo in productores:
+            hilo.join()
+        for _ in workers:
+            cola_anuncios.put(FIN)
+
+    threading.Thread(target=_cerrar_cola_anuncios, daemon=True).start()
+
+    pendientes = num_workers
+    lote = []
+    total = 0
+    # Si ya hay anuncios registrados, sus filas están en el CSV de una ejecución anterior
+    primera_vez = not (dedupe is not None and len(dedupe) and os.path.exists(csv_salida))
+    anadidas = not primera_vez
+    while pendientes:
+        fila = cola_salida.get()
+        if fila is FIN:
+            pendientes -= 1
+            continue
+        lote.append(fila)
+        if len(lote) >= TAMANO_ESCRITURA:
+            _volcar(lote, csv_anuncios, csv_salida, primera_vez, dedupe)
+            total += len(lote)
+            primera_vez = False
+            lote = []
+            print(f"  {total} anuncios completos escritos ({time.time() - inicio:.0f}s)")
+    if lote:
+        _volcar(lote, csv_anuncios, csv_salida, primera_vez, dedupe)
+        total += len(lote)
+    if anadidas and total:
+        print(f"  {_quitar_repetidas(csv_anuncios, csv_salida)} anuncios distintos en {csv_salida}")
+
+    print(f"Pipeline terminado: {total} anuncios en {time.time() - inicio:.1f}s")
+    controlador.informe()
+    if dedupe is not None:
+        dedupe.informe()
+    return total
@@ -0,0 +1,237 @@
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+from email.utils import parsedate_to_datetime
+
+# Códigos que indican que el servidor está saturado o nos está frenando
+REINTENTABLES = {429, 500, 502, 503, 504}
+# Códigos con los que Retry-After indica cuánto esperar (RFC 9110); en los demás se ignora
+CON_RETRY_AFTER = {429, 503}
+
+
+def leer_retry_after(valor, status=None):
+    """
+    Convierte la cabecera Retry-After (segundos o fecha HTTP) en segundos de espera.
+    Con `status`, solo si es un 429 o un 503 (en un 301 o un 500 no es una pausa).
+    """
+    if not valor or (status is not None and status not in CON_RETRY_AFTER):
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ControladorRitmo:
+    """
+    Reparte las peticiones en el tiempo y ajusta el ritmo (peticiones/segundo) según
+    lo que devuelve el servidor, con AIMD:
+    - respuesta correcta y rápida: el ritmo sube `incremento` peticiones/s
+    - respuesta lenta (por encima de `latencia_objetivo`): baja un poco (x `factor_lento`)
+    - 429 / 5xx / error de red: se multiplica por `factor_error`
+    Como mucho se baja una vez por ventana: una petición que salió antes de la última
+    bajada ya no dice nada del ritmo nuevo y no vuelve a bajarlo. Así, una racha de
+    errores con N peticiones en vuelo baja el ritmo una vez y no N veces.
+    Si un 429 o un 503 trae Retry-After, nadie vuelve a pedir nada hasta que pase ese
+    tiempo (como mucho `espera_max` segundos); en otros códigos la cabecera se ignora.
+    Los turnos salen de un cubo de fichas que se rellena a `ritmo` fichas por segundo;
+    quien espera vuelve a mirar el cubo al despertar, así que un cambio de ritmo o una
+    pausa afectan también a las peticiones que ya estaban esperando.
+    Un mismo controlador se puede compartir entre hilos o corrutinas.
+    """
+
+    def __init__(self, ritmo_inicial=2.0, ritmo_min=0.2, ritmo_max=20.0, incremento=0.2,
+                 factor_error=0.5, factor_lento=0.9, latencia_objetivo=1.5,
+                 max_reintentos=4, espera_base=1.0, espera_max=60.0):
+        self.ritmo = ritmo_inicial
+        self.ritmo_min = ritmo_min
+        self.ritmo_max = ritmo_max
+        self.incremento = incremento
+        self.factor_error = factor_error
+        self.factor_lento = factor_lento
+        self.latencia_objetivo = latencia_objetivo
+        self.max_reintentos = max_reintentos
+        self.espera_base = espera_base
+        self.espera_max = espera_max
+
+        self._lock = threading.Lock()
+        self._fichas = 1.0
+        self._ultima_recarga = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._ultima_bajada = 0.0
+        self._inicio = time.monotonic()
+
+        self.peticiones = 0
+        self.reintentos = 0
+        self.codigos = Counter()
+        self.latencias = []
+        self.historial = []
+
+    def _tomar_ficha(self):
+        """0 si se ha tomado una ficha; si no, los segundos que faltan para la siguiente con el ritmo actual"""
+        with self._lock:
+            ahora = time.monotonic()
+            if self._pausa_hasta > ahora:
+                return self._pausa_hasta - ahora
+            # Como mucho una ficha guardada: sin ráfagas tras un rato sin peticiones
+            self._fichas = min(1.0, self._fichas + (ahora - self._ultima_recarga) * self.ritmo)
+            self._ultima_recarga = ahora
+            if self._fichas >= 1.0:
+                self._fichas -= 1.0
+                return 0.0
+            return (1.0 - self._fichas) / self.ritmo
+
+    def esperar(self):
+        while True:
+            espera = self._tomar_ficha()
+            if espera <= 0:
+                return
+            time.sleep(espera)
+
+    async def esperar_async(self):
+        while True:
+            espera = self._tomar_ficha()
+            if espera <= 0:
+                return
+            await asyncio.sleep(espera)
+
+    def _bajar(self, factor, ahora, enviada):
+        """Con el lock cogido: baja el ritmo, salvo que la petición saliera antes de la última bajada"""
+        if enviada < self._ultima_bajada:
+            return
+        self.ritmo = max(self.ritmo_min, self.ritmo * factor)
+        self._ultima_bajada = ahora
+
+    def registrar(self, status, latencia, retry_after=None):
+        """
+        Ajusta el ritmo con el resultado de una petición (`status` None = error de red);
+        la petición salió hace `latencia` segundos
+        """
+        with self._lock:
+            self.peticiones += 1
+            self.codigos[status] += 1
+            self.latencias.append(latencia)
+
+            ahora = time.monotonic()
+            if status is None or status in REINTENTABLES:
+                self._bajar(self.factor_error, ahora, ahora - latencia)
+            elif latencia > self.latencia_objetivo:
+                self._bajar(self.factor_lento, ahora, ahora - latencia)
+            else:
+                self.ritmo = min(self.ritmo_max, self.ritmo + self.incremento)
+
+            if retry_after and status in CON_RETRY_AFTER:
+                retry_after = min(retry_after, self.espera_max)
+                self._pausa_hasta = max(self._pausa_hasta, ahora + retry_after)
+
+            self.historial.append((ahora - self._inicio, self.ritmo))
+
+    def espera_reintento(self, intento):
+        """Backoff exponencial con jitter completo"""
+        with self._lock:
+            self.reintentos += 1
+        return random.uniform(0, min(self.espera_max, self.espera_base * 2 ** intento))
+
+    def resumen(self):
+        duracion = time.monotonic() - self._inicio
+        latencias = sorted(self.latencias)
+        # Ritmo medio de la última cuarta parte de peticiones: donde se ha estabilizado
+        cola = [r for _, r in self.historial[-max(1, len(self.historial) // 4):]]
+        return {
+            "peticiones": self.peticiones,
+            "reintentos": self.reintentos,
+            "codigos": dict(self.codigos),
+            "ritmo_final": round(self.ritmo, 2),
+            "ritmo_estable": round(sum(cola) / len(cola), 2) if cola else self.ritmo,
+            "peticiones_por_segundo": round(self.peticiones / duracion, 2) if duracion else 0,
+            "latencia_p50": latencias[len(latencias) // 2] if latencias else None,
+        }
+
+    def informe(self):
+        r = self.resumen()
+        print(f"Peticiones: {r['peticiones']} ({r['peticiones_por_segundo']}/s), reintentos: {r['reintentos']}")
+        print(f"Códigos: {r['codigos']}")
+        print(f"Ritmo estabilizado en {r['ritmo_estable']} pet/s (final {r['ritmo_final']})")
+
+
+def peticion(sesion, url, controlador, **kwargs):
+    """
+    GET con el ritmo marcado por `controlador`, reintentando 429/5xx y errores de red.
+    Devuelve la última respuesta; si todos los intentos fallan por red, relanza el error.
+    """
+    for intento in range(controlador.max_reintentos + 1):
+        controlador.esperar()
+        inicio = time.monotonic()
+        try:
+            resp = sesion.get(url, **kwargs)
+        except Exception:
+            controlador.registrar(None, time.monotonic() - inicio)
+            if intento == controlador.max_reintentos:
+                raise
+            time.sleep(controlador.espera_reintento(intento))
+            continue
+
+        retry_after = leer_retry_after(resp.headers.get("Retry-After"), resp.status_code)
+        controlador.registrar(resp.status_code, time.monotonic() - inicio, retry_after)
+        if resp.status_code not in REINTENTABLES or intento == controlador.max_reintentos:
+            return resp
+        # Con Retry-After la pausa ya la impone `esperar`; sin ella, backoff
+        if retry_after is None:
+            time.sleep(controlador.espera_reintento(intento))
+    return resp
+
+
+def traza_conexiones():
+    """
+    TraceConfig de aiohttp que apunta en el `trace_request_ctx` de cada petición cuándo
+    consigue conexión (nueva o reutilizada), para que la latencia no cuente el tiempo
+    esperando hueco en el conector.
+    """
+    import aiohttp
+
+    async def conectada(sesion, contexto, params):
+        if contexto.trace_request_ctx is not None:
+            contexto.trace_request_ctx["conectada"] = time.monotonic()
+
+    traza = aiohttp.TraceConfig()
+    traza.on_connection_create_start.append(conectada)
+    traza.on_connection_reuseconn.append(conectada)
+    return traza
+
+
+async def peticion_async(sesion, url, controlador):
+    """
+    Versión aiohttp de `peticion`. Devuelve (status, html); status None si falla la red.
+    Si la sesión lleva `traza_conexiones()`, la latencia se mide desde que hay conexión.
+    """
+    import aiohttp
+
+    status, html = None, ""
+    for intento in range(controlador.max_reintentos + 1):
+        await controlador.esperar_async()
+        contexto = {}
+        inicio = time.monotonic()
+        try:
+            async with sesion.get(url, trace_request_ctx=contexto) as resp:
+                status, html = resp.status, await resp.text()
+                retry_after = leer_retry_after(resp.headers.get("Retry-After"), status)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            controlador.registrar(None, time.monotonic() - contexto.get("conectada", inicio))
+            print(f"  Error descargando {url}: {e}")
+            status, html = None, ""
+            if intento < controlador.max_reintentos:
+                await asyncio.sleep(controlador.espera_reintento(intento))
+            continue
+
+        controlador.registrar(status, time.monotonic() - contexto.get("conectada", inicio), retry_after)
+        if status not in REINTENTABLES:
+            break
+        if retry_after is None and intento < controlador.max_reintentos:
+            await asyncio.sleep(controlador.espera_reintento(intento))
+    return status, html
@@ -0,0 +1,262 @@
+"""
+Réplica local de autocasion.com para medir el scraper sin salir de la máquina.
+
+Sirve la portada con las marcas, las páginas de listado de cada marca y las fichas
+de detalle con la misma estructura HTML que esperan `extraer_marcas`,
+`parsear_listado` y `parsear_detalles`. Las páginas pueden ser sintéticas
+(generadas de forma determinista a partir de una semilla) o las grabadas en una
+`CacheHTML`. Se puede añadir latencia y provocar 429 y timeouts al azar.
+
+Uso (desde la carpeta Extraccion):
+    python -m utils.sitio_simulado --puerto 8000 --latencia 0.05 --prob-429 0.02
+"""
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from utils.parseo import DOMINIO
+from utils.cache_html import LISTADO
+
+RUTA_PORTADA = "/coches-ocasion"
+
+MARCAS = ["AUDI", "BMW", "CITROEN", "DACIA", "FIAT", "FORD", "HYUNDAI", "KIA", "MAZDA", "MERCEDES-BENZ",
+          "NISSAN", "OPEL", "PEUGEOT", "RENAULT", "SEAT", "SKODA", "TOYOTA", "VOLKSWAGEN", "VOLVO", "MINI"]
+MODELOS = ["Serie 1", "A3 Sportback", "Clio", "Ibiza", "Golf", "Corsa", "Qashqai", "Tucson", "Focus", "Octavia"]
+COMBUSTIBLES = ["Gasolina", "Diésel", "Eléctrico", "Híbrido", "Híbrido Enchufable"]
+UBICACIONES = ["Madrid", "Barcelona", "Valencia", "Sevilla", "Málaga", "Vizcaya", "Alicante", "Zaragoza"]
+CARROCERIAS = ["SUV", "Berlina", "Familiar", "Monovolumen", "Pequeño", "Deportivo o coupé"]
+
+
+def _slug(marca):
+    return marca.lower().replace(" ", "-")
+
+
+def _anuncio_tarjeta(ruta, titulo, tags):
+    lis = "".join(f"<li>{t}</li>" for t in tags)
+    return f'<a href="{ruta}"><h2 itemprop="name">{titulo}</h2><ul>{lis}</ul></a>'
+
+
+class SitioSimulado:
+    """
+    Servidor HTTP local (un hilo por conexión, keep-alive) que imita la web.
+    - `num_marcas`, `paginas_por_marca`, `anuncios_por_pagina`: tamaño del sitio sintético
+    - `prob_repetido`: fracción de anuncios que aparecen también en el listado de otra marca
+    - `latencia`: segundos de media por respuesta (±50%)
+    - `prob_429`: probabilidad de responder 429 con `Retry-After: retry_after`
+    - `prob_timeout`: probabilidad de no responder durante `espera_timeout` segundos
+      (por encima del timeout de 10s que usan los crawlers) y cortar la conexión
+    - `cache`: si se pasa una CacheHTML, se sirven las páginas grabadas en lugar de las sintéticas
+    Los listados y detalles llevan ETag y responden 304 a If-None-Match, como el modo incremental espera.
+    """
+
+    def __init__(self, num_marcas=10, paginas_por_marca=5, anuncios_por_pagina=20, prob_repetido=0.05,
+                 latencia=0.0, prob_429=0.0, retry_after=0.5, prob_timeout=0.0, espera_timeout=11.0,
+                 semilla=0, cache=None, host="127.0.0.1", puerto=0):
+        self.marcas = MARCAS[:num_marcas]
+        self.paginas_por_marca = paginas_por_marca
+        self.anuncios_por_pagina = anuncios_por_pagina
+        self.prob_repetido = prob_repetido
+        self.latencia = latencia
+        self.prob_429 = prob_429
+        self.retry_after = retry_after
+        self.prob_timeout = prob_timeout
+        self.espera_timeout = espera_timeout
+        self.semilla = semilla
+        self.cache = cache
+
+        self._azar = random.Random(semilla)
+        self._lock = threading.Lock()
+        self.estadisticas = Counter()
+
+        self._servidor = ThreadingHTTPServer((host, puerto), self._manejador())
+        self._servidor.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def dominio(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    # -- contenido sintético -------------------------------------------------
+
+    def _ruta_anuncio(self, marca, pagina, i):
+        rnd = random.Random(f"{self.semilla}-{marca}-{pagina}-{i}")
+        # Algunos anuncios también salen listados bajo otra marca
+        if rnd.random() < self.prob_repetido and len(self.marcas) > 1:
+            marca = self.marcas[(self.marcas.index(marca) + 1) % len(self.marcas)]
+        return f"/coches-ocasion/{_slug(marca)}/{_slug(marca)}-{pagina}-{i}.htm", marca
+
+    def _portada(self):
+        if self.cache is not None:
+            marcas = {m: urlsplit(u).path for u, _, _, m, p in self.cache.ultimas(LISTADO) if (p or 1) == 1}
+        else:
+            marcas = {m: f"/coches-segunda-mano/{_slug(m)}-ocasion" for m in self.marcas}
+        enlaces = "".join(f'<a class="icon" href="{ruta}">{m.title()}</a>' for m, ruta in marcas.items())
+        return f'<html><body><div class="acordeon brand-acordeon">{enlaces}</div></body></html>'
+
+    def _listado(self, marca, pagina):
+        if pagina > self.paginas_por_marca:
+            return "<html><body><p>No hay más resultados</p></body></html>"
+        tarjetas = []
+        for i in range(self.anuncios_por_pagina):
+            ruta, marca_anuncio = self._ruta_anuncio(marca, pagina, i)
+            rnd = random.Random(ruta)
+            titulo = f"{marca_anuncio} {rnd.choice(MODELOS)}"
+            tags = [str(rnd.randint(2008, 2024)), rnd.choice(COMBUSTIBLES),
+                    f"{rnd.randint(0, 250_000):,} km".replace(",", "."), rnd.choice(UBICACIONES)]
+            tarjetas.append(_anuncio_tarjeta(ruta, titulo, tags))
+        # Bloque de relacionados que el parser tiene que saltarse
+        tarjetas.append('<a href="/coches-ocasion/relacionado.htm"><p class="relacionados">Te puede interesar</p>'
+                        '<h2 itemprop="name">Relacionado</h2></a>')
+        num = (f'<div class="num"><a href="?page=1">1</a><a class="total_pages" href="?page={self.paginas_por_marca}">'
+               f'{self.paginas_por_marca}</a></div>')
+        return f"<html><body>{''.join(tarjetas)}{num}</body></html>"
+
+    def _detalle(self, ruta):
+        rnd = random.Random(ruta)
+        mes, anio = rnd.randint(1, 12), rnd.randint(2008, 2024)
+        ficha = [rnd.choice(["Manual", "Automático"]), f"Matriculado: {mes:02d}/{anio}", f"{rnd.randint(70, 300)} cv",
+                 f"{rnd.choice([3, 5])} Puertas", f"{rnd.choice([4, 5, 7])} asientos", rnd.choice(CARROCERIAS),
+                 f"Garantía: {rnd.choice([6, 12, 24])} meses"]
+        contado = rnd.randint(4_000, 60_000)
+        precios = [("Precio al contado:", contado), ("Precio financiado:", int(contado * 0.93))]
+        lis_ficha = "".join(f"<li>{d}</li>" for d in ficha)
+        lis_precios = "".join(f"<li><span>{k}</span><span>{v:,} €</span></li>".replace(",", ".") for k, v in precios)
+        return (f'<html><body><ul class="datos-basicos-ficha">{lis_ficha}</ul>'
+                f'<ul class="tabla-precio">{lis_precios}</ul></body></html>')
+
+    def pagina(self, ruta_completa):
+        """HTML de una ruta (con query) o None si no existe"""
+        partes = urlsplit(ruta_completa)
+        ruta = partes.path
+        if ruta == RUTA_PORTADA:
+            return self._portada()
+        if self.cache is not None:
+            return self.cache.leer(DOMINIO + ruta_completa)
+
+        if ruta.startswith("/coches-segunda-mano/"):
+            slug = ruta.rsplit("/", 1)[-1].removesuffix("-ocasion")
+            marcas = {_slug(m): m for m in self.marcas}
+            if slug not in marcas:
+                return None
+            pagina = int(parse_qs(partes.query).get("page", ["1"])[0])
+            return self._listado(marcas[slug], pagina)
+        if ruta.startswith("/coches-ocasion/") and ruta.endswith(".htm"):
+            return self._detalle(ruta)
+        return None
+
+    def anuncios_esperados(self):
+        """URLs únicas de anuncio que tiene el sitio sintético (lo que debería sacar un crawl completo)"""
+        return {
+            self.dominio + self._ruta_anuncio(marca, pagina, i)[0]
+            for marca in self.marcas
+            for pagina in range(1, self.paginas_por_marca + 1)
+            for i in range(self.anuncios_por_pagina)
+        }
+
+    # -- servidor ------------------------------------------------------------
+
+    def _sorteo(self):
+        with self._lock:
+            return self._azar.random(), self._azar.uniform(0.5, 1.5)
+
+    def _contar(self, clave):
+        with self._lock:
+            self.estadisticas[clave] += 1
+
+    def _manejador(self):
+        sitio = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, status, cuerpo=b"", cabeceras=None):
+                self.send_response(status)
+                for clave, valor in (cabeceras or {}).items():
+                    self.send_header(clave, valor)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                sitio._contar("peticiones")
+                suerte, factor = sitio._sorteo()
+                if sitio.latencia:
+                    time.sleep(sitio.latencia * factor)
+
+                if suerte < sitio.prob_timeout:
+                    sitio._contar("timeouts")
+                    time.sleep(sitio.espera_timeout)
+                    self.close_connection = True
+                    return
+                if suerte < sitio.prob_timeout + sitio.prob_429:
+                    sitio._contar(429)
+                    self._responder(429, b"Too Many Requests", {"Retry-After": str(sitio.retry_after)})
+                    return
+
+                html = sitio.pagina(self.path)
+                if html is None:
+                    sitio._contar(404)
+                    self._responder(404, b"Not Found")
+                    return
+
+                cuerpo = html.encode("utf-8")
+                etag = '"' + hashlib.sha1(cuerpo).hexdigest() + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    sitio._contar(304)
+                    self._responder(304, cabeceras={"ETag": etag})
+                    return
+                sitio._contar(200)
+                self._responder(200, cuerpo, {"Content-Type": "text/html; charset=utf-8", "ETag": etag})
+
+        return Manejador
+
+    def iniciar(self):
+        """Arranca el servidor en segundo plano y devuelve el dominio (http://127.0.0.1:puerto)"""
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._hilo.start()
+        return self.dominio
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.parar()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Réplica local de autocasion.com")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--marcas", type=int, default=10)
+    parser.add_argument("--paginas", type=int, default=5)
+    parser.add_argument("--anuncios", type=int, default=20)
+    parser.add_argument("--latencia", type=float, default=0.0)
+    parser.add_argument("--prob-429", type=float, default=0.0)
+    parser.add_argument("--prob-timeout", type=float, default=0.0)
+    parser.add_argument("--cache", help="Carpeta de CacheHTML con páginas grabadas")
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache:
+        from utils.cache_html import CacheHTML
+        cache = CacheHTML(args.cache)
+    sitio = SitioSimulado(args.marcas, args.paginas, args.anuncios, latencia=args.latencia,
+                          prob_429=args.prob_429, prob_timeout=args.prob_timeout, cache=cache, puerto=args.puerto)
+    print(f"Sirviendo en {sitio.dominio}{RUTA_PORTADA} (Ctrl+C para parar)")
+    try:
+        sitio._servidor.serve_forever()
+    except KeyboardInterrupt:
+        sitio.parar()
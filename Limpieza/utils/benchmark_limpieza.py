@@ -0,0 +1,292 @@
+"""
+Benchmark de la limpieza fila a fila (notebook original) frente a `utils.limpieza`.
+
+Uso (desde la carpeta Limpieza):
+    python -m utils.benchmark_limpieza --filas 100000 1000000
+    python -m utils.benchmark_limpieza --listas --filas 100000 1000000 --procesos 4
+    python -m utils.benchmark_limpieza --memoria --filas 100000 300000 900000
+    python -m utils.benchmark_limpieza --incremental --filas 200000
+    python -m utils.benchmark_limpieza --paralelo 1 2 4 8 16 --filas 1000000
+
+Genera un `anuncios_completo.csv` sintético de cada tamaño, lo limpia con las dos
+versiones, comprueba que el CSV resultante es idéntico byte a byte y muestra los tiempos.
+Con `--listas` el CSV es de los antiguos (solo listas) y se mide el desglose de
+`tags`, `precios` y `detalles_ficha`: funciones del notebook frente a `utils.listas`
+con un proceso y con `--procesos`.
+Con `--memoria` se compara el pico de memoria (RSS) de `limpiar_csv` con el de
+`utils.por_lotes`, cada uno en un proceso aparte.
+Con `--incremental` se simulan varias ejecuciones (crawl que añade un 5%, 03 que
+reescribe los timestamps, anuncios cambiados, anuncios borrados) y se compara
+`utils.incremental` con la limpieza completa.
+Con `--paralelo` se limpia un CSV antiguo (listas, la parte con más regex) con cada
+número de procesos y se comprueba que la salida es la misma que con uno.
+"""
+import os
+import sys
+import time
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+from utils.limpieza import limpiar, limpiar_csv
+from utils.listas import desglosar_listas, COLUMNAS
+from utils.incremental import limpiar_incremental, SIN_HUELLA
+from utils.referencia import (limpiar_referencia, limpiar_tags, procesar_precios, procesar_detalles_ficha,
+                              COORDENADAS_UBICACIONES)
+
+MARCAS = np.array(["AUDI", "BMW", "SEAT", "MERCEDES-BENZ", "RENAULT", "PEUGEOT", "TOYOTA", "VOLKSWAGEN"])
+MODELOS = np.array(["A3 Sportback", "Serie 1", "Ibiza", "Clase A", "Clio", "208", "Corolla", "Golf"])
+COMBUSTIBLES = np.array(["Gasolina", "Diésel", "Eléctrico", "Híbrido", "Híbrido Enchufable", "Gas"], dtype=object)
+TRANSMISIONES = np.array(["Manual", "Automático"], dtype=object)
+CARROCERIAS = np.array(["SUV", "Berlina", "Familiar", "Pequeño", "Deportivo", "Monovolumen"], dtype=object)
+UBICACIONES = np.array(list(COORDENADAS_UBICACIONES) + ["Málaga", "Ávila", "Córdoba", "Castellón", "Desconocida"],
+                       dtype=object)
+
+
+def _con_nulos(valores, rng, prob):
+    valores = pd.Series(valores)
+    return valores.mask(rng.random(len(valores)) < prob)
+
+
+def generar_datos(n, semilla=0):
+    """DataFrame con las columnas de `anuncios_completo.csv` (listas + campos tipados)"""
+    rng = np.random.default_rng(semilla)
+    marca = MARCAS[rng.integers(0, len(MARCAS), n)]
+    modelo = MODELOS[rng.integers(0, len(MODELOS), n)]
+    ids = pd.Series(np.arange(n)).astype(str)
+    desde = np.where(rng.random(n) < 0.1, "desde-", "")
+    url = "https://www.autocasion.com/coches-ocasion/" + pd.Series(np.char.lower(marca)) + "-" + desde + ids
+    contado = _con_nulos(rng.integers(2_000, 90_000, n), rng, 0.05)
+    return pd.DataFrame({
+        "id_extraccion": url,
+        "timestamp_extraccion": "2025-05-01T10:00:00.123456",
+        "marca": marca,
+        "titulo": pd.Series(marca) + " " + pd.Series(modelo),
+        "url": url,
+        "tags": "['2019', 'Diésel', '85.000 km', 'Madrid']",
+        "es_demo": (rng.random(n) < 0.02).astype(int),
+        "es_km0": (rng.random(n) < 0.02).astype(int),
+        "año": _con_nulos(rng.integers(2000, 2025, n), rng, 0.03),
+        "combustible": _con_nulos(COMBUSTIBLES[rng.integers(0, len(COMBUSTIBLES), n)], rng, 0.05),
+        "kilometraje": _con_nulos(rng.integers(0, 300_000, n).astype(float), rng, 0.05),
+        "ubicacion": _con_nulos(UBICACIONES[rng.integers(0, len(UBICACIONES), n)], rng, 0.02),
+        "detalles_ficha": "['Manual', 'Matriculado: 03/2019', '150 cv']",
+        "precios": "['Precio al contado: 18.500 €']",
+        "precio_contado": contado,
+        "precio_financiado": _con_nulos(rng.integers(2_000, 90_000, n), rng, 0.5),
+        "precio_nuevo": _con_nulos(rng.integers(10_000, 90_000, n), rng, 0.7),
+        "garantia": _con_nulos(rng.choice([0, 6, 12, 24, 3660], n), rng, 0.3),
+        "transmision": _con_nulos(TRANSMISIONES[rng.integers(0, 2, n)], rng, 0.1),
+        "matriculacion": "03/2019",
+        "potencia_cv": _con_nulos(rng.integers(60, 400, n), rng, 0.1),
+        "puertas": _con_nulos(rng.choice([3, 5], n), rng, 0.2),
+        "asientos": _con_nulos(rng.choice([2, 4, 5, 7], n), rng, 0.2),
+        "tipo_carroceria": _con_nulos(CARROCERIAS[rng.integers(0, len(CARROCERIAS), n)], rng, 0.2),
+        "mes": _con_nulos(rng.integers(1, 13, n), rng, 0.1),
+    })
+
+
+def _lista(*partes):
+    """repr de la lista con los elementos no nulos de cada fila, como la guardaba la extracción"""
+    return [str([e for e in fila if isinstance(e, str)]) for fila in zip(*partes)]
+
+
+def generar_listas(n, semilla=0):
+    """DataFrame como los `anuncios_completo.csv` antiguos: sin campos tipados, solo las listas"""
+    rng = np.random.default_rng(semilla)
+    df = generar_datos(n, semilla)
+
+    def alguno(valores, prob):
+        return np.where(rng.random(n) < prob, np.asarray(valores, dtype=object)[rng.integers(0, len(valores), n)],
+                        None)
+
+    año = df["año"].map(lambda x: str(int(x)) if x == x else None)
+    km = df["kilometraje"].map(lambda x: f"{int(x):,} km".replace(",", ".") if x == x else None)
+    extra_tag = alguno(["Demo", "Coche km 0", "Etiqueta ECO", "IVA deducible"], 0.15)
+    df["tags"] = _lista(extra_tag, año, df["combustible"], km, df["ubicacion"])
+
+    euros = lambda x: f"{int(x):,} €".replace(",", ".")
+    contado = df["precio_contado"].map(lambda x: f"Precio al contado: {euros(x)}" if x == x else None)
+    financiado = df["precio_financiado"].map(lambda x: f"Precio financiado: {euros(x)}" if x == x else None)
+    nuevo = df["precio_nuevo"].map(lambda x: f"Precio de venta nuevo* {euros(x)}" if x == x else None)
+    df["precios"] = _lista(contado, financiado, nuevo)
+
+    garantia = alguno(["Garantía: 12 meses", "Garantía: 24 meses", "Garantía: Sí", "Garantía: No",
+                       "Garantía: del fabricante"], 0.8)
+    mes = pd.Series(rng.integers(1, 13, n)).map("{:02d}".format)
+    matriculado = np.where(rng.random(n) < 0.9, "Matriculado: " + mes + "/" + año.fillna("2019"), None)
+    potencia = df["potencia_cv"].map(lambda x: f"{int(x)} cv" if x == x else None)
+    puertas = df["puertas"].map(lambda x: f"{int(x)} Puertas" if x == x else None)
+    asientos = df["asientos"].map(lambda x: f"{int(x)} asientos" if x == x else None)
+    carroceria = alguno(["SUV", "Berlina mediana o grande", "Deportivo o coupé", "Pequeño", "Familiar",
+                         "4x4, SUV o pickup", "Monovolumen"], 0.8)
+    otra_carroceria = alguno(["Coupé", "Descapotable"], 0.05)
+    df["detalles_ficha"] = _lista(garantia, df["transmision"], matriculado, potencia, puertas, asientos,
+                                  carroceria, otra_carroceria)
+
+    tipadas = [c for columnas in COLUMNAS.values() for c in columnas]
+    return df.drop(columns=tipadas)
+
+
+def _huella(df):
+    return hashlib.sha256(df.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def medir(n, semilla=0):
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "anuncios_completo.csv")
+        generar_datos(n, semilla).to_csv(ruta, index=False)
+        df = pd.read_csv(ruta)
+
+    inicio = time.perf_counter()
+    antes = limpiar_referencia(df.copy())
+    t_antes = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    despues = limpiar(df.copy(), 1, ruta_cache=None)
+    t_despues = time.perf_counter() - inicio
+
+    identicos = _huella(antes) == _huella(despues)
+    print(f"{n:>9} filas   fila a fila: {t_antes:7.2f}s   vectorizado: {t_despues:6.2f}s   "
+          f"x{t_antes / t_despues:5.1f}   {'CSV idéntico' if identicos else 'CSV DISTINTO'}")
+    return {"filas": n, "fila_a_fila_s": round(t_antes, 2), "vectorizado_s": round(t_despues, 2),
+            "identicos": identicos}
+
+
+def medir_listas(n, procesos=None, semilla=0):
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "anuncios_completo.csv")
+        generar_listas(n, semilla).to_csv(ruta, index=False)
+        df = pd.read_csv(ruta)
+
+    inicio = time.perf_counter()
+    antes = procesar_detalles_ficha(procesar_precios(limpiar_tags(df)))
+    t_antes = time.perf_counter() - inicio
+
+    tiempos = {}
+    for etiqueta, num in [("1 proceso", 1), (f"{procesos or os.cpu_count()} procesos", procesos)]:
+        inicio = time.perf_counter()
+        despues = desglosar_listas(df.copy(), num).drop(columns=list(COLUMNAS))
+        despues["garantia"] = despues["garantia"].astype("Int64")
+        tiempos[etiqueta] = time.perf_counter() - inicio
+        if _huella(antes) != _huella(despues[antes.columns]):
+            print(f"{n:>9} filas   {etiqueta}: COLUMNAS DISTINTAS")
+
+    print(f"{n:>9} filas   fila a fila: {t_antes:7.2f}s   " + "   ".join(
+        f"{etiqueta}: {t:6.2f}s x{t_antes / t:5.1f}" for etiqueta, t in tiempos.items()))
+    return {"filas": n, "fila_a_fila_s": round(t_antes, 2), **{k: round(v, 2) for k, v in tiempos.items()}}
+
+
+def medir_paralelo(n, lista_procesos=(1, 2, 4, 8, 16), semilla=0):
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "anuncios_completo.csv")
+        generar_listas(n, semilla).to_csv(ruta, index=False)
+        df = pd.read_csv(ruta)
+
+    tiempos, huellas = {}, {}
+    for procesos in lista_procesos:
+        inicio = time.perf_counter()
+        huellas[procesos] = _huella(limpiar(df.copy(), procesos, ruta_cache=None))
+        tiempos[procesos] = time.perf_counter() - inicio
+
+    base = tiempos[lista_procesos[0]]
+    print(f"{n:>9} filas   ({os.cpu_count()} núcleos)")
+    for procesos, t in tiempos.items():
+        igual = huellas[procesos] == huellas[lista_procesos[0]]
+        print(f"{'':>9}   {procesos:>3} procesos: {t:7.2f}s   x{base / t:5.1f}   "
+              f"{'CSV idéntico' if igual else 'CSV DISTINTO'}")
+    return {"filas": n, **{f"{p}_procesos_s": round(t, 2) for p, t in tiempos.items()}}
+
+
+def _pico_memoria(codigo):
+    """Segundos y pico de RSS en MB de ejecutar `codigo` en un intérprete nuevo (VmHWM, solo Linux)"""
+    codigo += "\nprint([l.split()[1] for l in open('/proc/self/status') if l.startswith('VmHWM')][0])"
+    inicio = time.perf_counter()
+    salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - inicio, int(salida.split()[-1]) / 1024
+
+
+def medir_memoria(n, tamano_lote=100_000, semilla=0):
+    with tempfile.TemporaryDirectory() as carpeta:
+        entrada = os.path.join(carpeta, "anuncios_completo.csv")
+        generar_datos(n, semilla).to_csv(entrada, index=False)
+        completo, lotes = os.path.join(carpeta, "completo.csv"), os.path.join(carpeta, "lotes.csv")
+        t_completo, mb_completo = _pico_memoria(
+            f"from utils.limpieza import limpiar_csv; limpiar_csv({entrada!r}, {completo!r}, ruta_cache=None)")
+        t_lotes, mb_lotes = _pico_memoria(
+            f"from utils.por_lotes import limpiar_por_lotes; "
+            f"limpiar_por_lotes({entrada!r}, {lotes!r}, {tamano_lote}, ruta_cache=None)")
+        with open(completo, "rb") as a, open(lotes, "rb") as b:
+            identicos = a.read() == b.read()
+        mb_csv = os.path.getsize(entrada) / 2**20
+
+    print(f"{n:>9} filas ({mb_csv:5.0f} MB)   entero: {mb_completo:6.0f} MB {t_completo:6.2f}s   "
+          f"por lotes: {mb_lotes:6.0f} MB {t_lotes:6.2f}s   {'CSV idéntico' if identicos else 'CSV DISTINTO'}")
+    return {"filas": n, "entero_mb": round(mb_completo), "lotes_mb": round(mb_lotes), "identicos": identicos}
+
+
+def medir_incremental(n, semilla=0):
+    datos = generar_datos(n, semilla)
+    base = int(n * 0.95)
+    # 03 reescribe el CSV completo con la hora de esta ejecución
+    releidos = datos.assign(timestamp_extraccion="2025-06-01T10:00:00.654321")
+    cambiados = releidos.iloc[:base].copy()
+    cambiados.loc[1000:1199, "precio_contado"] = 12345
+    with tempfile.TemporaryDirectory() as carpeta:
+        entrada, salida, completa = (os.path.join(carpeta, f) for f in ("crudo.csv", "inc.csv", "ref.csv"))
+        rutas = {r: os.path.join(carpeta, r) for r in ("huellas", "estado", "ubicaciones")}
+
+        def paso(nombre, escribir):
+            escribir()
+            inicio = time.perf_counter()
+            limpiar_incremental(entrada, salida, rutas["huellas"], rutas["estado"], rutas["ubicaciones"],
+                                ruta_cache=None)
+            t_inc = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            limpiar_csv(entrada, completa, quitar_duplicados=True, ruta_cache=None)
+            t_completa = time.perf_counter() - inicio
+            with open(salida, "rb") as a, open(completa, "rb") as b:
+                identicos = a.read() == b.read()
+            # Las filas que no cambian conservan el timestamp de cuando se limpiaron
+            sin_fecha = [pd.read_csv(r, dtype=str, keep_default_na=False).drop(columns=SIN_HUELLA)
+                         for r in (salida, completa)]
+            resultado = ("CSV idéntico" if identicos else "igual salvo timestamps"
+                         if sin_fecha[0].equals(sin_fecha[1]) else "CSV DISTINTO")
+            print(f"{n:>9} filas   {nombre:<26} incremental: {t_inc:6.2f}s   completa: {t_completa:6.2f}s   "
+                  f"{resultado}")
+
+        paso("primera ejecución", lambda: datos.iloc[:base].to_csv(entrada, index=False))
+        paso("sin cambios", lambda: None)
+        paso("crawl añade un 5%", lambda: datos.iloc[base:].to_csv(entrada, index=False, mode="a", header=False))
+        paso("timestamps nuevos", lambda: releidos.to_csv(entrada, index=False))
+        paso("200 anuncios cambiados",
+             lambda: pd.concat([cambiados, releidos.iloc[base:]]).to_csv(entrada, index=False))
+        paso("1000 anuncios borrados", lambda: releidos.iloc[1000:].to_csv(entrada, index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la limpieza vectorizada")
+    parser.add_argument("--filas", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--listas", action="store_true", help="medir el desglose de las listas de CSV antiguos")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--memoria", action="store_true", help="pico de memoria entero frente a por lotes")
+    parser.add_argument("--lote", type=int, default=100_000)
+    parser.add_argument("--incremental", action="store_true", help="limpieza incremental frente a completa")
+    parser.add_argument("--paralelo", type=int, nargs="+", metavar="PROCESOS",
+                        help="escalado de `limpiar` con cada número de procesos")
+    args = parser.parse_args()
+    for n in args.filas:
+        if args.paralelo:
+            medir_paralelo(n, args.paralelo)
+        elif args.incremental:
+            medir_incremental(n)
+        elif args.memoria:
+            medir_memoria(n, args.lote)
+        elif args.listas:
+            medir_listas(n, args.procesos)
+        else:
+            medir(n)
@@ -0,0 +1,300 @@
+"""
+Limpieza incremental de `anuncios_completo.csv`: se limpian solo los anuncios nuevos o
+cambiados desde la última vez y se llevan a `datos_limpios.csv`.
+
+Uso (desde la carpeta Limpieza):
+    python -m utils.incremental anuncios_completo.csv datos_limpios.csv
+
+Junto a la salida se guardan:
+- `huellas_limpieza.csv`: hash del texto crudo de cada `id_extraccion` ya limpiado (sin
+  `timestamp_extraccion`, que 03 reescribe en cada ejecución aunque el anuncio no cambie)
+- `estado_limpieza.json`: tipos de las columnas de la salida y huella del crudo
+- `ubicaciones.csv`: ubicaciones con sus coordenadas (la tabla `ubicaciones` de la BD),
+  que solo se reescribe si cambia de verdad
+
+Si lo único que hay son anuncios nuevos al final del crudo (lo normal tras un crawl),
+se añaden al final de la salida sin releerla ni reescribirla. Si además el crudo es el
+de la vez anterior con líneas añadidas (se comprueba con un blake2b de sus bytes),
+solo se lee lo añadido.
+
+Si hay anuncios cambiados o borrados, se limpian solo los nuevos y cambiados y se
+mezclan por `id_extraccion` con la salida anterior (leída como texto, así que las filas
+que no cambian se escriben igual): las cambiadas se sustituyen, las nuevas se insertan
+y las borradas se quitan, en el orden del crudo. Las filas sin cambios conservan su
+`timestamp_extraccion` de cuando se limpiaron. Solo se limpia todo la primera vez, o si
+las filas limpias no encajan con los tipos de la salida anterior.
+
+Salvo por esos `timestamp_extraccion`, el resultado es el de
+`limpiar_csv(..., quitar_duplicados=True)` (un anuncio por id).
+"""
+import io
+import os
+import json
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils.limpieza import limpiar, limpiar_csv, deduplicar
+from utils.listas import desglosar_listas
+from utils.nomenclator import RUTA_CACHE
+
+RUTA_HUELLAS = "huellas_limpieza.csv"
+RUTA_ESTADO = "estado_limpieza.json"
+RUTA_UBICACIONES = "ubicaciones.csv"
+# Columnas que cambian sin que cambie el anuncio: no cuentan para la huella
+SIN_HUELLA = ["timestamp_extraccion"]
+
+
+def _escribir(ruta, texto):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8", newline="") as f:
+        f.write(texto)
+    os.replace(temporal, ruta)
+
+
+def _leer_texto(ruta):
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8", newline="") as f:
+        return f.read()
+
+
+def huellas(crudo):
+    """Hash de 64 bits del texto de cada fila sin `SIN_HUELLA` (no depende de los tipos que deduzca pandas)"""
+    return pd.util.hash_pandas_object(crudo.drop(columns=SIN_HUELLA, errors="ignore"), index=False).to_numpy()
+
+
+def _huella_fichero(ruta, num_bytes=None):
+    """blake2b de los primeros `num_bytes` bytes del fichero (todo si es None)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(ruta, "rb") as f:
+        restantes = os.path.getsize(ruta) if num_bytes is None else num_bytes
+        while restantes > 0:
+            bloque = f.read(min(restantes, 1 << 24))
+            if not bloque:
+                break
+            h.update(bloque)
+            restantes -= len(bloque)
+    return h.hexdigest()
+
+
+def _estado(df, entrada):
+    """Tipos de la salida, columnas de fecha con fracción de segundo y huella del crudo"""
+    fechas = df.select_dtypes("datetime")
+    return {
+        "tipos": {c: str(t) for c, t in df.dtypes.items()},
+        "con_fraccion": [c for c in fechas.columns if (fechas[c].dt.microsecond.fillna(0) != 0).any()],
+        "crudo": {"bytes": os.path.getsize(entrada), "blake2b": _huella_fichero(entrada)},
+    }
+
+
+def _cola_del_crudo(entrada, estado):
+    """Las filas añadidas al crudo desde la última vez, o None si el principio ha cambiado"""
+    previo = estado.get("crudo")
+    if not previo or os.path.getsize(entrada) < previo["bytes"] \
+            or _huella_fichero(entrada, previo["bytes"]) != previo["blake2b"]:
+        return None
+    with open(entrada, "rb") as f:
+        cabecera = f.readline()
+        f.seek(previo["bytes"])
+        cola = f.read()
+    return pd.read_csv(io.BytesIO(cabecera + cola), dtype=str, keep_default_na=False)
+
+
+def _para_anexar(nuevas, estado):
+    """
+    Las filas nuevas con los tipos de la salida anterior, o None si no se pueden añadir
+    al final sin cambiar cómo se escribe alguna columna (hay que reescribirla entera)
+    """
+    tipos = estado["tipos"]
+    if list(nuevas.columns) != list(tipos):
+        return None
+    nuevas = nuevas.copy()
+    fechas = nuevas.select_dtypes("datetime")
+    con_fraccion = [c for c in fechas.columns if (fechas[c].dt.microsecond.fillna(0) != 0).any()]
+    for c, previo in tipos.items():
+        serie = nuevas[c]
+        if str(serie.dtype) == previo or serie.isna().all():
+            continue
+        if previo.startswith("datetime") and serie.dtype.kind == "M":
+            if (c in con_fraccion) != (c in estado["con_fraccion"]):
+                return None
+        elif previo.startswith("float") and isinstance(serie.dtype, np.dtype) and serie.dtype.kind in "iu":
+            nuevas[c] = serie.astype(previo)
+        elif previo in ("object", "str", "string") and serie.dtype in ("object", "str", "string"):
+            continue
+        else:
+            return None
+    return nuevas
+
+
+def _limpiar_filas(texto, ruta_cache=RUTA_CACHE):
+    """Limpia un subconjunto de filas crudas (leídas como texto) con los tipos que deduce pandas"""
+    crudo = pd.read_csv(io.StringIO(texto.to_csv(index=False)))
+    crudo = desglosar_listas(crudo)
+    decimales = [c for c, t in crudo.dtypes.items() if t.kind == "f"]
+    limpio = limpiar(crudo, ruta_cache=ruta_cache)
+    # Una columna con NaN solo en filas que la limpieza descarta sigue siendo decimal, como en la completa
+    for c in decimales:
+        if c in limpio.columns and isinstance(limpio[c].dtype, np.dtype) and limpio[c].dtype.kind in "iu":
+            limpio[c] = limpio[c].astype("float64")
+    return limpio
+
+
+def tabla_ubicaciones(df):
+    return (df[["ubicacion", "latitud", "longitud"]].dropna(subset=["ubicacion"]).drop_duplicates("ubicacion")
+            .sort_values("ubicacion").reset_index(drop=True))
+
+
+def actualizar_ubicaciones(tabla, ruta_ubicaciones=RUTA_UBICACIONES):
+    """Reescribe la tabla de ubicaciones solo si ha cambiado; True si se ha reescrito"""
+    texto = tabla.to_csv(index=False)
+    if texto == _leer_texto(ruta_ubicaciones):
+        return False
+    _escribir(ruta_ubicaciones, texto)
+    return True
+
+
+def _ubicaciones_con(nuevas, salida, ruta_ubicaciones):
+    """Tabla de ubicaciones tras añadir `nuevas` al final de la salida (la anterior más las de `nuevas`)"""
+    if os.path.exists(ruta_ubicaciones):
+        anteriores = pd.read_csv(ruta_ubicaciones, keep_default_na=False, na_values={"latitud": [""], "longitud": [""]},
+                                 float_precision="round_trip")
+    else:
+        anteriores = pd.read_csv(salida, usecols=["ubicacion", "latitud", "longitud"], float_precision="round_trip")
+    return tabla_ubicaciones(pd.concat([anteriores, nuevas[["ubicacion", "latitud", "longitud"]]], ignore_index=True))
+
+
+def _anexar(nuevas, filas, huellas_nuevas, entrada, salida, ruta_huellas, ruta_estado, estado):
+    """Añade las filas limpias al final de la salida; False si hay que reescribirla entera"""
+    nuevas = _para_anexar(nuevas, estado)
+    if nuevas is None:
+        return False
+    nuevas.to_csv(salida, index=False, mode="a", header=False)
+    pd.DataFrame({"id_extraccion": filas["id_extraccion"], "huella": huellas_nuevas}).to_csv(
+        ruta_huellas, index=False, mode="a", header=False)
+    estado["crudo"] = {"bytes": os.path.getsize(entrada), "blake2b": _huella_fichero(entrada)}
+    _escribir(ruta_estado, json.dumps(estado, indent=2) + "\n")
+    return True
+
+
+def _mezclar(nuevas, crudo, cambiadas, entrada, salida, ruta_huellas, ruta_estado, estado, actuales):
+    """
+    Sustituye en la salida las filas de los ids de `cambiadas` por `nuevas` (ya limpias, o
+    None si no hay), quita las de ids que ya no están en el crudo y deja las filas en el
+    orden del crudo; False si `nuevas` no se puede escribir con los tipos de la salida anterior
+    """
+    anterior = pd.read_csv(salida, dtype=str, keep_default_na=False)
+    if nuevas is None:
+        nuevas = anterior.iloc[:0]
+    else:
+        nuevas = _para_anexar(nuevas, estado)
+        if nuevas is None:
+            return False
+        # Las filas limpias pasadas a texto tal y como las escribiría `to_csv`
+        nuevas = pd.read_csv(io.StringIO(nuevas.to_csv(index=False)), dtype=str, keep_default_na=False)
+    ids = crudo["id_extraccion"]
+    quedan = anterior["id_extraccion"].isin(ids[~cambiadas])
+    mezcla = pd.concat([anterior[quedan], nuevas], ignore_index=True)
+    posicion = pd.Series(np.arange(len(ids)), index=ids.to_numpy())
+    mezcla = mezcla.iloc[np.argsort(posicion.loc[mezcla["id_extraccion"]].to_numpy(), kind="stable")]
+
+    # Primero la salida y luego el estado: si se corta a medias, la próxima vez se repite el trabajo
+    mezcla.to_csv(f"{salida}.tmp", index=False)
+    os.replace(f"{salida}.tmp", salida)
+    _escribir(ruta_huellas, pd.DataFrame({"id_extraccion": ids, "huella": actuales}).to_csv(index=False))
+    estado["crudo"] = {"bytes": os.path.getsize(entrada), "blake2b": _huella_fichero(entrada)}
+    _escribir(ruta_estado, json.dumps(estado, indent=2) + "\n")
+    return True
+
+
+def _limpieza_completa(entrada, salida, ids, actuales, ruta_huellas, ruta_estado, ruta_cache):
+    """`limpiar_csv` de todo el crudo y el índice de huellas nuevo"""
+    # Primero la salida y luego el estado: si se corta a medias, la próxima vez se repite el trabajo
+    df = limpiar_csv(entrada, f"{salida}.tmp", quitar_duplicados=True, ruta_cache=ruta_cache)
+    os.replace(f"{salida}.tmp", salida)
+    _escribir(ruta_huellas, pd.DataFrame({"id_extraccion": ids, "huella": actuales}).to_csv(index=False))
+    _escribir(ruta_estado, json.dumps(_estado(df, entrada), indent=2) + "\n")
+    return df
+
+
+def limpiar_incremental(entrada="anuncios_completo.csv", salida="datos_limpios.csv", ruta_huellas=RUTA_HUELLAS,
+                        ruta_estado=RUTA_ESTADO, ruta_ubicaciones=RUTA_UBICACIONES, ruta_cache=RUTA_CACHE):
+    """
+    Actualiza `salida` limpiando solo los anuncios nuevos o cambiados; devuelve cuántos son.
+    La primera vez limpia todo.
+    """
+    previas = estado = None
+    if all(os.path.exists(r) for r in (salida, ruta_huellas, ruta_estado)):
+        previas = pd.read_csv(ruta_huellas, dtype={"id_extraccion": str, "huella": np.uint64},
+                              keep_default_na=False).set_index("id_extraccion")["huella"]
+        with open(ruta_estado, encoding="utf-8") as f:
+            estado = json.load(f)
+
+    # Caso rápido: el crudo solo ha crecido por el final
+    cola = _cola_del_crudo(entrada, estado) if estado else None
+    if cola is not None:
+        cola = deduplicar(cola)
+        cola = cola[~cola["id_extraccion"].isin(previas.index)].reset_index(drop=True)
+        if cola.empty:
+            estado["crudo"] = {"bytes": os.path.getsize(entrada), "blake2b": _huella_fichero(entrada)}
+            _escribir(ruta_estado, json.dumps(estado, indent=2) + "\n")
+            print(f"{salida} ya está al día ({len(previas)} anuncios)")
+            return 0
+        nuevas = _limpiar_filas(cola, ruta_cache)
+        if _anexar(nuevas, cola, huellas(cola), entrada, salida, ruta_huellas, ruta_estado, estado):
+            tabla = _ubicaciones_con(nuevas, salida, ruta_ubicaciones)
+            print(f"{len(cola)} anuncios nuevos al final del crudo, añadidos a {salida}"
+                  + (f"; actualizado {ruta_ubicaciones}" if actualizar_ubicaciones(tabla, ruta_ubicaciones) else ""))
+            return len(cola)
+
+    crudo = deduplicar(pd.read_csv(entrada, dtype=str, keep_default_na=False))
+    ids = crudo["id_extraccion"]
+    actuales = huellas(crudo)
+    if previas is None:
+        tabla = tabla_ubicaciones(_limpieza_completa(entrada, salida, ids, actuales, ruta_huellas, ruta_estado,
+                                                     ruta_cache))
+        print(f"{len(crudo)} anuncios limpiados, escrito {salida}"
+              + (f"; actualizado {ruta_ubicaciones}" if actualizar_ubicaciones(tabla, ruta_ubicaciones) else ""))
+        return len(crudo)
+
+    conocidas = ids.isin(previas.index).to_numpy()
+    cambiadas = ~conocidas
+    cambiadas[conocidas] = previas.loc[ids[conocidas]].to_numpy() != actuales[conocidas]
+    borradas = int((~previas.index.isin(ids)).sum())
+    if not cambiadas.any() and not borradas:
+        estado["crudo"] = {"bytes": os.path.getsize(entrada), "blake2b": _huella_fichero(entrada)}
+        _escribir(ruta_estado, json.dumps(estado, indent=2) + "\n")
+        print(f"{salida} ya está al día ({len(crudo)} anuncios)")
+        return 0
+
+    # Solo anuncios nuevos y todos detrás de los ya limpiados: basta con añadirlos al final
+    al_final = not borradas and not conocidas[cambiadas].any() and cambiadas[np.argmax(cambiadas):].all()
+    nuevas = _limpiar_filas(crudo[cambiadas], ruta_cache) if cambiadas.any() else None
+    if al_final and _anexar(nuevas, crudo[cambiadas], actuales[cambiadas], entrada, salida, ruta_huellas,
+                            ruta_estado, estado):
+        tabla = _ubicaciones_con(nuevas, salida, ruta_ubicaciones)
+        accion = "añadidos al final de"
+    elif _mezclar(nuevas, crudo, cambiadas, entrada, salida, ruta_huellas, ruta_estado, estado, actuales):
+        tabla = tabla_ubicaciones(pd.read_csv(salida, usecols=["ubicacion", "latitud", "longitud"],
+                                              float_precision="round_trip"))
+        accion = "mezclados por id en"
+    else:
+        tabla = tabla_ubicaciones(_limpieza_completa(entrada, salida, ids, actuales, ruta_huellas, ruta_estado,
+                                                     ruta_cache))
+        accion = "limpieza completa de"
+
+    print(f"{int(cambiadas.sum())} anuncios nuevos o cambiados de {len(crudo)} ({borradas} ya no están), "
+          f"{accion} {salida}"
+          + (f"; actualizado {ruta_ubicaciones}" if actualizar_ubicaciones(tabla, ruta_ubicaciones) else ""))
+    return int(cambiadas.sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Limpieza incremental de anuncios_completo.csv")
+    parser.add_argument("entrada", nargs="?", default="anuncios_completo.csv")
+    parser.add_argument("salida", nargs="?", default="datos_limpios.csv")
+    args = parser.parse_args()
+    limpiar_incremental(args.entrada, args.salida)
@@ -0,0 +1,147 @@
+"""
+Limpieza de `anuncios_completo.csv` (01_limpieza_EDA) como funciones vectorizadas.
+Cada función hace lo mismo que su celda del notebook pero con operaciones de
+pandas/NumPy sobre columnas enteras en lugar de `.apply` fila a fila, y
+`limpiar` encadena todos los pasos: el resultado es el mismo `datos_limpios.csv`.
+
+En tablas grandes `limpiar` parte la tabla en trozos consecutivos y los limpia en
+varios procesos (número en `PROCESOS`, o la variable de entorno `LIMPIEZA_PROCESOS`).
+Los trozos se vuelven a juntar en su orden, así que la salida no depende del
+número de procesos.
+"""
+import os
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.listas import desglosar_listas
+from utils.nomenclator import coordenadas, RUTA_CACHE
+
+COLUMNAS_TARJETA = ["es_demo", "es_km0", "año", "combustible", "kilometraje", "ubicacion"]
+COLUMNAS_PRECIOS = ["precio_contado", "precio_financiado", "precio_nuevo"]
+COLUMNAS_FICHA = ["garantia", "transmision", "matriculacion", "potencia_cv", "puertas", "asientos",
+                  "tipo_carroceria", "mes"]
+
+# Procesos para `limpiar`: por defecto uno por núcleo
+PROCESOS = int(os.environ.get("LIMPIEZA_PROCESOS", 0)) or os.cpu_count() or 1
+# Por debajo de estas filas por trozo no compensa arrancar procesos
+FILAS_MINIMAS_TROZO = 10_000
+
+
+def tomar_columnas(df, columnas, lista):
+    """Coloca al final las columnas tipadas de la extracción y quita la lista de la que salen"""
+    df = df.drop(columns=[lista], errors="ignore")
+    return df[[c for c in df.columns if c not in columnas] + columnas]
+
+
+def precio_limpieza(df):
+    """En los anuncios "desde" el precio al contado es la cuota: el precio real es el financiado"""
+    desde = df["id_extraccion"].astype(str).str.contains("desde", regex=False)
+    if desde.any():
+        df["precio_contado"] = df["precio_contado"].where(~desde, df["precio_financiado"])
+    return df
+
+
+def _sin_marcas(texto):
+    """El filtro del notebook: NFD y fuera las marcas diacríticas (categoría Mn); lo que no es texto, tal cual"""
+    if not isinstance(texto, str):
+        return texto
+    return "".join(c for c in unicodedata.normalize("NFD", texto) if unicodedata.category(c) != "Mn")
+
+
+def quitar_tildes(serie):
+    """
+    Descompone (NFD) y quita las marcas diacríticas: "Málaga" -> "Malaga".
+    Se calcula una vez por valor distinto y se reparte con los códigos de `factorize`.
+    """
+    codigos, unicos = pd.factorize(serie)
+    if not len(unicos):
+        return serie
+    sin_tildes = np.array([_sin_marcas(valor) for valor in unicos], dtype=object)
+    resultado = pd.Series(sin_tildes[codigos], index=serie.index, dtype=object)
+    return resultado.where(codigos != -1, serie)
+
+
+def añadir_coordenadas(df, ruta_cache=RUTA_CACHE):
+    """Latitud y longitud de la ubicación según el nomenclátor (`utils/nomenclator.csv`)"""
+    df["latitud"], df["longitud"] = coordenadas(df["ubicacion"], ruta_cache)
+    return df
+
+
+def quitar_marca(titulo, marca):
+    """`titulo.replace(marca, "").strip()` fila a fila, resuelto con una operación por marca"""
+    modelo = pd.Series(np.nan, index=titulo.index, dtype=object)
+    for valor, indices in marca.groupby(marca, sort=False).groups.items():
+        modelo[indices] = titulo[indices].str.replace(valor, "", regex=False).str.strip()
+    return modelo
+
+
+def extra(df):
+    df["año"] = df["año"].astype("Int64")
+    df["mes"] = df["mes"].astype("Int64")
+    df["timestamp_extraccion"] = pd.to_datetime(df["timestamp_extraccion"], errors="coerce")
+    df["modelo"] = quitar_marca(df["titulo"], df["marca"])
+    df = df.drop(columns=["url", "titulo", "matriculacion", "precio_nuevo"])
+    df = df[df["garantia"] != 3660].reset_index(drop=True)
+    df.loc[df["combustible"].str.contains("gas", case=False, na=False), "combustible"] = "Gasolina"
+    return df
+
+
+def deduplicar(df):
+    """Primer anuncio de cada `id_extraccion` (el crawl puede repetir anuncios entre ejecuciones)"""
+    return df.drop_duplicates(subset=["id_extraccion"]).reset_index(drop=True)
+
+
+def _limpiar_trozo(df):
+    """Pasos de `limpiar` que solo miran cada fila (todos menos las coordenadas)"""
+    df = desglosar_listas(df, procesos=1)
+    df = tomar_columnas(df, COLUMNAS_TARJETA, "tags")
+    df = tomar_columnas(df, COLUMNAS_PRECIOS, "precios")
+    df = precio_limpieza(df)
+    df["financiacion_disponible"] = df["precio_financiado"].notnull().astype(int)
+    df = df.drop(columns=["precio_financiado"])
+    df = df.dropna(subset=["precio_contado"]).reset_index(drop=True)
+    df["ubicacion"] = quitar_tildes(df["ubicacion"])
+    df = tomar_columnas(df, COLUMNAS_FICHA, "detalles_ficha")
+    df["garantia"] = df["garantia"].astype("Int64")
+    return extra(df)
+
+
+def trozos(df, procesos):
+    """Trozos consecutivos de la tabla: uno por proceso, sin bajar de `FILAS_MINIMAS_TROZO` filas"""
+    num = max(1, min(procesos, len(df) // FILAS_MINIMAS_TROZO))
+    limites = np.linspace(0, len(df), num + 1).astype(int)
+    return [df.iloc[a:b] for a, b in zip(limites[:-1], limites[1:])]
+
+
+def limpiar(df, procesos=None, quitar_duplicados=False, ruta_cache=RUTA_CACHE):
+    """
+    Todos los pasos de 01_limpieza_EDA, en el mismo orden, hasta `datos_limpios.csv`.
+    Con más de un trozo, cada uno se limpia en un proceso (`procesos`, por defecto `PROCESOS`).
+    Las coordenadas se añaden al final en el proceso principal, que es el que guarda la caché
+    en `ruta_cache` (con `None` la caché solo vive en memoria).
+    """
+    procesos = procesos or PROCESOS
+    if quitar_duplicados:
+        df = deduplicar(df)
+    partes = trozos(df, procesos)
+    if len(partes) > 1:
+        with ProcessPoolExecutor(max_workers=len(partes)) as pool:
+            df = pd.concat(list(pool.map(_limpiar_trozo, partes)), ignore_index=True)
+    else:
+        df = _limpiar_trozo(df)
+    # Mismo sitio que en el notebook: detrás de `financiacion_disponible`
+    latitud, longitud = coordenadas(df["ubicacion"], ruta_cache)
+    posicion = df.columns.get_loc("financiacion_disponible") + 1
+    df.insert(posicion, "latitud", latitud)
+    df.insert(posicion + 1, "longitud", longitud)
+    return df.rename(columns={"año": "año_matriculacion", "mes": "mes_matriculacion"})
+
+
+def limpiar_csv(entrada="anuncios_completo.csv", salida="datos_limpios.csv", quitar_duplicados=False, procesos=None,
+                ruta_cache=RUTA_CACHE):
+    df = limpiar(pd.read_csv(entrada), procesos, quitar_duplicados, ruta_cache)
+    df.to_csv(salida, index=False)
+    return df
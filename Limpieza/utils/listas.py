@@ -0,0 +1,206 @@
+"""
+Desglose de las listas `tags`, `precios` y `detalles_ficha` en columnas, para CSV
+de extracciones antiguas que todavía no traen los campos tipados.
+
+Cada elemento de una lista se clasifica una sola vez en todos los campos a los que
+aporta (con patrones precompilados) y el resultado se guarda en una tabla de
+búsqueda: como los valores se repiten mucho (años, combustibles, provincias,
+"5 Puertas"...), casi todo se resuelve con un acceso a diccionario. Después cada
+fila recorre su lista una vez. En tablas grandes el trabajo se reparte en trozos
+entre varios procesos.
+Las reglas son las de `comun/reglas.py`, las mismas con las que la extracción saca
+los campos tipados, y dan lo que daban `limpiar_tags`, `procesar_precios` y
+`procesar_detalles_ficha` (ver `utils.referencia`).
+"""
+import os
+import re
+import ast
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from comun.reglas import (COMBUSTIBLES, CLAVES_PRECIO, CARROCERIAS, RE_AÑO, RE_KM, RE_KM0, RE_NUMERO, RE_GARANTIA_NO,
+                          RE_GARANTIA_SI, RE_GARANTIA_MESES, RE_MATRICULACION, RE_MES, RE_POTENCIA, RE_PUERTAS,
+                          RE_ASIENTOS, normalizar_texto)
+
+TAMANO_TROZO = 50_000
+
+# Cómo se combinan las aportaciones de los elementos de una lista
+PRIMERO, ULTIMO, ALGUNO = 0, 1, 2
+
+_RE_ELEMENTO = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+
+# ---------------------------------------------------------------------------
+# Clasificación de un elemento: lista de (campo, valor) a los que aporta
+# ---------------------------------------------------------------------------
+
+def _clasificar_tag(tag):
+    aportes = []
+    if not isinstance(tag, str):
+        texto = str(tag).lower()
+    else:
+        texto = tag.lower()
+        if RE_AÑO.match(tag):
+            aportes.append(("año", int(tag)))
+        if tag in COMBUSTIBLES:
+            aportes.append(("combustible", tag))
+        m = RE_KM.match(texto)
+        if m:
+            aportes.append(("kilometraje", float(m.group(1).replace(".", ""))))
+    if "demo" in texto:
+        aportes.append(("es_demo", 1))
+    if RE_KM0.search(texto):
+        aportes.append(("es_km0", 1))
+    return aportes
+
+
+def _numero(texto):
+    m = RE_NUMERO.search(texto)
+    digitos = m.group(0).replace(".", "") if m else ""
+    return int(digitos) if digitos else np.nan
+
+
+def _clasificar_precio(precio):
+    return [(campo, _numero(precio)) for campo, clave in CLAVES_PRECIO.items() if clave in precio]
+
+
+def _clasificar_detalle(detalle):
+    aportes = []
+    if "Garantía:" in detalle:
+        m = RE_GARANTIA_MESES.search(detalle)
+        if RE_GARANTIA_NO.search(detalle):
+            aportes.append(("garantia", pd.NA))
+        elif RE_GARANTIA_SI.search(detalle):
+            aportes.append(("garantia", 0))
+        elif m:
+            aportes.append(("garantia", int(m.group(1))))
+    normalizado = normalizar_texto(detalle)
+    if normalizado == "automatico":
+        aportes.append(("transmision", "Automático"))
+    elif normalizado == "manual":
+        aportes.append(("transmision", "Manual"))
+    for campo, patron, convertir in [("matriculacion", RE_MATRICULACION, str), ("potencia_cv", RE_POTENCIA, int),
+                                     ("puertas", RE_PUERTAS, int), ("asientos", RE_ASIENTOS, int),
+                                     ("mes", RE_MES, int)]:
+        m = patron.search(detalle)
+        if m:
+            aportes.append((campo, convertir(m.group(1))))
+    if detalle in CARROCERIAS:
+        aportes.append(("tipo_carroceria", CARROCERIAS[detalle]))
+    return aportes
+
+
+# Por tipo de lista: clasificador, cómo se combina cada campo y valor si nadie aporta
+# (las claves de `vacios` dan también las columnas y su orden)
+ESPECIFICACIONES = {
+    "tags": (
+        _clasificar_tag,
+        {"es_demo": ALGUNO, "es_km0": ALGUNO, "año": PRIMERO, "combustible": PRIMERO, "kilometraje": PRIMERO},
+        {"es_demo": 0, "es_km0": 0, "año": np.nan, "combustible": np.nan, "kilometraje": np.nan,
+         "ubicacion": np.nan},
+    ),
+    "precios": (
+        _clasificar_precio,
+        {"precio_contado": PRIMERO, "precio_financiado": PRIMERO, "precio_nuevo": PRIMERO},
+        {"precio_contado": np.nan, "precio_financiado": np.nan, "precio_nuevo": np.nan},
+    ),
+    "detalles_ficha": (
+        _clasificar_detalle,
+        {"garantia": PRIMERO, "transmision": PRIMERO, "matriculacion": PRIMERO, "potencia_cv": PRIMERO,
+         "puertas": PRIMERO, "asientos": PRIMERO, "tipo_carroceria": ULTIMO, "mes": PRIMERO},
+        {"garantia": pd.NA, "transmision": None, "matriculacion": np.nan, "potencia_cv": np.nan,
+         "puertas": np.nan, "asientos": np.nan, "tipo_carroceria": None, "mes": None},
+    ),
+}
+COLUMNAS = {tipo: list(vacios) for tipo, (_, _, vacios) in ESPECIFICACIONES.items()}
+
+
+# ---------------------------------------------------------------------------
+# Recorrido de las filas
+# ---------------------------------------------------------------------------
+
+def leer_lista(valor):
+    """
+    La lista de una celda: ya es lista, o su repr de Python. El caso normal (solo textos
+    sin comillas escapadas) se resuelve con una regex y se comprueba rehaciendo el repr;
+    lo demás pasa por `ast.literal_eval`. Lo que no es una lista queda como [].
+    """
+    if isinstance(valor, list):
+        return valor
+    if not isinstance(valor, str):
+        return []
+    if valor.startswith("[") and "\\" not in valor:
+        lista = [a or b for a, b in _RE_ELEMENTO.findall(valor)]
+        if repr(lista) == valor:
+            return lista
+    try:
+        lista = ast.literal_eval(valor)
+    except (ValueError, SyntaxError, TypeError, MemoryError, RecursionError):
+        return []
+    return lista if isinstance(lista, list) else []
+
+
+def _desglosar_trozo(args):
+    """Columnas de un trozo de filas; cada elemento distinto se clasifica una sola vez"""
+    tipo, valores = args
+    clasificar, combinar, vacios = ESPECIFICACIONES[tipo]
+    tabla = {}
+    salida = {columna: [] for columna in vacios}
+
+    for valor in valores:
+        fila = {}
+        lista = leer_lista(valor)
+        for elemento in lista:
+            if isinstance(elemento, str):
+                aportes = tabla.get(elemento)
+                if aportes is None:
+                    aportes = tabla[elemento] = clasificar(elemento)
+            else:
+                aportes = clasificar(elemento)
+            for campo, dato in aportes:
+                if combinar[campo] == PRIMERO and campo in fila:
+                    continue
+                fila[campo] = dato
+        if tipo == "tags" and lista:
+            fila["ubicacion"] = lista[-1]
+        for columna, vacio in vacios.items():
+            salida[columna].append(fila.get(columna, vacio))
+    return salida
+
+
+def desglosar(serie, tipo, procesos=None, tamano_trozo=TAMANO_TROZO):
+    """
+    Columnas tipadas de una columna de listas (`tipo`: "tags", "precios" o "detalles_ficha").
+    Si hay más de un trozo se reparte entre `procesos` procesos (por defecto, uno por núcleo).
+    """
+    procesos = procesos or os.cpu_count() or 1
+    valores = serie.tolist()
+    trozos = [(tipo, valores[i:i + tamano_trozo]) for i in range(0, len(valores), tamano_trozo)]
+    if len(trozos) > 1 and procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            partes = list(pool.map(_desglosar_trozo, trozos))
+    else:
+        partes = [_desglosar_trozo(trozo) for trozo in trozos]
+
+    columnas = {}
+    for columna in COLUMNAS[tipo]:
+        datos = [dato for parte in partes for dato in parte[columna]]
+        columnas[columna] = pd.Series(datos, index=serie.index)
+    return pd.DataFrame(columnas, index=serie.index)
+
+
+def desglosar_listas(df, procesos=None, tamano_trozo=TAMANO_TROZO):
+    """
+    Añade las columnas tipadas que falten a partir de las listas originales.
+    Si el CSV ya las trae (extracciones actuales) no hace nada.
+    """
+    for lista, columnas in COLUMNAS.items():
+        if lista in df.columns and any(c not in df.columns for c in columnas):
+            campos = desglosar(df[lista], lista, procesos, tamano_trozo)
+            for columna in columnas:
+                df[columna] = campos[columna]
+    return df
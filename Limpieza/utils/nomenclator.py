@@ -0,0 +1,140 @@
+"""
+Coordenadas de las ubicaciones a partir de un nomenclátor offline (`nomenclator.csv`):
+las 52 provincias (con sus nombres oficiales, cooficiales y variantes), las islas y
+los municipios de más de ~50.000 habitantes, con latitud y longitud del centro.
+
+Cada ubicación distinta se resuelve una sola vez:
+1. nombre normalizado (sin tildes, minúsculas, sin signos) exacto o alias
+2. si trae varias partes ("Alicante/Alacant", "Elche (Alicante)"), cada parte
+3. parecido con `difflib` (erratas, variantes), solo para textos sin números
+
+Lo resuelto se guarda en `cache_ubicaciones.json`, junto a este módulo (otra ruta
+con `ruta_cache`, o `None` para guardarlo solo en memoria), así que en las siguientes
+ejecuciones solo se buscan las ubicaciones nuevas. Las coordenadas se pegan al
+DataFrame de una vez con los códigos de `factorize`.
+"""
+import os
+import re
+import json
+import difflib
+import hashlib
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+RUTA_NOMENCLATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nomenclator.csv")
+RUTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_ubicaciones.json")
+# Parecido mínimo (ratio de difflib) para aceptar una coincidencia aproximada
+CORTE_PARECIDO = 0.8
+
+_RE_ARTICULO_FINAL = re.compile(r"^(.*?)\s*\((el|la|los|las|l'|a|o|os|as)\)$", re.IGNORECASE)
+_RE_SIGNOS = re.compile(r"[^a-z0-9 ]+")
+_RE_ESPACIOS = re.compile(r"\s+")
+_RE_PARTES = re.compile(r"\s*(?:/|\(|\)|,|\s-\s)\s*")
+
+# Nomenclátor e índices cargados, y caché en memoria por ruta
+_nomenclator = None
+_caches = {}
+
+
+def normalizar(nombre):
+    """ "Palmas (Las)" -> "las palmas", "L'Hospitalet" -> "l hospitalet", "Álava" -> "alava" """
+    nombre = nombre.strip()
+    m = _RE_ARTICULO_FINAL.match(nombre)
+    if m:
+        nombre = f"{m.group(2)} {m.group(1)}"
+    nombre = "".join(c for c in unicodedata.normalize("NFD", nombre) if not unicodedata.combining(c)).lower()
+    return _RE_ESPACIOS.sub(" ", _RE_SIGNOS.sub(" ", nombre)).strip()
+
+
+def cargar_nomenclator(ruta=RUTA_NOMENCLATOR):
+    """Tabla del nomenclátor, índice nombre normalizado -> fila y huella del fichero"""
+    global _nomenclator
+    if _nomenclator is None or _nomenclator[0] != ruta:
+        with open(ruta, "rb") as f:
+            huella = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+        tabla = pd.read_csv(ruta, keep_default_na=False)
+        indice = {}
+        # Las provincias van primero: si un municipio se llama igual, manda la provincia
+        for i, fila in enumerate(tabla.itertuples(index=False)):
+            for nombre in [fila.nombre] + [a for a in fila.alias.split("|") if a]:
+                indice.setdefault(normalizar(nombre), i)
+        _nomenclator = (ruta, tabla, indice, huella)
+    return _nomenclator[1:]
+
+
+def resolver(ubicacion, tabla, indice):
+    """(nombre, latitud, longitud, método) de una ubicación, o None si no está en el nomenclátor"""
+    if not isinstance(ubicacion, str) or not ubicacion.strip():
+        return None
+
+    def fila(i, metodo):
+        f = tabla.iloc[i]
+        return [f["nombre"], float(f["latitud"]), float(f["longitud"]), metodo]
+
+    clave = normalizar(ubicacion)
+    if clave in indice:
+        return fila(indice[clave], "exacto")
+    for parte in _RE_PARTES.split(ubicacion):
+        if parte and normalizar(parte) in indice:
+            return fila(indice[normalizar(parte)], "parte")
+    if len(clave) >= 4 and not any(c.isdigit() for c in clave):
+        parecidos = difflib.get_close_matches(clave, list(indice), n=1, cutoff=CORTE_PARECIDO)
+        if parecidos:
+            return fila(indice[parecidos[0]], "aproximado")
+    return None
+
+
+def _cache(ruta_cache, huella):
+    """Caché {ubicación: [nombre, lat, lon, método] | None}; se descarta si cambia el nomenclátor"""
+    clave = (ruta_cache, huella)
+    if clave not in _caches:
+        resueltas = {}
+        if ruta_cache and os.path.exists(ruta_cache):
+            with open(ruta_cache, encoding="utf-8") as f:
+                guardada = json.load(f)
+            if guardada.get("nomenclator") == huella:
+                resueltas = guardada["ubicaciones"]
+        _caches[clave] = resueltas
+    return _caches[clave]
+
+
+def _guardar_cache(ruta_cache, huella, resueltas):
+    temporal = f"{ruta_cache}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"nomenclator": huella, "ubicaciones": resueltas}, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(temporal, ruta_cache)
+
+
+def tabla_coordenadas(ubicaciones, ruta_cache=RUTA_CACHE, ruta_nomenclator=RUTA_NOMENCLATOR):
+    """DataFrame ubicación -> nombre, latitud, longitud, método para las ubicaciones dadas"""
+    tabla, indice, huella = cargar_nomenclator(ruta_nomenclator)
+    resueltas = _cache(ruta_cache, huella)
+    nuevas = [u for u in ubicaciones if u not in resueltas]
+    for ubicacion in nuevas:
+        resueltas[ubicacion] = resolver(ubicacion, tabla, indice)
+    if nuevas and ruta_cache:
+        _guardar_cache(ruta_cache, huella, resueltas)
+    filas = [resueltas[u] or [None, np.nan, np.nan, None] for u in ubicaciones]
+    return pd.DataFrame(filas, index=pd.Index(ubicaciones, name="ubicacion"),
+                        columns=["nombre", "latitud", "longitud", "metodo"])
+
+
+def coordenadas(serie, ruta_cache=RUTA_CACHE, ruta_nomenclator=RUTA_NOMENCLATOR):
+    """Latitud y longitud de cada fila: se resuelven los valores distintos y se reparten con `factorize`"""
+    codigos, unicos = pd.factorize(serie)
+    tabla = tabla_coordenadas([u if isinstance(u, str) else str(u) for u in unicos], ruta_cache, ruta_nomenclator)
+    latitudes = np.append(tabla["latitud"].to_numpy(dtype=float), np.nan)
+    longitudes = np.append(tabla["longitud"].to_numpy(dtype=float), np.nan)
+    # El código -1 (NaN) apunta al último elemento, que es NaN
+    return (pd.Series(latitudes[codigos], index=serie.index),
+            pd.Series(longitudes[codigos], index=serie.index))
+
+
+def cobertura(serie, ruta_cache=RUTA_CACHE):
+    """Cuántas filas se resuelven por cada método, y las ubicaciones que quedan sin coordenadas"""
+    conteo = serie.dropna().astype(str).value_counts()
+    tabla = tabla_coordenadas(list(conteo.index), ruta_cache)
+    por_metodo = conteo.groupby(tabla["metodo"].fillna("sin resolver")).sum()
+    return por_metodo, conteo[tabla["metodo"].isna()]
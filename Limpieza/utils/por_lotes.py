@@ -0,0 +1,113 @@
+"""
+Limpieza de `anuncios_completo.csv` por lotes, para crawls que no caben en memoria.
+
+Uso (desde la carpeta Limpieza):
+    python -m utils.por_lotes anuncios_completo.csv datos_limpios.csv --lote 200000 --quitar-duplicados
+
+Cada lote se lee, se limpia con `limpiar` y se añade al CSV de salida, así que la
+memoria depende del tamaño del lote y no del crawl. Lo que necesita ver todo el
+fichero se hace aparte:
+
+- Tipos: las columnas de texto (`COLUMNAS_TEXTO`) se leen siempre como texto. Del
+  resto pandas deduce el tipo de cada lote por separado y un lote sin NaN escribe
+  `18500` donde la limpieza completa escribiría `18500.0`. Los lotes se escriben a un
+  temporal anotando los tipos; si alguna columna sale entera en unos lotes y decimal
+  en otros, una segunda pasada (solo leer y escribir) la reescribe como decimal.
+  El resultado es el mismo CSV que `limpiar_csv`.
+- Duplicados: con `quitar_duplicados` se queda el primer anuncio de cada `id_extraccion`
+  de todo el fichero. Solo se guarda un hash de 64 bits por id (8 bytes), no las filas.
+"""
+import os
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from utils.limpieza import limpiar
+from utils.nomenclator import RUTA_CACHE
+
+TAMANO_LOTE = 200_000
+# Columnas de texto de la entrada: se leen como object aunque un lote las traiga vacías,
+# que si no pandas las deduce float64 y los `.str` de `limpiar` fallan en ese lote
+COLUMNAS_TEXTO = ["id_extraccion", "marca", "titulo", "url", "tags", "precios", "detalles_ficha", "combustible",
+                  "ubicacion", "transmision", "tipo_carroceria"]
+
+
+class IdsVistos:
+    """Hashes de los `id_extraccion` ya vistos, en un array ordenado de uint64"""
+
+    def __init__(self):
+        self.hashes = np.empty(0, dtype=np.uint64)
+
+    def nuevos(self, ids):
+        """Máscara de las filas cuyo id no ha salido antes (ni en este lote ni en los anteriores)"""
+        hashes = pd.util.hash_pandas_object(ids.astype(str), index=False).to_numpy()
+        primera = ~pd.Series(hashes).duplicated().to_numpy()
+        if len(self.hashes):
+            pos = np.searchsorted(self.hashes, hashes).clip(max=len(self.hashes) - 1)
+            primera &= self.hashes[pos] != hashes
+        self.hashes = np.sort(np.concatenate([self.hashes, hashes[primera]]))
+        return primera
+
+    def __len__(self):
+        return len(self.hashes)
+
+
+def _tipos_comunes(tipos_por_lote):
+    """Columnas que han salido enteras en unos lotes y decimales en otros: se pasan a float64"""
+    a_decimal = {}
+    for columna in set().union(*tipos_por_lote) if tipos_por_lote else []:
+        tipos = {t[columna] for t in tipos_por_lote if columna in t}
+        if any(t.kind == "f" for t in tipos) and any(t.kind in "iu" for t in tipos):
+            a_decimal[columna] = "float64"
+    return a_decimal
+
+
+def limpiar_por_lotes(entrada="anuncios_completo.csv", salida="datos_limpios.csv", tamano_lote=TAMANO_LOTE,
+                      quitar_duplicados=False, procesos=None, ruta_cache=RUTA_CACHE):
+    """Misma salida que `limpiar_csv(entrada, salida, quitar_duplicados)` con memoria acotada por el lote"""
+    temporal = f"{salida}.tmp"
+    vistos = IdsVistos() if quitar_duplicados else None
+    tipos_por_lote = []
+    filas_entrada = filas_salida = 0
+
+    columnas = pd.read_csv(entrada, nrows=0).columns
+    texto = {c: object for c in COLUMNAS_TEXTO if c in columnas}
+    with pd.read_csv(entrada, chunksize=tamano_lote, dtype=texto) as lector:
+        for i, lote in enumerate(lector):
+            filas_entrada += len(lote)
+            if vistos is not None:
+                lote = lote[vistos.nuevos(lote["id_extraccion"])].reset_index(drop=True)
+            limpio = limpiar(lote, procesos, ruta_cache=ruta_cache)
+            if len(limpio):
+                tipos_por_lote.append(limpio.dtypes.to_dict())
+            limpio.to_csv(temporal, index=False, mode="a" if i else "w", header=not i)
+            filas_salida += len(limpio)
+
+    a_decimal = _tipos_comunes(tipos_por_lote)
+    if a_decimal:
+        # Segunda pasada: el resto de columnas se lee como texto para escribirlas tal cual
+        columnas = pd.read_csv(temporal, nrows=0).columns
+        tipos = {c: a_decimal.get(c, str) for c in columnas}
+        with pd.read_csv(temporal, chunksize=tamano_lote, dtype=tipos, keep_default_na=False,
+                         na_values={c: [""] for c in columnas}) as lector:
+            for i, lote in enumerate(lector):
+                lote.to_csv(f"{temporal}2", index=False, mode="a" if i else "w", header=not i)
+        os.replace(f"{temporal}2", temporal)
+    os.replace(temporal, salida)
+
+    print(f"{filas_entrada} filas leídas, {filas_salida} escritas en {salida}"
+          + (f" ({filas_entrada - len(vistos)} duplicadas)" if vistos is not None else "")
+          + (f"; reescritas como decimales: {', '.join(sorted(a_decimal))}" if a_decimal else ""))
+    return filas_salida
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Limpieza de anuncios_completo.csv por lotes")
+    parser.add_argument("entrada", nargs="?", default="anuncios_completo.csv")
+    parser.add_argument("salida", nargs="?", default="datos_limpios.csv")
+    parser.add_argument("--lote", type=int, default=TAMANO_LOTE)
+    parser.add_argument("--quitar-duplicados", action="store_true")
+    parser.add_argument("--procesos", type=int, default=None)
+    args = parser.parse_args()
+    limpiar_por_lotes(args.entrada, args.salida, args.lote, args.quitar_duplicados, args.procesos)
@@ -0,0 +1,302 @@
+"""
+Limpieza de 01_limpieza_EDA tal y como estaba en el notebook (fila a fila con `.apply`).
+Se mantiene solo como referencia para comprobar que `utils.limpieza` y `utils.listas`
+dan lo mismo y para medir la diferencia en `utils.benchmark_limpieza`.
+`limpiar_tags`, `procesar_precios` y `procesar_detalles_ficha` son el desglose de las
+listas que hacía el notebook antes de que la extracción guardase los campos tipados;
+los combustibles, carrocerías y patrones que usan son los de `comun/reglas.py`.
+"""
+import os
+import ast
+import sys
+import unicodedata
+import numpy as np
+import pandas as pd
+
+from utils.limpieza import COLUMNAS_TARJETA, COLUMNAS_PRECIOS, COLUMNAS_FICHA, tomar_columnas
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from comun.reglas import (COMBUSTIBLES, CLAVES_PRECIO, CARROCERIAS, RE_AÑO, RE_KM, RE_KM0, RE_NUMERO, RE_GARANTIA_NO,
+                          RE_GARANTIA_SI, RE_GARANTIA_MESES, RE_MATRICULACION, RE_MES, RE_POTENCIA, RE_PUERTAS,
+                          RE_ASIENTOS, normalizar_texto)
+
+COORDENADAS_UBICACIONES = {
+    "Madrid": (40.4168, -3.7038),
+    "Barcelona": (41.3851, 2.1734),
+    "Malaga": (36.7213, -4.4214),
+    "Islas Baleares": (39.5696, 2.6502),
+    "Alicante": (38.3452, -0.4810),
+    "Vizcaya": (43.2630, -2.93499),
+    "Castellon": (39.9864, -0.0513),
+    "Avila": (40.6560, -4.7003),
+    "Asturias": (43.3619, -5.8494),
+    "Badajoz": (38.8794, -6.9707),
+    "Valencia": (39.4699, -0.3763),
+    "Tenerife": (28.2916, -16.6291),
+    "Cordoba": (37.8882, -4.7794),
+    "Alava": (42.8513, -2.6721),
+    "Tarragona": (41.1189, 1.2445),
+    "Girona": (41.9794, 2.8214),
+    "Caceres": (39.4702, -6.3723),
+    "Las Palmas": (28.1235, -15.4363),
+    "Toledo": (39.8628, -4.0273),
+    "Zaragoza": (41.6488, -0.8891),
+    "Orense": (42.3400, -7.8633),
+    "Cadiz": (36.5271, -6.2886),
+    "Segovia": (40.9486, -4.1186),
+    "Guipuzcoa": (43.3130, -1.9746),
+    "Leon": (42.5987, -5.5671),
+    "Cantabria": (43.1828, -3.9871),
+    "Lleida": (41.6176, 0.6200),
+    "Ciudad Real": (38.9860, -3.9279),
+    "Pontevedra": (42.4333, -8.6333),
+    "Salamanca": (40.9701, -5.6635),
+    "Valladolid": (41.6523, -4.7245),
+    "Palencia": (42.0090, -4.5271),
+    "Almeria": (36.8340, -2.4637),
+    "Huelva": (37.2614, -6.9447),
+    "Sevilla": (37.3891, -5.9845),
+    "Lugo": (43.0125, -7.5559),
+    "Granada": (37.1773, -3.5986),
+    "Huesca": (42.1401, -0.4089),
+    "Murcia": (37.9922, -1.1307),
+    "La Coruna": (43.3623, -8.4115),
+    "Burgos": (42.3439, -3.6969),
+    "Albacete": (38.9943, -1.8564),
+    "La Rioja": (42.4627, -2.4450),
+    "Cuenca": (40.0704, -2.1374),
+    "Jaen": (37.7796, -3.7849),
+    "Navarra": (42.6951, -1.6761),
+    "Zamora": (41.5031, -5.7455),
+    "Guadalajara": (40.6333, -3.1667),
+    "Soria": (41.7636, -2.4679),
+    "Teruel": (40.3440, -1.1069),
+    "Melilla": (35.2912, -2.9381),
+    "Ceuta": (35.8894, -5.3213)
+}
+
+
+def limpiar_tags(df):
+    def parse_list(val):
+        if isinstance(val, list):
+            return val
+        try:
+            return ast.literal_eval(val)
+        except:
+            return []
+
+    df = df.copy()
+    df['tags'] = df['tags'].apply(parse_list)
+
+    def extraer_año(tags):
+        for t in tags:
+            if isinstance(t, str) and RE_AÑO.match(t):
+                return int(t)
+        return np.nan
+
+    def extraer_combustible(tags):
+        for t in tags:
+            if t in COMBUSTIBLES:
+                return t
+        return np.nan
+
+    def extraer_kilometraje(tags):
+        for t in tags:
+            if isinstance(t, str):
+                m = RE_KM.match(t.lower())
+                if m:
+                    return float(m.group(1).replace('.', ''))
+        return np.nan
+
+    def extraer_ubicacion(tags):
+        if tags:
+            return tags[-1]
+        return np.nan
+
+    def contiene_demo(tags):
+        return any("demo" in str(t).lower() for t in tags)
+
+    def contiene_km0(tags):
+        return any(RE_KM0.search(str(t).lower()) for t in tags)
+
+    df['es_demo'] = df['tags'].apply(lambda x: 1 if contiene_demo(x) else 0)
+    df['es_km0'] = df['tags'].apply(lambda x: 1 if contiene_km0(x) else 0)
+
+    df['año'] = df['tags'].apply(extraer_año)
+    df['combustible'] = df['tags'].apply(extraer_combustible)
+    df['kilometraje'] = df['tags'].apply(extraer_kilometraje)
+    df['ubicacion'] = df['tags'].apply(extraer_ubicacion)
+
+    df.drop(columns=['tags'], inplace=True)
+
+    return df
+
+
+def limpiar_numero(texto):
+    if isinstance(texto, str):
+        match = RE_NUMERO.search(texto)
+        if match:
+            num_str = match.group(0).replace('.', '')
+            return int(num_str)
+    return np.nan
+
+
+def procesar_precios(df):
+    df = df.copy()
+
+    df['precios'] = df['precios'].apply(lambda x: ast.literal_eval(x) if isinstance(x, str) else x)
+
+    def extraer_precio_texto(precios_lista, clave):
+        if isinstance(precios_lista, list):
+            for item in precios_lista:
+                if clave in item:
+                    return item
+        return np.nan
+
+    for columna, clave in CLAVES_PRECIO.items():
+        df[columna] = df['precios'].apply(lambda x: extraer_precio_texto(x, clave))
+        df[columna] = df[columna].apply(limpiar_numero)
+
+    df.drop(columns=['precios'], inplace=True)
+
+    return df
+
+
+def asegurar_lista(valor):
+    if isinstance(valor, list):
+        return valor
+    elif isinstance(valor, str):
+        try:
+            lista = ast.literal_eval(valor)
+            if isinstance(lista, list):
+                return lista
+            else:
+                return []
+        except:
+            return []
+    else:
+        return []
+
+
+def extraer_garantia_num(detalles):
+    detalles = asegurar_lista(detalles)
+    for detalle in detalles:
+        if "Garantía:" in detalle:
+            no_match = RE_GARANTIA_NO.search(detalle)
+            si_match = RE_GARANTIA_SI.search(detalle)
+            meses_match = RE_GARANTIA_MESES.search(detalle)
+            if no_match:
+                return pd.NA
+            elif si_match:
+                return 0
+            elif meses_match:
+                return int(meses_match.group(1))
+    return pd.NA
+
+
+def extraer_transmision(detalles):
+    detalles = asegurar_lista(detalles)
+    for detalle in detalles:
+        detalle_norm = normalizar_texto(detalle)
+        if detalle_norm == "automatico":
+            return "Automático"
+        elif detalle_norm == "manual":
+            return "Manual"
+    return None
+
+
+def _primero(detalles, patron, convertir=int):
+    for item in asegurar_lista(detalles):
+        m = patron.search(item)
+        if m:
+            return convertir(m.group(1))
+    return np.nan
+
+
+def extraer_tipo_carroceria(detalles):
+    detalles = asegurar_lista(detalles)
+    tipo_carroceria = None
+
+    for item in detalles:
+        if item in CARROCERIAS:
+            tipo_carroceria = CARROCERIAS[item]
+
+    return tipo_carroceria
+
+
+def extraer_mes_matriculacion(detalles):
+    detalles = asegurar_lista(detalles)
+    for detalle in detalles:
+        match = RE_MES.search(detalle)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def procesar_detalles_ficha(df):
+    df = df.copy()
+
+    df['garantia'] = df['detalles_ficha'].apply(extraer_garantia_num).astype('Int64')
+    df['transmision'] = df['detalles_ficha'].apply(extraer_transmision)
+    df['matriculacion'] = df['detalles_ficha'].apply(lambda x: _primero(x, RE_MATRICULACION, str))
+    df['potencia_cv'] = df['detalles_ficha'].apply(lambda x: _primero(x, RE_POTENCIA))
+    df['puertas'] = df['detalles_ficha'].apply(lambda x: _primero(x, RE_PUERTAS))
+    df['asientos'] = df['detalles_ficha'].apply(lambda x: _primero(x, RE_ASIENTOS))
+    df['tipo_carroceria'] = df['detalles_ficha'].apply(extraer_tipo_carroceria)
+    df['mes'] = df['detalles_ficha'].apply(extraer_mes_matriculacion)
+    df.drop(columns=['detalles_ficha'], inplace=True)
+
+    return df
+
+
+def precio_limpieza(df):
+    def corregir_precio_contado(row):
+        if "desde" in str(row["id_extraccion"]):
+            return row["precio_financiado"]
+        return row["precio_contado"]
+
+    df["precio_contado"] = df.apply(corregir_precio_contado, axis=1)
+    return df
+
+
+def quitar_tildes(texto):
+    if isinstance(texto, str):
+        return ''.join(
+            c for c in unicodedata.normalize('NFD', texto)
+            if unicodedata.category(c) != 'Mn'
+        )
+    return texto
+
+
+def extra(df):
+    df['año'] = df['año'].astype('Int64')
+    df['mes'] = df['mes'].astype('Int64')
+    df['timestamp_extraccion'] = pd.to_datetime(df['timestamp_extraccion'], errors='coerce')
+    df['modelo'] = df.apply(lambda row: row['titulo'].replace(row['marca'], '').strip(), axis=1)
+    df.drop(columns=['url'], inplace=True)
+    df.drop(columns=["titulo"], inplace=True)
+    df.drop(columns=['matriculacion'], inplace=True)
+    df.drop(columns=['precio_nuevo'], inplace=True)
+    df = df[df['garantia'] != 3660].reset_index(drop=True)
+    df.loc[df['combustible'].str.contains('gas', case=False, na=False), 'combustible'] = 'Gasolina'
+    return df
+
+
+def limpiar_referencia(df):
+    df = tomar_columnas(df, COLUMNAS_TARJETA, 'tags')
+    df = tomar_columnas(df, COLUMNAS_PRECIOS, 'precios')
+    df = precio_limpieza(df)
+    df['financiacion_disponible'] = df['precio_financiado'].notnull().astype(int)
+    df.drop(columns=['precio_financiado'], inplace=True)
+    df = df.dropna(subset=['precio_contado']).reset_index(drop=True)
+    df['ubicacion'] = df['ubicacion'].apply(quitar_tildes)
+    df['latitud'] = df['ubicacion'].map(lambda x: COORDENADAS_UBICACIONES.get(x, (None, None))[0])
+    df['longitud'] = df['ubicacion'].map(lambda x: COORDENADAS_UBICACIONES.get(x, (None, None))[1])
+    df = tomar_columnas(df, COLUMNAS_FICHA, 'detalles_ficha')
+    df['garantia'] = df['garantia'].astype('Int64')
+    df = extra(df)
+    df.rename(columns={
+        'año': 'año_matriculacion',
+        'mes': 'mes_matriculacion'
+    }, inplace=True)
+    return df
@@ -0,0 +1,86 @@
+"""
+HistGradientBoosting sobre los datos limpios (`datos_limpios.parquet`), sin el
+preprocesado de 02_limpieza_modelo: marca, modelo, combustible, tipo_carroceria y
+transmision entran como categóricas nativas y los huecos numéricos se quedan como NaN
+(el modelo los trata como un valor más). Lo único que hay que guardar para predecir es
+la lista de categorías de cada columna. Como cada columna admite 255 categorías, los
+modelos menos frecuentes se agrupan en un "otros" por marca; `CategoriasHGB.perdida`
+dice cuántos modelos y qué parte de las filas pierden así su identidad.
+
+Agrupa los valores en histogramas de hasta 255 cubos antes de buscar cortes, así que
+entrenar cuesta casi lo mismo con 100 mil filas que con un millón, y usa todos los
+hilos de la máquina. Para con early stopping cuando deja de mejorar en validación.
+
+Como las filas están en el mismo orden que en `datos_limpios_modelo.parquet`, `evaluar`
+usa la misma partición y el resultado se puede comparar con los otros modelos.
+"""
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+CATEGORICAS = ["marca", "modelo", "combustible", "tipo_carroceria", "transmision"]
+NUMERICAS = ["año_matriculacion", "mes_matriculacion", "kilometraje", "potencia_cv", "puertas", "asientos",
+             "garantia", "es_demo", "es_km0", "financiacion_disponible"]
+# HistGradientBoosting admite hasta 255 categorías por columna (max_bins)
+MAX_CATEGORIAS = 255
+
+
+def _cubo(marcas):
+    """Categoría "otros" de cada marca, donde van sus modelos poco frecuentes"""
+    return marcas.astype(object).map(lambda marca: f"{marca} (otros)", na_action="ignore")
+
+
+class CategoriasHGB:
+    """
+    Categorías de cada columna categórica. De `modelo` (que puede tener más de 255 valores)
+    se quedan los más frecuentes y el resto va a un cubo "<marca> (otros)" de su marca, con
+    los cubos dentro del límite; así un modelo raro sigue diciendo de qué marca es. En las
+    demás columnas lo que no cabe (lo menos frecuente) va como NaN.
+    """
+
+    def ajustar(self, df):
+        self.categorias = {c: pd.Index(df[c].astype(object).value_counts().index[:MAX_CATEGORIAS])
+                           for c in CATEGORICAS if c != "modelo"}
+        modelos, marcas = df["modelo"].astype(object), df["marca"].astype(object)
+        frecuencias = modelos.value_counts()
+        # Cada cubo quita un hueco a los modelos propios, y al quitarlos puede hacer falta otro cubo
+        n_cubos = 0
+        while True:
+            propios = frecuencias.index[:MAX_CATEGORIAS - n_cubos]
+            agrupadas = modelos.notna() & ~modelos.isin(propios)
+            con_cubo = marcas[agrupadas].dropna().unique()
+            if len(con_cubo) <= n_cubos:
+                break
+            n_cubos = len(con_cubo)
+        self.categorias["modelo"] = pd.Index(list(propios) + sorted(_cubo(pd.Series(con_cubo))))
+        self.perdida = {
+            "modelos": len(frecuencias),
+            "modelos_agrupados": len(frecuencias) - len(propios),
+            "filas_agrupadas": float(agrupadas.mean()),
+        }
+        return self
+
+    def transformar(self, df):
+        """Columnas del modelo: códigos de las categóricas y numéricas tal cual, en float"""
+        columnas = {}
+        for columna in CATEGORICAS:
+            categorias = self.categorias[columna]
+            codigos = categorias.get_indexer(df[columna].astype(object)).astype(float)
+            if columna == "modelo":
+                # Modelos poco frecuentes (o que no se vieron al ajustar): al cubo de su marca
+                otros = (codigos < 0) & df[columna].notna().to_numpy()
+                codigos[otros] = categorias.get_indexer(_cubo(df["marca"][otros]))
+            codigos[codigos < 0] = np.nan
+            columnas[columna] = codigos
+        for columna in NUMERICAS:
+            columnas[columna] = pd.to_numeric(df[columna], errors="coerce").to_numpy(dtype=float)
+        return pd.DataFrame(columnas, index=df.index)
+
+
+def modelo_hgb(max_iter=1000, learning_rate=0.1, random_state=42, **parametros):
+    """HistGradientBoostingRegressor con las columnas de `CategoriasHGB` y early stopping"""
+    return HistGradientBoostingRegressor(
+        categorical_features=[True] * len(CATEGORICAS) + [False] * len(NUMERICAS),
+        max_iter=max_iter, learning_rate=learning_rate, early_stopping=True,
+        validation_fraction=0.1, n_iter_no_change=20, random_state=random_state, **parametros,
+    )
@@ -0,0 +1,229 @@
+"""
+Búsqueda de hiperparámetros con successive halving: se prueban muchas combinaciones con
+pocos recursos (filas o árboles), se quedan las mejores 1/`factor` y se repite con
+`factor` veces más recursos, hasta `max_recursos` en la última ronda. El presupuesto se
+fija con `n_candidatos` y `max_recursos`, así que el coste queda acotado sin tener que
+hacer un grid completo.
+
+Las rondas se hacen aquí (con el mismo calendario que `HalvingRandomSearchCV` y
+`min_resources="exhaust"`) para poder mirar el reloj entre una y otra: `presupuesto_s`
+es un límite de tiempo total para todos los modelos, repartido a partes iguales entre
+los que quedan (lo que no gasta uno pasa a los siguientes). La ronda 0 se estima con
+un ajuste de un candidato y, si no cabe en la parte del modelo, se empieza con menos
+candidatos; cada ronda siguiente se estima a partir de la anterior (candidatos ×
+recursos) y, si no cabe, la búsqueda de ese modelo se para y gana el mejor de la
+última ronda hecha.
+
+La búsqueda se hace con validación cruzada solo sobre la parte de entrenamiento de la
+partición de `utils.seleccion`; los mejores modelos se comparan luego con `evaluar` sobre
+el mismo test que los modelos por defecto. Para cada modelo se guarda la curva de lo
+mejor conseguido en cada ronda frente al recurso y el tiempo gastado.
+
+Uso desde el notebook:
+    from utils.busqueda import buscar
+    mejores, curva = buscar(modelos, X, y)
+    evaluar(mejores, X, y, "todas")
+"""
+import os
+import math
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import loguniform, randint
+from sklearn.base import clone
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold, ParameterSampler
+
+from comun.almacen import guardar
+from utils.seleccion import PROCESOS, preparar
+
+RUTA_CURVA = os.path.join("metricas", "busqueda_halving.parquet")
+# Límite de tiempo total de `buscar` en segundos (None para no poner ninguno)
+PRESUPUESTO_S = 300
+
+# Espacios de búsqueda por clase de modelo
+ESPACIOS = {
+    "RandomForestRegressor": {
+        "n_estimators": [50, 100, 200, 400],
+        "max_depth": [None, 10, 20, 30],
+        "min_samples_leaf": randint(1, 8),
+        "max_features": [1.0, 0.5, "sqrt"],
+    },
+    "GradientBoostingRegressor": {
+        "n_estimators": [100, 200, 400],
+        "learning_rate": loguniform(0.02, 0.3),
+        "max_depth": randint(2, 7),
+        "subsample": [0.7, 0.85, 1.0],
+        "min_samples_leaf": randint(1, 20),
+    },
+    "AdaBoostRegressor": {
+        "n_estimators": [50, 100, 200],
+        "learning_rate": loguniform(0.01, 1.0),
+        "loss": ["linear", "square", "exponential"],
+    },
+    "KNeighborsRegressor": {
+        "n_neighbors": randint(2, 30),
+        "weights": ["uniform", "distance"],
+        "p": [1, 2],
+    },
+}
+
+
+def curva(resultados, segundos):
+    """
+    Una fila por ronda: candidatos, recursos por candidato, recursos acumulados, segundos
+    de CPU acumulados (ajuste + puntuación de todos los pliegues), mejor R2 de la ronda
+    y mejor R2 hasta esa ronda.
+    """
+    rondas = resultados.groupby("iter").agg(
+        candidatos=("mean_test_score", "size"),
+        recursos=("n_resources", "first"),
+        cpu_s=("cpu_s", "sum"),
+        mejor_r2=("mean_test_score", "max"),
+    ).reset_index()
+    rondas["recursos_acumulados"] = (rondas["candidatos"] * rondas["recursos"]).cumsum()
+    rondas["cpu_s"] = rondas["cpu_s"].cumsum()
+    rondas["mejor_r2_acumulado"] = rondas["mejor_r2"].cummax()
+    rondas["segundos_total"] = segundos
+    return rondas
+
+
+def calendario(n_candidatos, factor, max_recursos, min_minimo):
+    """
+    (candidatos, recursos) de cada ronda, como `HalvingRandomSearchCV` con
+    `min_resources="exhaust"`: la última ronda usa `max_recursos`
+    """
+    rondas = 1 + int(math.floor(math.log(n_candidatos, factor) + 1e-9))
+    minimo = max(min_minimo, max_recursos // factor ** (rondas - 1))
+    rondas = min(rondas, 1 + int(math.floor(math.log(max_recursos / minimo, factor) + 1e-9)))
+    return [(math.ceil(n_candidatos / factor ** i), minimo * factor ** i) for i in range(rondas)]
+
+
+def _puntuar(modelo, rutas, filas_train, filas_test):
+    """R2 de un pliegue y segundos de ajuste + puntuación (en un proceso del pool)"""
+    X, y = np.load(rutas["X_train"], mmap_mode="r"), np.load(rutas["y_train"], mmap_mode="r")
+    inicio = time.perf_counter()
+    modelo.fit(X[filas_train], y[filas_train])
+    r2 = r2_score(y[filas_test], modelo.predict(X[filas_test]))
+    return r2, time.perf_counter() - inicio
+
+
+def _coste_ronda(segundos_uno, recursos_medidos, n_candidatos, recursos, pliegues, procesos):
+    """Segundos estimados de una ronda a partir de lo que tardó un ajuste con `recursos_medidos`"""
+    tareas = n_candidatos * pliegues
+    return segundos_uno * recursos / recursos_medidos * tareas / min(procesos, tareas)
+
+
+def _halving(modelo, espacio, rutas, n_filas, n_candidatos, factor, max_recursos, recurso, pliegues,
+             random_state, procesos, limite):
+    """
+    Rondas de successive halving de un modelo hasta terminar o hasta que la siguiente no
+    quepa antes de `limite` (instante de `time.perf_counter`, o None). La ronda 0 se estima
+    con un ajuste de un candidato: si no cabe, se prueban `factor` veces menos candidatos.
+    Devuelve los mejores parámetros y una fila por candidato y ronda, o None si ni un
+    candidato cabe en el tiempo.
+    """
+    candidatos = list(ParameterSampler(espacio, n_candidatos, random_state=random_state))
+    por_filas = recurso == "n_samples"
+    minimo = 2 * pliegues if por_filas else 1
+    # Filas en orden aleatorio fijo: cada ronda usa las primeras `recursos`, que incluyen las de la anterior
+    orden = np.random.RandomState(random_state).permutation(n_filas)
+    pliegues_cv = KFold(pliegues, shuffle=True, random_state=random_state)
+
+    def preparar_ronda(recursos):
+        subconjunto = orden[:recursos] if por_filas else orden
+        divisiones = [(subconjunto[a], subconjunto[b]) for a, b in pliegues_cv.split(subconjunto)]
+        return divisiones, {} if por_filas else {recurso: recursos}
+
+    rondas = calendario(len(candidatos), factor, max_recursos, minimo)
+    if limite is not None:
+        recursos_medidos = rondas[0][1]
+        divisiones, extra = preparar_ronda(recursos_medidos)
+        inicio = time.perf_counter()
+        _puntuar(clone(modelo).set_params(**candidatos[0], **extra), rutas, *divisiones[0])
+        segundos_uno = time.perf_counter() - inicio
+        while time.perf_counter() + _coste_ronda(segundos_uno, recursos_medidos, *rondas[0], pliegues,
+                                                 procesos) > limite:
+            if len(candidatos) == 1:
+                return None
+            candidatos = candidatos[:max(1, len(candidatos) // factor)]
+            rondas = calendario(len(candidatos), factor, max_recursos, minimo)
+
+    filas, mejores, anterior = [], None, None
+    for i, (n_ronda, recursos) in enumerate(rondas):
+        candidatos = candidatos[:n_ronda]
+        coste = n_ronda * recursos
+        if limite is not None and i > 0:
+            segundos_previos, coste_previo = anterior
+            if time.perf_counter() + segundos_previos * coste / coste_previo > limite:
+                print(f"  ronda {i} sin hacer: no cabe en el presupuesto")
+                break
+        divisiones, extra = preparar_ronda(recursos)
+
+        inicio = time.perf_counter()
+        puntos = Parallel(n_jobs=procesos)(
+            delayed(_puntuar)(clone(modelo).set_params(**params, **extra), rutas, a, b)
+            for params in candidatos for a, b in divisiones)
+        anterior = (time.perf_counter() - inicio, coste)
+
+        puntos = np.array(puntos).reshape(len(candidatos), len(divisiones), 2)
+        medias = puntos[:, :, 0].mean(axis=1)
+        filas += [{"iter": i, "n_resources": recursos, "mean_test_score": m, "cpu_s": c, "params": {**p, **extra}}
+                  for p, m, c in zip(candidatos, medias, puntos[:, :, 1].sum(axis=1))]
+        # Mejor primero, para que la siguiente ronda se quede con los `n` primeros
+        orden_puntos = np.argsort(-medias, kind="stable")
+        candidatos = [candidatos[k] for k in orden_puntos]
+        mejores = ({**candidatos[0], **extra}, float(medias[orden_puntos[0]]))
+        if limite is not None and time.perf_counter() > limite:
+            break
+    return mejores, pd.DataFrame(filas)
+
+
+def buscar(modelos, X, y, n_candidatos=32, factor=3, max_recursos=None, recurso="n_samples",
+           presupuesto_s=PRESUPUESTO_S, pliegues=3, test_size=0.2, random_state=42, procesos=None,
+           ruta_curva=RUTA_CURVA):
+    """
+    Successive halving para cada modelo de `modelos` con espacio en `ESPACIOS` (el resto
+    se salta). Con `recurso="n_estimators"` los ensembles crecen en árboles en vez de en
+    filas (hasta `max_recursos` árboles, 400 si no se indica); los modelos sin árboles
+    siempre usan filas. `presupuesto_s` limita el tiempo total de todas las búsquedas y se
+reparte entre los modelos.
+    Devuelve ({"<nombre> (halving)": mejor estimador sin entrenar}, curva).
+    """
+    _, _, rutas = preparar(X, y, test_size, random_state)
+    n_filas = len(np.load(rutas["y_train"], mmap_mode="r"))
+
+    mejores, curvas = {}, []
+    buscables = [(nombre, modelo) for nombre, modelo in modelos.items() if type(modelo).__name__ in ESPACIOS]
+    fin = None if presupuesto_s is None else time.perf_counter() + presupuesto_s
+    for i, (nombre, modelo) in enumerate(buscables):
+        # Cada modelo tiene su parte de lo que queda: lo que no gasta uno pasa a los siguientes
+        limite = None if fin is None else time.perf_counter() + (fin - time.perf_counter()) / (len(buscables) - i)
+        espacio = dict(ESPACIOS[type(modelo).__name__])
+        recurso_modelo = recurso if recurso in modelo.get_params() else "n_samples"
+        if recurso_modelo == "n_estimators":
+            espacio.pop("n_estimators", None)
+        maximo = max_recursos or (400 if recurso_modelo == "n_estimators" else n_filas)
+
+        inicio = time.perf_counter()
+        busqueda = _halving(modelo, espacio, rutas, n_filas, n_candidatos, factor, maximo, recurso_modelo, pliegues,
+                            random_state, procesos or PROCESOS, limite)
+        segundos = time.perf_counter() - inicio
+        if busqueda is None:
+            print(f"{nombre}: sin buscar, ni un candidato cabe en su parte del presupuesto ({segundos:.1f}s)")
+            continue
+        (params, r2), resultados = busqueda
+
+        # Con recurso="n_estimators", los parámetros ya traen los árboles de la última ronda hecha
+        mejores[f"{nombre} (halving)"] = clone(modelo).set_params(**params)
+        curvas.append(curva(resultados, segundos).assign(modelo=nombre, recurso=recurso_modelo))
+        print(f"{nombre}: R2 (cv) {r2:.4f} en {segundos:.1f}s, "
+              f"{resultados['iter'].nunique()} rondas -> {params}")
+
+    curvas = pd.concat(curvas, ignore_index=True) if curvas else pd.DataFrame()
+    if len(curvas):
+        os.makedirs(os.path.dirname(ruta_curva) or ".", exist_ok=True)
+        guardar(curvas, ruta_curva)
+    return mejores, curvas
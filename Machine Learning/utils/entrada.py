@@ -0,0 +1,133 @@
+"""
+Entrenamiento de las redes de 02_Redes_neuronales leyendo los lotes del Parquet en vez
+de cargar la tabla entera en pandas:
+
+- `lotes` lee los grupos de filas del Parquet (de `FILAS_GRUPO` filas, ver `comun.almacen`)
+  en paralelo con `tf.data` (interleave), baraja dentro de cada grupo y entre lotes, y
+  prepara los siguientes lotes mientras la red entrena (prefetch). En memoria solo hay
+  unos pocos grupos a la vez.
+- La partición entrenamiento/validación es la misma que la del notebook (`train_test_split`
+  con `random_state=42`), como una máscara de un byte por fila.
+- `entrenar` para con early stopping sobre `val_loss`, guarda el mejor modelo en `.keras`
+  cada vez que mejora y termina con los pesos de la mejor época.
+- `limitar_hilos` fija los hilos de TensorFlow para entrenar en CPU; hay que llamarlo
+  antes de crear ningún modelo.
+
+Uso desde el notebook:
+    from utils.entrada import limitar_hilos, lotes, entrenar
+    limitar_hilos()
+    history = entrenar(model, 'datos_limpios_modelo_10cols.parquet', 'modelos/mejor_red.keras')
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import tensorflow as tf
+from sklearn.model_selection import train_test_split
+
+OBJETIVO = "precio_contado"
+HILOS = int(os.environ.get("RED_HILOS", 0)) or os.cpu_count() or 1
+LOTE = 1024
+# Lotes que se barajan entre sí, además de las filas dentro de cada grupo
+LOTES_BARAJADOS = 64
+
+
+def limitar_hilos(hilos=None):
+    """Hilos de TensorFlow: `hilos` para cada operación y 2 para ejecutar operaciones a la vez"""
+    hilos = hilos or HILOS
+    tf.config.threading.set_intra_op_parallelism_threads(hilos)
+    tf.config.threading.set_inter_op_parallelism_threads(min(2, hilos))
+    return hilos
+
+
+def columnas(ruta, objetivo=OBJETIVO):
+    return [c for c in pq.ParquetFile(ruta).schema_arrow.names if c != objetivo]
+
+
+def mascara_entrenamiento(ruta, test_size=0.2, random_state=42):
+    """True en las filas de entrenamiento, con la misma partición que `train_test_split` sobre la tabla"""
+    filas = pq.ParquetFile(ruta).metadata.num_rows
+    entrenamiento, _ = train_test_split(np.arange(filas), test_size=test_size, random_state=random_state)
+    mascara = np.zeros(filas, dtype=bool)
+    mascara[entrenamiento] = True
+    return mascara
+
+
+def lotes(ruta, mascara, lote=LOTE, barajar=True, objetivo=OBJETIVO, hilos=None, semilla=42):
+    """
+    tf.data.Dataset de (X, y) en float32 con las filas de `mascara`, leyendo el Parquet
+    por grupos de filas. Con `barajar`, cada época sale en otro orden.
+    """
+    archivo = pq.ParquetFile(ruta)
+    nombres = columnas(ruta, objetivo)
+    inicios = np.cumsum([0] + [archivo.metadata.row_group(g).num_rows for g in range(archivo.num_row_groups)])
+    rng = np.random.default_rng(semilla)
+
+    def grupo(g):
+        g = int(g)
+        tabla = pq.ParquetFile(ruta).read_row_group(g, columns=nombres + [objetivo])
+        filas = mascara[inicios[g]:inicios[g + 1]]
+        X = np.column_stack([tabla.column(c).to_numpy(zero_copy_only=False) for c in nombres])
+        X = X.astype(np.float32)[filas]
+        y = tabla.column(objetivo).to_numpy(zero_copy_only=False).astype(np.float32)[filas]
+        if barajar:
+            orden = rng.permutation(len(y))
+            X, y = X[orden], y[orden]
+        for i in range(0, len(y), lote):
+            yield X[i:i + lote], y[i:i + lote]
+
+    firma = (tf.TensorSpec(shape=(None, len(nombres)), dtype=tf.float32),
+             tf.TensorSpec(shape=(None,), dtype=tf.float32))
+    grupos = np.arange(archivo.num_row_groups)
+    datos = tf.data.Dataset.from_tensor_slices(grupos)
+    if barajar:
+        datos = datos.shuffle(len(grupos), seed=semilla, reshuffle_each_iteration=True)
+    datos = datos.interleave(
+        lambda g: tf.data.Dataset.from_generator(grupo, args=(g,), output_signature=firma),
+        cycle_length=min(len(grupos), 4), num_parallel_calls=tf.data.AUTOTUNE, deterministic=not barajar,
+    )
+    if barajar:
+        datos = datos.shuffle(LOTES_BARAJADOS, seed=semilla, reshuffle_each_iteration=True)
+
+    opciones = tf.data.Options()
+    opciones.threading.private_threadpool_size = hilos or HILOS
+    return datos.prefetch(tf.data.AUTOTUNE).with_options(opciones)
+
+
+def entrenar(modelo, ruta, ruta_mejor, lote=LOTE, epocas=200, paciencia=10, verbose=1):
+    """
+    Entrena `modelo` (ya compilado) con los lotes de `ruta` hasta que `val_loss` no mejora
+    en `paciencia` épocas. El mejor modelo se va guardando en `ruta_mejor` (.keras) y el
+    modelo acaba con los pesos de la mejor época.
+    """
+    mascara = mascara_entrenamiento(ruta)
+    entrenamiento = lotes(ruta, mascara, lote)
+    validacion = lotes(ruta, ~mascara, lote * 4, barajar=False)
+    os.makedirs(os.path.dirname(ruta_mejor) or ".", exist_ok=True)
+    return modelo.fit(
+        entrenamiento, validation_data=validacion, epochs=epocas, verbose=verbose,
+        callbacks=[
+            tf.keras.callbacks.EarlyStopping(monitor="val_loss", patience=paciencia, restore_best_weights=True),
+            tf.keras.callbacks.ModelCheckpoint(ruta_mejor, monitor="val_loss", save_best_only=True),
+        ],
+    )
+
+
+def probar_lotes(crear_modelo, ruta, tamanos=(256, 512, 1024, 2048, 4096), epocas=3):
+    """
+    Segundos por época y `val_loss` tras `epocas` épocas para cada tamaño de lote, con un
+    modelo nuevo de `crear_modelo()` en cada prueba. Sirve para elegir `lote` en `entrenar`.
+    """
+    mascara = mascara_entrenamiento(ruta)
+    validacion = lotes(ruta, ~mascara, 4096, barajar=False)
+    resultados = []
+    for tamano in tamanos:
+        modelo = crear_modelo()
+        inicio = time.perf_counter()
+        history = modelo.fit(lotes(ruta, mascara, tamano), validation_data=validacion, epochs=epocas, verbose=0)
+        segundos = (time.perf_counter() - inicio) / epocas
+        resultados.append({"lote": tamano, "segundos_epoca": segundos, "val_loss": history.history["val_loss"][-1]})
+        print(f"lote {tamano:>5}: {segundos:6.2f}s por época, val_loss {history.history['val_loss'][-1]:.2f}")
+    return pd.DataFrame(resultados)
@@ -0,0 +1,174 @@
+"""
+Selección de modelos para 01_Machine_learning: entrena los candidatos en paralelo
+(joblib, un proceso por candidato) y guarda una tabla de métricas con MAE, MSE, RMSE,
+R2, tiempo de ajuste y latencia de predicción.
+
+- La partición train/test (mismo `train_test_split` que el notebook) y las matrices de
+  cada conjunto de columnas se guardan en `CARPETA_CACHE` como arrays de NumPy; los
+  procesos las abren con mmap en vez de recibir una copia cada uno.
+- Cada resultado se identifica por la huella del candidato (clase, parámetros y versión
+  de scikit-learn), la de los datos (contenido de X e y) y la de la partición. Si ya
+  está en la tabla, el candidato no se vuelve a entrenar.
+- Los ajustes van en paralelo, así que `ajuste_s` depende de cuántos candidatos se
+  entrenaban a la vez: cada fila guarda `procesos` e `hilos`. Las predicciones y la
+  latencia se miden después, de una en una en el proceso principal, sin nada más corriendo.
+
+Uso desde el notebook (con la carpeta `Machine Learning` como directorio de trabajo):
+    from utils.seleccion import evaluar
+    resultados = evaluar(modelos, X, y, "todas")
+"""
+import os
+import time
+import hashlib
+
+import numpy as np
+import pandas as pd
+import joblib
+import sklearn
+from joblib import Parallel, delayed, parallel_config
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from comun.almacen import leer, guardar
+
+CARPETA_CACHE = "cache_seleccion"
+RUTA_METRICAS = os.path.join("metricas", "seleccion_modelos.parquet")
+PROCESOS = int(os.environ.get("SELECCION_PROCESOS", 0)) or os.cpu_count() or 1
+# Predicciones de una sola fila para medir la latencia (la mediana), como en el Predictor
+REPETICIONES_LATENCIA = 20
+METRICAS = ["MAE", "MSE", "RMSE", "R2"]
+
+
+def huella_datos(X, y):
+    """Hash del contenido de X (con los nombres de columna) e y"""
+    h = hashlib.sha1()
+    h.update(repr(list(X.columns)).encode())
+    h.update(pd.util.hash_pandas_object(X, index=False).to_numpy().tobytes())
+    h.update(pd.util.hash_pandas_object(pd.Series(y), index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def huella_modelo(modelo):
+    """Hash de la clase y los parámetros del candidato (sin entrenar) y de la versión de scikit-learn"""
+    return joblib.hash((sklearn.__version__, type(modelo).__module__, type(modelo).__name__,
+                        modelo.get_params(deep=True)))[:16]
+
+
+def preparar(X, y, test_size=0.2, random_state=42, carpeta=CARPETA_CACHE):
+    """
+    Rutas de X_train, X_test, y_train, y_test en la caché (las crea si no están). La
+    partición depende solo del número de filas, así que se comparte entre conjuntos de columnas.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    particion = f"{len(X)}_{test_size}_{random_state}"
+    ruta_indices = os.path.join(carpeta, f"particion_{particion}.npz")
+    if not os.path.exists(ruta_indices):
+        entrenamiento, prueba = train_test_split(np.arange(len(X)), test_size=test_size, random_state=random_state)
+        np.savez(ruta_indices, entrenamiento=entrenamiento, prueba=prueba)
+    indices = np.load(ruta_indices)
+
+    datos = huella_datos(X, y)
+    rutas = {nombre: os.path.join(carpeta, f"{datos}_{particion}_{nombre}.npy")
+             for nombre in ["X_train", "X_test", "y_train", "y_test"]}
+    if not all(os.path.exists(ruta) for ruta in rutas.values()):
+        matriz = X.to_numpy(dtype=float)
+        objetivo = np.asarray(y, dtype=float)
+        for nombre, filas in [("train", indices["entrenamiento"]), ("test", indices["prueba"])]:
+            np.save(rutas[f"X_{nombre}"], np.ascontiguousarray(matriz[filas]))
+            np.save(rutas[f"y_{nombre}"], objetivo[filas])
+    return datos, particion, rutas
+
+
+def _cargar(rutas):
+    return (np.load(rutas[n], mmap_mode="r") for n in ["X_train", "X_test", "y_train", "y_test"])
+
+
+def _ajustar(modelo, rutas):
+    """Entrena una copia de `modelo` (en un proceso del pool); devuelve el modelo y el tiempo de ajuste"""
+    X_train, _, y_train, _ = _cargar(rutas)
+    modelo = clone(modelo)
+    inicio = time.perf_counter()
+    modelo.fit(X_train, y_train)
+    return modelo, time.perf_counter() - inicio
+
+
+def _medir(nombre, modelo, ajuste, rutas):
+    """Métricas y tiempos de predicción de un modelo ya entrenado, medidos sin otros ajustes a la vez"""
+    _, X_test, _, y_test = _cargar(rutas)
+    inicio = time.perf_counter()
+    y_pred = modelo.predict(X_test)
+    prediccion = time.perf_counter() - inicio
+
+    fila = X_test[:1]
+    latencias = []
+    for _ in range(REPETICIONES_LATENCIA):
+        inicio = time.perf_counter()
+        modelo.predict(fila)
+        latencias.append(time.perf_counter() - inicio)
+
+    mse = mean_squared_error(y_test, y_pred)
+    return {
+        "modelo": nombre,
+        "MAE": mean_absolute_error(y_test, y_pred),
+        "MSE": mse,
+        "RMSE": np.sqrt(mse),
+        "R2": r2_score(y_test, y_pred),
+        "ajuste_s": ajuste,
+        "prediccion_us_fila": prediccion / len(X_test) * 1e6,
+        "latencia_ms": np.median(latencias) * 1e3,
+    }
+
+
+def cargar_metricas(ruta=RUTA_METRICAS):
+    return leer(ruta) if os.path.exists(ruta) else pd.DataFrame()
+
+
+def evaluar(modelos, X, y, conjunto, test_size=0.2, random_state=42, procesos=None,
+            carpeta=CARPETA_CACHE, ruta_metricas=RUTA_METRICAS):
+    """
+    Métricas de cada candidato de `modelos` ({nombre: estimador}) sobre X, y, indexadas por
+    nombre. Solo se entrenan los que no están ya en la tabla de `ruta_metricas` con la
+    misma huella de modelo, datos y partición; los nuevos se añaden a la tabla.
+    `conjunto` es una etiqueta para la tabla ("todas", "top10"...).
+    """
+    datos, particion, rutas = preparar(X, y, test_size, random_state, carpeta)
+    tabla = cargar_metricas(ruta_metricas)
+    claves = {nombre: (huella_modelo(modelo), datos, particion) for nombre, modelo in modelos.items()}
+    vistas = set()
+    if len(tabla):
+        vistas = set(zip(tabla["huella_modelo"], tabla["huella_datos"], tabla["particion"]))
+    pendientes = [nombre for nombre, clave in claves.items() if clave not in vistas]
+
+    if pendientes:
+        # Un candidato por proceso y los núcleos repartidos entre ellos (los modelos con
+        # hilos, como HistGradientBoosting, usan los suyos), para no repartirlos dos veces
+        n_jobs = min(procesos or PROCESOS, len(pendientes))
+        hilos = max(1, (os.cpu_count() or 1) // n_jobs)
+        with parallel_config(backend="loky", inner_max_num_threads=hilos):
+            ajustados = Parallel(n_jobs=n_jobs)(delayed(_ajustar)(modelos[nombre], rutas) for nombre in pendientes)
+        nuevos = pd.DataFrame([_medir(nombre, modelo, ajuste, rutas)
+                               for nombre, (modelo, ajuste) in zip(pendientes, ajustados)])
+        nuevos["procesos"] = n_jobs
+        nuevos["hilos"] = hilos
+        nuevos["version_sklearn"] = sklearn.__version__
+        nuevos["conjunto"] = conjunto
+        nuevos["huella_modelo"] = [claves[nombre][0] for nombre in nuevos["modelo"]]
+        nuevos["huella_datos"] = datos
+        nuevos["particion"] = particion
+        nuevos["fecha"] = pd.Timestamp.now()
+        tabla = pd.concat([tabla, nuevos], ignore_index=True) if len(tabla) else nuevos
+        os.makedirs(os.path.dirname(ruta_metricas) or ".", exist_ok=True)
+        guardar(tabla, ruta_metricas)
+
+    # Cada nombre con su resultado (el último, si el mismo candidato se evaluó con otro nombre)
+    por_clave = tabla.drop_duplicates(["huella_modelo", "huella_datos", "particion"], keep="last")
+    por_clave = por_clave.set_index(["huella_modelo", "huella_datos", "particion"])
+    resultados = pd.DataFrame([por_clave.loc[clave] for clave in claves.values()], index=list(claves))
+    resultados.index.name = "modelo"
+    resultados["en_cache"] = [nombre not in pendientes for nombre in claves]
+
+    for nombre, r in resultados.iterrows():
+        print(f"{nombre} -> MAE: {r.MAE:.2f}, MSE: {r.MSE:.2f}, RMSE: {r.RMSE:.2f}, R2: {r.R2:.4f}, "
+              f"ajuste: {r.ajuste_s:.2f}s, latencia: {r.latencia_ms:.2f}ms" + (" (caché)" if r.en_cache else ""))
+    return resultados[METRICAS + ["ajuste_s", "prediccion_us_fila", "latencia_ms", "en_cache"]]
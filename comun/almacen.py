@@ -0,0 +1,109 @@
+"""
+Almacén de las tablas que se pasan entre etapas (`datos_limpios`, `datos_limpios_modelo`,
+`datos_limpios_modelo_10cols`) en Parquet: cada columna con su tipo (enteros con
+nulos, fechas...), los textos repetidos como categoría (un diccionario por columna
+en el fichero) y compresión zstd. Al leer se pide solo las columnas que se usan y
+el resto ni se descomprime.
+
+Los CSV del crawl (`anuncios_unificados1.csv`, `anuncios_completo.csv`) siguen siendo
+CSV porque se escriben añadiendo filas, pero también se leen con `leer` para cargar
+solo las columnas necesarias.
+
+Uso desde un notebook o una página (la carpeta raíz del proyecto tiene que estar en `sys.path`):
+    from comun.almacen import leer, guardar
+    df = leer("datos_limpios.parquet", columnas=["modelo", "combustible"])
+
+Desde la carpeta raíz:
+    python -m comun.almacen Limpieza/datos_limpios.csv             # lo pasa a Parquet
+    python -m comun.almacen Limpieza/datos_limpios.csv --comparar  # tamaño y tiempos frente al CSV
+"""
+import os
+import time
+import argparse
+
+import pandas as pd
+
+COMPRESION = "zstd"
+# Columnas de texto con menos de esta proporción de valores distintos se guardan como categoría
+PROPORCION_CATEGORIA = 0.5
+# Filas por grupo del Parquet: se pueden leer grupos sueltos (y en paralelo) sin abrir el resto
+FILAS_GRUPO = 100_000
+
+
+def columnas_categoricas(df):
+    """Columnas de texto con muchos valores repetidos (marca, combustible, ubicación...)"""
+    categoricas = []
+    for columna in df.columns:
+        serie = df[columna]
+        if (pd.api.types.is_object_dtype(serie) or pd.api.types.is_string_dtype(serie)) and len(serie):
+            if serie.nunique() < PROPORCION_CATEGORIA * len(serie):
+                categoricas.append(columna)
+    return categoricas
+
+
+def guardar(df, ruta, compresion=COMPRESION):
+    """Guarda `df` en Parquet (sin índice), con los textos repetidos como categoría"""
+    tabla = df.copy(deep=False)
+    for columna in columnas_categoricas(tabla):
+        tabla[columna] = tabla[columna].astype("category")
+    tabla.to_parquet(ruta, engine="pyarrow", compression=compresion, index=False, row_group_size=FILAS_GRUPO)
+    return ruta
+
+
+def leer(ruta, columnas=None, categorias=False):
+    """
+    Tabla guardada con `guardar` (o un CSV) con solo las `columnas` pedidas.
+    Con `categorias=False` las categorías vuelven como texto, igual que al leer el CSV.
+    """
+    if ruta.endswith(".csv"):
+        return pd.read_csv(ruta, usecols=columnas)
+    df = pd.read_parquet(ruta, engine="pyarrow", columns=columnas)
+    if not categorias:
+        for columna in df.columns:
+            if isinstance(df[columna].dtype, pd.CategoricalDtype):
+                df[columna] = df[columna].astype(df[columna].cat.categories.dtype)
+    return df
+
+
+def convertir(ruta_csv, ruta_parquet=None):
+    """Pasa un CSV ya limpio (p. ej. el de `utils.por_lotes` o `utils.incremental`) a Parquet"""
+    ruta_parquet = ruta_parquet or os.path.splitext(ruta_csv)[0] + ".parquet"
+    return guardar(pd.read_csv(ruta_csv), ruta_parquet)
+
+
+def _tiempo(funcion, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def comparar(ruta_csv, columnas=None, repeticiones=3):
+    """Tamaño y tiempo de carga (mejor de `repeticiones`) del CSV frente a su Parquet"""
+    ruta_parquet = convertir(ruta_csv)
+    columnas = columnas or pd.read_csv(ruta_csv, nrows=0).columns[:4].tolist()
+    mb_csv, mb_parquet = os.path.getsize(ruta_csv) / 2**20, os.path.getsize(ruta_parquet) / 2**20
+    print(f"{ruta_csv}: {mb_csv:8.1f} MB   {ruta_parquet}: {mb_parquet:8.1f} MB   x{mb_csv / mb_parquet:5.1f}")
+
+    resultados = {"csv_mb": round(mb_csv, 1), "parquet_mb": round(mb_parquet, 1)}
+    for nombre, cols in [("todas las columnas", None), (", ".join(columnas), columnas)]:
+        t_csv = _tiempo(lambda: leer(ruta_csv, cols), repeticiones)
+        t_parquet = _tiempo(lambda: leer(ruta_parquet, cols), repeticiones)
+        print(f"   {nombre:<50} CSV: {t_csv:6.2f}s   Parquet: {t_parquet:6.2f}s   x{t_csv / t_parquet:5.1f}")
+        resultados[nombre] = {"csv_s": round(t_csv, 3), "parquet_s": round(t_parquet, 3)}
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Paso de CSV a Parquet y comparación de tamaños y tiempos")
+    parser.add_argument("csv", nargs="+")
+    parser.add_argument("--comparar", action="store_true")
+    parser.add_argument("--columnas", nargs="+", default=None, help="columnas para medir la lectura parcial")
+    args = parser.parse_args()
+    for ruta in args.csv:
+        if args.comparar:
+            comparar(ruta, args.columnas)
+        else:
+            print(f"{ruta} -> {convertir(ruta)}")
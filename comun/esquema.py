@@ -0,0 +1,84 @@
+"""
+Esquema compacto de una tabla de vehículos (datos limpios o `vehiculos` de MySQL):
+
+- textos con pocos valores distintos (marca, modelo, ubicación...) como categoría
+- enteros al tipo más pequeño que los contiene; si tienen nulos, float32 (exacto hasta 2**24)
+- decimales (que de MySQL llegan como `Decimal`) a float64, o float32 si no se pierde nada;
+  el precio siempre en float64, porque sus medias (target encoding, gráficos) se
+  calculan en el tipo de la columna
+- banderas 0/1 como booleanos
+
+Las columnas que no están en el esquema se dejan como vienen.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORICAS = ["marca", "modelo", "ubicacion", "combustible", "transmision", "tipo_carroceria"]
+ENTEROS = ["id", "año_matriculacion", "mes_matriculacion", "kilometraje", "potencia_cv", "puertas", "asientos",
+           "garantia", "combustible_id", "ubicacion_id", "transmision_id", "tipo_carroceria_id"]
+DECIMALES = ["latitud", "longitud"]
+PRECIOS = ["precio_contado"]
+BANDERAS = ["es_demo", "es_km0", "financiacion_disponible"]
+
+# Mayor entero que float32 representa sin saltos
+LIMITE_FLOAT32 = 2**24
+
+
+def memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def _entero(serie):
+    serie = pd.to_numeric(serie, errors="coerce")
+    if serie.isna().any():
+        enteros = serie.dropna()
+        if (enteros == enteros.round()).all() and (enteros.abs() < LIMITE_FLOAT32).all():
+            return serie.astype(np.float32)
+        return serie.astype(float)
+    if (serie == serie.round()).all():
+        return pd.to_numeric(serie.astype(np.int64), downcast="integer")
+    return serie
+
+
+def _decimal(serie):
+    serie = pd.to_numeric(serie, errors="coerce").astype(float)
+    reducida = serie.astype(np.float32)
+    if ((reducida.astype(float) == serie) | serie.isna()).all():
+        return reducida
+    return serie
+
+
+def _precio(serie):
+    return pd.to_numeric(serie, errors="coerce").astype(float)
+
+
+def _bandera(serie):
+    serie = pd.to_numeric(serie, errors="coerce")
+    if serie.notna().all() and serie.isin([0, 1]).all():
+        return serie.astype(bool)
+    return _entero(serie)
+
+
+def compactar(df):
+    """
+    Copia de `df` con los tipos del esquema. En `attrs["memoria_mb"]` deja
+    (MB antes, MB después) para poder mostrar lo que se ha ahorrado.
+    """
+    antes = memoria_mb(df)
+    df = df.copy()
+    for columnas, convertir in [(ENTEROS, _entero), (DECIMALES, _decimal), (PRECIOS, _precio),
+                                 (BANDERAS, _bandera)]:
+        for columna in columnas:
+            if columna in df.columns:
+                df[columna] = convertir(df[columna])
+    for columna in CATEGORICAS:
+        if columna in df.columns:
+            df[columna] = df[columna].astype("category")
+    df.attrs["memoria_mb"] = (antes, memoria_mb(df))
+    return df
+
+
+def resumen_memoria(df):
+    """ "12.3 MB -> 2.1 MB (-83%)" a partir de lo que deja `compactar` """
+    antes, despues = df.attrs.get("memoria_mb", (memoria_mb(df),) * 2)
+    return f"{antes:.1f} MB -> {despues:.1f} MB ({(despues - antes) / antes:+.0%})" if antes else "0 MB"
@@ -0,0 +1,186 @@
+"""
+Imputación por vecinos que escala casi en lineal, para tablas en las que `KNNImputer`
+(distancias de cada fila con huecos contra todas las filas) tarda demasiado.
+
+Las filas con huecos se agrupan por patrón (qué columnas faltan). Para cada patrón y
+cada columna que falta, los donantes son las filas de entrenamiento que tienen esa
+columna y todas las que la fila sí tiene, y se buscan con un KD-tree (scipy) sobre las
+columnas escaladas (media 0, desviación 1): cada consulta cuesta O(log n) en vez de O(n).
+El valor imputado es la media de los `vecinos` donantes más cercanos, como `KNNImputer`
+con pesos uniformes. Una fila sin ninguna columna conocida recibe la media.
+
+Como mes, puertas o asientos toman pocos valores, muchos donantes son el mismo punto: el
+árbol se hace sobre los puntos distintos (con los valores de sus primeros donantes), y
+así los empates no lo degradan. De cada punto se toman sus primeros donantes en el orden
+de la tabla.
+
+Con `segmentos` (p. ej. la marca) los donantes se buscan solo dentro del mismo segmento;
+si el segmento tiene menos de `vecinos` donantes se busca en toda la tabla.
+
+Benchmark frente a `KNNImputer` (desde la carpeta raíz):
+    python -m comun.imputacion Limpieza/datos_limpios.parquet --filas 10000 50000 200000
+"""
+import time
+import argparse
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from comun.almacen import leer
+
+
+class ImputadorKNNArbol:
+    """Misma interfaz que `KNNImputer` (`fit`/`transform` sobre matrices), con KD-trees por patrón"""
+
+    def __init__(self, vecinos=3, escalar=True):
+        self.vecinos = vecinos
+        self.escalar = escalar
+
+    def fit(self, X, segmentos=None):
+        self.X_ = np.asarray(X, dtype=float)
+        self.media_ = np.nanmean(self.X_, axis=0)
+        escala = np.nanstd(self.X_, axis=0) if self.escalar else np.ones(self.X_.shape[1])
+        self.escala_ = np.where(escala > 0, escala, 1.0)
+        self.segmentos_ = None if segmentos is None else np.asarray(segmentos, dtype=object)
+        self._arboles = {}
+        return self
+
+    def __getstate__(self):
+        # Los árboles se rehacen al usarlos: no se guardan en el pickle
+        estado = self.__dict__.copy()
+        estado["_arboles"] = {}
+        return estado
+
+    def _escalada(self, X):
+        return (X - self.media_) / self.escala_
+
+    def _donantes(self, observadas, columna, segmento):
+        """
+        KD-tree de los puntos donantes distintos (None si no hay donantes o columnas para
+        comparar), cuántos donantes tiene cada punto (hasta `vecinos`) y la suma acumulada
+        de los valores de `columna` de esos donantes.
+        """
+        clave = (observadas, columna, segmento)
+        if clave not in self._arboles:
+            filas = ~np.isnan(self.X_[:, [columna, *observadas]]).any(axis=1)
+            if segmento is not None:
+                en_segmento = filas & (self.segmentos_ == segmento)
+                if en_segmento.sum() >= self.vecinos:
+                    filas = en_segmento
+            donantes = self.X_[filas]
+            if not observadas or not len(donantes):
+                self._arboles[clave] = (None, None, None)
+                return self._arboles[clave]
+
+            puntos, punto = np.unique(self._escalada(donantes)[:, list(observadas)], axis=0, return_inverse=True)
+            punto = punto.ravel()
+            orden = np.argsort(punto, kind="stable")
+            inicio = np.searchsorted(punto[orden], np.arange(len(puntos)))
+            rango = np.arange(len(orden)) - inicio[punto[orden]]
+            primeros = rango < self.vecinos
+            valores = np.zeros((len(puntos), self.vecinos))
+            valores[punto[orden][primeros], rango[primeros]] = donantes[orden[primeros], columna]
+            acumulados = np.hstack([np.zeros((len(puntos), 1)), valores.cumsum(axis=1)])
+            cuentas = np.minimum(np.bincount(punto, minlength=len(puntos)), self.vecinos)
+            self._arboles[clave] = (cKDTree(puntos), cuentas, acumulados)
+        return self._arboles[clave]
+
+    def _media_vecinos(self, arbol, cuentas, acumulados, consultas):
+        """Media de los `vecinos` donantes más cercanos, recorriendo los puntos de más cerca a más lejos"""
+        k = min(self.vecinos, arbol.n)
+        _, cercanos = arbol.query(consultas, k=k)
+        cercanos = cercanos.reshape(len(consultas), k)
+        suma = np.zeros(len(consultas))
+        tomados = np.zeros(len(consultas), dtype=int)
+        for i in range(k):
+            # Del i-ésimo punto más cercano, los donantes que faltan para llegar a `vecinos`
+            n = np.minimum(cuentas[cercanos[:, i]], self.vecinos - tomados)
+            suma += acumulados[cercanos[:, i], n]
+            tomados += n
+        return suma / tomados
+
+    def transform(self, X, segmentos=None):
+        X = np.array(X, dtype=float)
+        huecos = np.isnan(X)
+        filas = np.flatnonzero(huecos.any(axis=1))
+        if not len(filas):
+            return X
+        patrones = huecos[filas] @ (1 << np.arange(X.shape[1]))
+        grupos = pd.DataFrame({"patron": patrones})
+        if segmentos is not None and self.segmentos_ is not None:
+            grupos["segmento"] = np.asarray(segmentos, dtype=object)[filas]
+        escalada = self._escalada(X)
+
+        for clave, posiciones in grupos.groupby(list(grupos.columns), sort=False, dropna=False).indices.items():
+            segmento = clave[1] if isinstance(clave, tuple) and len(clave) > 1 else None
+            segmento = None if pd.isna(segmento) else segmento
+            f = filas[posiciones]
+            observadas = tuple(np.flatnonzero(~huecos[f[0]]))
+            for columna in np.flatnonzero(huecos[f[0]]):
+                arbol, cuentas, acumulados = self._donantes(observadas, columna, segmento)
+                if arbol is None:
+                    X[f, columna] = self.media_[columna]
+                else:
+                    X[f, columna] = self._media_vecinos(arbol, cuentas, acumulados, escalada[np.ix_(f, observadas)])
+        return X
+
+    def fit_transform(self, X, segmentos=None):
+        return self.fit(X, segmentos).transform(X, segmentos)
+
+
+def _medir(funcion):
+    """Resultado, segundos y pico de memoria (MB) reservada por Python/NumPy"""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    pico = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+def comparar(df, tamanos, fraccion_oculta=0.1, max_exacto=60_000, segmento="marca", semilla=0):
+    """
+    Oculta `fraccion_oculta` de los valores conocidos, los imputa con `KNNImputer` y con
+    `ImputadorKNNArbol` (global y por `segmento`) y compara error medio, tiempo y memoria.
+    `KNNImputer` solo se ejecuta hasta `max_exacto` filas.
+    """
+    from sklearn.impute import KNNImputer
+    from comun.preprocesado import NUMERICAS_KNN
+
+    rng = np.random.default_rng(semilla)
+    resultados = []
+    for n in tamanos:
+        muestra = df.iloc[rng.integers(0, len(df), n)].reset_index(drop=True)
+        reales = muestra[NUMERICAS_KNN].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        ocultos = ~np.isnan(reales) & (rng.random(reales.shape) < fraccion_oculta)
+        X = np.where(ocultos, np.nan, reales)
+        segmentos = muestra[segmento].astype(object).to_numpy() if segmento in muestra.columns else None
+
+        metodos = {"arbol": lambda: ImputadorKNNArbol().fit_transform(X)}
+        if segmentos is not None:
+            metodos[f"arbol por {segmento}"] = lambda: ImputadorKNNArbol().fit_transform(X, segmentos)
+        if n <= max_exacto:
+            metodos = {"KNNImputer": lambda: KNNImputer(n_neighbors=3).fit_transform(X), **metodos}
+
+        print(f"{n:>9} filas   ({ocultos.sum()} valores ocultos)")
+        for nombre, funcion in metodos.items():
+            imputada, segundos, pico = _medir(funcion)
+            errores = {c: np.abs(np.round(imputada[:, i]) - reales[:, i])[ocultos[:, i]].mean()
+                       for i, c in enumerate(NUMERICAS_KNN)}
+            print(f"   {nombre:<20} {segundos:8.2f}s   {pico:8.1f} MB   error medio: "
+                  + "  ".join(f"{c} {e:.2f}" for c, e in errores.items()))
+            resultados.append({"filas": n, "metodo": nombre, "segundos": round(segundos, 2),
+                               "pico_mb": round(pico, 1), **{c: round(e, 3) for c, e in errores.items()}})
+    return pd.DataFrame(resultados)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Imputación KNN con KD-trees frente a KNNImputer")
+    parser.add_argument("datos", help="datos limpios (.parquet o .csv)")
+    parser.add_argument("--filas", type=int, nargs="+", default=[10_000, 50_000, 200_000])
+    parser.add_argument("--max-exacto", type=int, default=60_000, help="hasta cuántas filas se ejecuta KNNImputer")
+    args = parser.parse_args()
+    comparar(leer(args.datos), args.filas, max_exacto=args.max_exacto)
@@ -0,0 +1,153 @@
+"""
+Preprocesado de los modelos de precio como un solo objeto: lo que 02_limpieza_modelo
+hacía con pickles sueltos (imputadores, target encoding, one hot y escalado) se ajusta
+con `ajustar` y se guarda en un único fichero versionado. El Predictor carga ese mismo
+fichero, así que entrenamiento y predicción usan exactamente las mismas columnas y en
+el mismo orden.
+
+`transformar` pasa de registros de vehículos (una fila o miles) a la matriz escalada
+del modelo de una vez: cada columna se calcula directamente en su hueco de la matriz,
+sin construir DataFrames intermedios.
+
+Con `imputacion="arbol"` los huecos numéricos se rellenan con `ImputadorKNNArbol`
+(KD-trees, casi lineal) en vez de `KNNImputer`, que compara cada fila con huecos con
+todas las demás; con `segmento="marca"` los vecinos se buscan dentro de la misma marca.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+from sklearn.impute import SimpleImputer, KNNImputer
+from sklearn.preprocessing import StandardScaler
+
+from comun.imputacion import ImputadorKNNArbol
+
+# Cambia si cambia lo que guarda o cómo transforma: los ficheros de otra versión no se cargan
+VERSION = 2
+RUTA_PREPROCESADO = "preprocesado_precio.pkl"
+
+OBJETIVO = "precio_contado"
+CATEGORICAS = ["combustible", "transmision", "tipo_carroceria"]
+NUMERICAS_KNN = ["mes_matriculacion", "potencia_cv", "puertas", "asientos"]
+CODIFICADAS = ["marca", "modelo"]
+ONE_HOT = ["combustible", "tipo_carroceria"]
+TRANSMISION = {"Manual": 0, "Automático": 1}
+IMPUTACIONES = ["knn", "arbol"]
+# Las 10 columnas con más peso en la regresión lineal (01_Machine_learning)
+COLUMNAS_MODELO = [
+    "modelo_te", "kilometraje", "potencia_cv", "año_matriculacion",
+    "combustible_Diésel", "tipo_carroceria_Deportivo", "transmision_bin",
+    "combustible_Eléctrico", "financiacion_disponible",
+    "combustible_Híbrido Enchufable",
+]
+
+
+class PreprocesadoPrecio:
+    """Imputación, codificación y escalado de las columnas del modelo de precio"""
+
+    def __init__(self, columnas=COLUMNAS_MODELO, vecinos=3, imputacion="knn", segmento=None):
+        if imputacion not in IMPUTACIONES:
+            raise ValueError(f"imputacion tiene que ser una de {IMPUTACIONES}, no {imputacion!r}")
+        if segmento is not None and imputacion != "arbol":
+            raise ValueError("segmento solo se puede usar con imputacion='arbol'")
+        self.columnas = list(columnas)
+        self.vecinos = vecinos
+        self.imputacion = imputacion
+        self.segmento = segmento
+        self.version = VERSION
+
+    def _rellenar(self, df):
+        """Columnas categóricas con la moda del entrenamiento (como object, para comparar)"""
+        return {c: df[c].astype(object).where(df[c].notna(), self.modas[c]).to_numpy() if c in df.columns
+                else np.full(len(df), self.modas[c], dtype=object) for c in CATEGORICAS}
+
+    def _knn(self, df):
+        """
+        Columnas de `NUMERICAS_KNN` imputadas y redondeadas. Solo pasan por el KNN las filas
+        con huecos en las columnas que usa el modelo (en el Predictor, ninguna).
+        """
+        numericas = np.column_stack([pd.to_numeric(df[c], errors="coerce").to_numpy(dtype=float)
+                                     if c in df.columns else np.full(len(df), np.nan) for c in NUMERICAS_KNN])
+        usadas = [i for i, c in enumerate(NUMERICAS_KNN) if c in self.columnas]
+        huecos = np.isnan(numericas[:, usadas]).any(axis=1)
+        if huecos.any():
+            if self.segmento:
+                segmentos = df[self.segmento].astype(object).to_numpy()[huecos] if self.segmento in df.columns else None
+                numericas[huecos] = self.knn.transform(numericas[huecos], segmentos)
+            else:
+                numericas[huecos] = self.knn.transform(numericas[huecos])
+        return {c: np.round(numericas[:, i]) for i, c in enumerate(NUMERICAS_KNN)}
+
+    def _matriz(self, df):
+        """Columnas de `self.columnas` sin escalar, en una matriz float64"""
+        categoricas = self._rellenar(df)
+        numericas = self._knn(df) if any(c in NUMERICAS_KNN for c in self.columnas) else {}
+        X = np.empty((len(df), len(self.columnas)))
+        for j, columna in enumerate(self.columnas):
+            if columna in numericas:
+                X[:, j] = numericas[columna]
+            elif columna.endswith("_te"):
+                origen = columna[:-3]
+                posiciones = self.codificacion[origen].index.get_indexer(df[origen].astype(object))
+                X[:, j] = np.append(self.codificacion[origen].to_numpy(dtype=float), np.nan)[posiciones]
+            elif columna == "transmision_bin":
+                X[:, j] = pd.Series(categoricas["transmision"]).map(TRANSMISION).to_numpy(dtype=float)
+            elif columna in self.one_hot:
+                origen, categoria = self.one_hot[columna]
+                X[:, j] = categoricas[origen] == categoria
+            else:
+                X[:, j] = pd.to_numeric(df[columna], errors="coerce").to_numpy(dtype=float)
+        return X
+
+    def ajustar(self, df):
+        """Ajusta cada paso sobre los datos limpios, en el orden de 02_limpieza_modelo"""
+        self.modas = {}
+        for columna in CATEGORICAS:
+            imputador = SimpleImputer(strategy="most_frequent").fit(df[[columna]].astype(object))
+            self.modas[columna] = imputador.statistics_[0]
+
+        numericas = df[NUMERICAS_KNN].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+        if self.imputacion == "arbol":
+            segmentos = df[self.segmento].astype(object).to_numpy() if self.segmento else None
+            self.knn = ImputadorKNNArbol(vecinos=self.vecinos).fit(numericas, segmentos)
+        else:
+            self.knn = KNNImputer(n_neighbors=self.vecinos).fit(numericas)
+
+        objetivo = df[OBJETIVO].astype(float)
+        self.codificacion = {c: objetivo.groupby(df[c].astype(object)).mean() for c in CODIFICADAS}
+
+        categoricas = self._rellenar(df)
+        self.one_hot = {f"{c}_{categoria}": (c, categoria)
+                        for c in ONE_HOT for categoria in sorted(set(categoricas[c]))}
+        desconocidas = [c for c in self.columnas if c not in self.one_hot and c not in df.columns
+                        and not c.endswith("_te") and c != "transmision_bin"]
+        if desconocidas:
+            raise ValueError(f"Columnas del modelo que no salen de los datos: {desconocidas}")
+
+        # Por columnas, como cuando se ajustaba desde el DataFrame: las medias salen idénticas
+        self.escalador = StandardScaler().fit(np.asfortranarray(self._matriz(df)))
+        return self
+
+    def transformar(self, df, como_df=False):
+        """Matriz escalada del modelo (columnas en el orden de `self.columnas`)"""
+        X = self._matriz(df)
+        X -= self.escalador.mean_
+        X /= self.escalador.scale_
+        if como_df:
+            return pd.DataFrame(X, columns=self.columnas, index=df.index)
+        return X
+
+    def guardar(self, ruta=RUTA_PREPROCESADO):
+        with open(ruta, "wb") as f:
+            pickle.dump(self, f)
+        return ruta
+
+
+def cargar_preprocesado(ruta=RUTA_PREPROCESADO):
+    """Preprocesado guardado con `PreprocesadoPrecio.guardar`; falla si es de otra versión"""
+    with open(ruta, "rb") as f:
+        preprocesado = pickle.load(f)
+    if getattr(preprocesado, "version", None) != VERSION:
+        raise ValueError(f"{ruta} es de la versión {getattr(preprocesado, 'version', None)} del preprocesado "
+                         f"y esta es la {VERSION}: hay que volver a ejecutar 02_limpieza_modelo")
+    return preprocesado
@@ -0,0 +1,53 @@
+"""
+Reglas para sacar los campos tipados de las listas `tags`, `precios` y `detalles_ficha`
+de un anuncio: combustibles y carrocerías conocidos, textos de cada precio y patrones
+de la ficha. Las usan tanto la extracción (`Extraccion/utils/campos.py`, al guardar
+cada anuncio) como la limpieza (`Limpieza/utils/listas.py`, para CSV antiguos que
+solo traen las listas), así que los dos sitios clasifican igual.
+"""
+import re
+import unicodedata
+
+COMBUSTIBLES = {"Gasolina", "Diésel", "Eléctrico", "Híbrido", "Híbrido Enchufable", "Gas"}
+
+# Columna -> texto con el que empieza su precio en la lista `precios`
+CLAVES_PRECIO = {
+    "precio_contado": "Precio al contado:",
+    "precio_financiado": "Precio financiado:",
+    "precio_nuevo": "Precio de venta nuevo*",
+}
+
+# Texto de la ficha -> tipo de carrocería
+CARROCERIAS = {
+    "Descapotable o convertible": "Descapotable",
+    "Descapotable": "Descapotable",
+    "Berlina mediana o grande": "Berlina",
+    "Berlina": "Berlina",
+    "Deportivo o coupé": "Deportivo",
+    "Deportivo": "Deportivo",
+    "Coupé": "Deportivo",
+}
+for _tipo in ["Todo Terreno", "Stationwagon", "Monovolumen", "SUV", "Familiar", "Pickup", "4x4",
+              "4x4, SUV o pickup", "Pequeño", "Sedán", "Hatchback", "Convertible"]:
+    CARROCERIAS[_tipo] = _tipo
+
+RE_AÑO = re.compile(r"^\d{4}$")
+RE_KM = re.compile(r"^([\d\.]+) km$")
+RE_KM0 = re.compile(r"km[\s_]?0$")
+RE_NUMERO = re.compile(r"[\d\.]+")
+RE_GARANTIA_NO = re.compile(r"Garantía:\s*No", re.IGNORECASE)
+RE_GARANTIA_SI = re.compile(r"Garantía:\s*Sí", re.IGNORECASE)
+RE_GARANTIA_MESES = re.compile(r"Garantía:\s*(\d+)\s*meses?", re.IGNORECASE)
+RE_MATRICULACION = re.compile(r"Matriculado: (\d{2}/\d{4})")
+RE_MES = re.compile(r"Matriculado:\s*(\d{2})/\d{4}")
+RE_POTENCIA = re.compile(r"(\d+)\s?cv", re.IGNORECASE)
+RE_PUERTAS = re.compile(r"(\d+)\sPuertas")
+RE_ASIENTOS = re.compile(r"(\d+)\s?asientos", re.IGNORECASE)
+
+
+def normalizar_texto(texto):
+    """Sin tildes, en minúsculas y sin espacios en los extremos: "Automático " -> "automatico" """
+    return "".join(
+        c for c in unicodedata.normalize("NFKD", texto)
+        if not unicodedata.combining(c)
+    ).lower().strip()
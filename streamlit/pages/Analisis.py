@@ -4,7 +4,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import plotly.express as px
 from sklearn.preprocessing import MinMaxScaler
-from utils.database import fetch_data
+from utils.database import fetch_data, resumen_memoria
 from dotenv import load_dotenv
 import os           
 from decimal import Decimal
@@ -47,6 +47,7 @@ def main():
         FROM vehiculos v
         LEFT JOIN transmisiones t ON v.transmision_id = t.id;
         """)
+    st.sidebar.caption(f"Memoria de los datos (esquema compacto): {resumen_memoria(df)}")
     
     
     # Pestaña 1: Outliers en precios
@@ -194,7 +195,8 @@ def main():
         
         # Mostrar outliers por marca en un gráfico de barras
         st.subheader("Outliers por Marca")
-        marcas_outliers = outliers_log['marca'].value_counts().reset_index()
+        # La marca es categórica: value_counts cuenta también las marcas sin outliers (con 0)
+        marcas_outliers = outliers_log['marca'].value_counts()[lambda conteo: conteo > 0].reset_index()
         marcas_outliers.columns = ['Marca', 'Número de Outliers']
         
         fig_marcas = px.bar(
@@ -270,7 +272,7 @@ def main():
         
         with tab2_2:
             # Calcular precios promedio por antigüedad y marca
-            df_avg = df_top.groupby(['marca', 'antiguedad'], as_index=False).agg({
+            df_avg = df_top.groupby(['marca', 'antiguedad'], as_index=False, observed=True).agg({
                 'precio_contado': 'mean',
                 'kilometraje': 'mean'
             })
@@ -404,7 +406,7 @@ def main():
 
         with tab3:
             # Agrupar por bins de kilometraje
-            df_grouped = df_top7.groupby(['marca', 'kilometraje_bin'], as_index=False).agg({
+            df_grouped = df_top7.groupby(['marca', 'kilometraje_bin'], as_index=False, observed=True).agg({
                 'precio_normalizado': ['mean', 'std'],
                 'kilometraje': 'mean',
                 'precio_contado': 'median'
@@ -542,7 +544,7 @@ def main():
         df_top10 = df[df['marca'].isin(top_10_marcas)]
         
         # Ordenar marcas por precio promedio (de mayor a menor)
-        marca_order = df_top10.groupby('marca')['precio_contado'].mean().sort_values(ascending=False).index
+        marca_order = df_top10.groupby('marca', observed=True)['precio_contado'].mean().sort_values(ascending=False).index
         
         # Crear pestañas para diferentes visualizaciones
         tab4_1, tab4_2 = st.tabs(["Precios Promedio", "Distribución Completa"])
@@ -550,7 +552,7 @@ def main():
         with tab4_1:
             # Gráfico de barras de precios promedio ordenado
             fig4a = px.bar(
-                df_top10.groupby('marca', as_index=False)['precio_contado'].mean().sort_values('precio_contado', ascending=False),
+                df_top10.groupby('marca', as_index=False, observed=True)['precio_contado'].mean().sort_values('precio_contado', ascending=False),
                 x='marca',
                 y='precio_contado',
                 title='<b>Precio Promedio por Marca (Top 10)</b>',
@@ -582,7 +584,7 @@ def main():
             # Mostrar tabla con datos
             st.subheader("Datos Detallados")
             st.dataframe(
-                df_top10.groupby('marca')['precio_contado'].agg(['mean', 'median', 'count', 'min', 'max'])
+                df_top10.groupby('marca', observed=True)['precio_contado'].agg(['mean', 'median', 'count', 'min', 'max'])
                 .sort_values('mean', ascending=False)
                 .rename(columns={
                     'mean': 'Precio Promedio',
@@ -637,13 +639,13 @@ def main():
             st.metric("Precio promedio total", f"{avg_price:,.2f} €")
         
         with col2:
-            max_brand = df_top10.groupby('marca')['precio_contado'].mean().idxmax()
-            max_price = df_top10.groupby('marca')['precio_contado'].mean().max()
+            max_brand = df_top10.groupby('marca', observed=True)['precio_contado'].mean().idxmax()
+            max_price = df_top10.groupby('marca', observed=True)['precio_contado'].mean().max()
             st.metric("Marca más premium", max_brand, f"{max_price:,.2f} €")
         
         with col3:
-            min_brand = df_top10.groupby('marca')['precio_contado'].mean().idxmin()
-            min_price = df_top10.groupby('marca')['precio_contado'].mean().min()
+            min_brand = df_top10.groupby('marca', observed=True)['precio_contado'].mean().idxmin()
+            min_price = df_top10.groupby('marca', observed=True)['precio_contado'].mean().min()
             st.metric("Marca más accesible", min_brand, f"{min_price:,.2f} €")
         
         st.markdown("""
@@ -6,7 +6,7 @@ import os
 from PIL import Image
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
-from utils.database import fetch_data
+from utils.database import fetch_data, resumen_memoria
 
 
 df = fetch_data("""
@@ -35,17 +35,28 @@ with st.expander("🔍 COMPARADOR DE VEHÍCULOS", expanded=True):
     
     for col, dtype in numeric_cols.items():
         if col in df_clean.columns:
-            # Convertir a string primero para manejar casos especiales
-            df_clean[col] = pd.to_numeric(df_clean[col].astype(str).str.replace(',', '.'), errors='coerce')
-            # Rellenar NaN con la mediana
-            df_clean[col] = df_clean[col].fillna(df_clean[col].median()).astype(dtype)
+            serie = df_clean[col]
+            # Solo lo que llega como texto pasa por string (comas decimales); las numéricas
+            # del esquema compacto se quedan con su tipo (float32 sigue siendo float32)
+            if not pd.api.types.is_numeric_dtype(serie):
+                serie = pd.to_numeric(serie.astype(str).str.replace(',', '.'), errors='coerce')
+            # Rellenar NaN con la mediana; los enteros al tipo más pequeño, como en el esquema compacto
+            serie = serie.fillna(serie.median())
+            if dtype is int:
+                serie = pd.to_numeric(serie.astype(int), downcast="integer")
+            elif serie.dtype.kind != 'f':
+                serie = serie.astype(float)
+            df_clean[col] = serie
     
+    st.sidebar.caption(f"Memoria de los datos (esquema compacto): {resumen_memoria(df_clean)}")
+
     # Calcular antigüedad
     df_clean['antiguedad'] = 2025 - df_clean['año_matriculacion']
     
     # Obtener lista única de vehículos (marca + modelo)
-    df_clean['marca_modelo'] = df_clean['marca'] + ' ' + df_clean['modelo']
-    vehiculos_unicos = df_clean['marca_modelo'].unique()
+    # Como object, una marca o un modelo que falta deja NaN (y no sale en el selector) en vez de "nan"
+    df_clean['marca_modelo'] = df_clean['marca'].astype(object) + ' ' + df_clean['modelo'].astype(object)
+    vehiculos_unicos = df_clean['marca_modelo'].dropna().unique()
     
     # Selectores para elegir los vehículos a comparar
     col1, col2 = st.columns(2)
@@ -1,3 +1,5 @@
+import os
+import sys
 import streamlit as st
 import pickle
 import pandas as pd
@@ -5,6 +7,10 @@ import numpy as np
 from tensorflow import keras
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from comun.almacen import leer
+from comun.preprocesado import cargar_preprocesado
+
 def get_metric_value(metrics_dict, key, default=0):
     value = metrics_dict.get(key, default)
     if isinstance(value, (list, np.ndarray)):
@@ -14,9 +20,14 @@ def get_metric_value(metrics_dict, key, default=0):
 # Configuración de la página
 st.set_page_config(page_title="Predictor de Precios", layout="wide")
 
-# Cargar y limpiar dataframe
+# Cargar y limpiar dataframe (solo las columnas de los desplegables, una vez por sesión)
+@st.cache_data
+def load_options_data():
+    return leer('C:\\Users\\abner\\proyecto\\Proyecto-\\DB\\datos_limpios.parquet',
+                columnas=['modelo', 'combustible', 'tipo_carroceria', 'transmision'])
+
 try:
-    df_2 = pd.read_csv('C:\\Users\\abner\\proyecto\\Proyecto-\\DB\\datos_limpios.csv')
+    df_2 = load_options_data()
     df_2 = df_2.dropna(subset=['combustible', 'tipo_carroceria', 'transmision'])
 
     df_d = df_2['modelo'].unique().tolist()
@@ -28,6 +39,12 @@ except Exception as e:
     st.error(f"Error al cargar los datos: {str(e)}")
     st.stop()
 
+# Ficheros que hay que copiar a la carpeta streamlit después de entrenar, siempre juntos:
+# - preprocesado_precio.pkl: Limpieza/encoders/preprocesado_precio.pkl (02_limpieza_modelo)
+# - mejor_modelo_top.pkl: Machine Learning/modelos/mejor_modelo_top.pkl (01_Machine_learning)
+# - modelo_red_neuronal_mae.keras: Machine Learning/modelos/modelo_red_neuronal_mae.keras (02_Redes_neuronales)
+# Los dos modelos tienen que estar entrenados con la matriz de ese mismo preprocesado: si se
+# vuelve a ejecutar 02_limpieza_modelo, hay que volver a entrenarlos y copiar los tres.
 @st.cache_resource
 def load_models_and_metrics():
     try:
@@ -36,17 +53,8 @@ def load_models_and_metrics():
 
         dl_model = keras.models.load_model('C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\modelo_red_neuronal_mae.keras')
 
-        with open("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\ohe_combustible.pkl", "rb") as f:
-            ohe_combustible = pickle.load(f)
-
-        with open("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\target_encoding_modelo.pkl", "rb") as f:
-            target_encoding_modelo = pickle.load(f)
-
-        with open("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\ohe_tipo_carroceria.pkl", "rb") as f:
-            ohe_tipo_carroceria = pickle.load(f)
-
-        with open("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\standard_scaler.pkl", "rb") as f:
-            scaler = pickle.load(f)
+        # Imputación, codificación y escalado: el mismo objeto que se ajustó en 02_limpieza_modelo
+        preprocesado = cargar_preprocesado("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\preprocesado_precio.pkl")
 
         with open("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\metricas_modelo_ml.pkl", "rb") as f:
             metricas_ml = pickle.load(f)
@@ -54,13 +62,13 @@ def load_models_and_metrics():
         with open("C:\\Users\\abner\\proyecto\\Proyecto-\\streamlit\\metricas_modelo_dl.pkl", "rb") as f:
             metricas_dl = pickle.load(f)
 
-        return ml_model, dl_model, ohe_combustible, target_encoding_modelo, ohe_tipo_carroceria, scaler, metricas_ml, metricas_dl
+        return ml_model, dl_model, preprocesado, metricas_ml, metricas_dl
 
     except Exception as e:
         st.error(f"Error al cargar los modelos o métricas: {str(e)}")
-        return None, None, None, None, None, None, None, None
+        return None, None, None, None, None
 
-ml_model, dl_model, ohe_combustible, target_encoding_modelo, ohe_tipo_carroceria, scaler, metricas_ml, metricas_dl = load_models_and_metrics()
+ml_model, dl_model, preprocesado, metricas_ml, metricas_dl = load_models_and_metrics()
 
 # Mostrar especificaciones del modelo
 if ml_model and dl_model and metricas_ml and metricas_dl:
@@ -118,35 +126,7 @@ with tab1:
                 'financiacion_disponible': [financiacion_disponible]
             })
 
-            input_usuario['modelo_te'] = input_usuario['modelo'].map(target_encoding_modelo)
-
-            combustible_encoded = ohe_combustible.transform(input_usuario[['combustible']])
-            combustible_cols = [f"combustible_{cat}" for cat in ohe_combustible.categories_[0]]
-            df_combustible = pd.DataFrame(combustible_encoded, columns=combustible_cols, index=input_usuario.index)
-            input_usuario = pd.concat([input_usuario, df_combustible], axis=1)
-            input_usuario.drop(columns=['combustible'], inplace=True)
-
-            tipo_carroceria_encoded = ohe_tipo_carroceria.transform(input_usuario[['tipo_carroceria']])
-            tipo_carroceria_cols = [f"tipo_carroceria_{cat}" for cat in ohe_tipo_carroceria.categories_[0]]
-            df_tipo_carroceria = pd.DataFrame(tipo_carroceria_encoded, columns=tipo_carroceria_cols, index=input_usuario.index)
-            input_usuario = pd.concat([input_usuario, df_tipo_carroceria], axis=1)
-            input_usuario.drop(columns=['tipo_carroceria'], inplace=True)
-
-            input_usuario['transmision_bin'] = input_usuario['transmision'].apply(lambda x: 1 if x == 'Automática' else 0).astype(int)
-            input_usuario['financiacion_disponible'] = input_usuario['financiacion_disponible'].astype(int)
-
-            column_order = [
-                'modelo_te', 'kilometraje', 'potencia_cv', 'año_matriculacion',
-                'combustible_Diésel', 'tipo_carroceria_Deportivo', 'transmision_bin',
-                'combustible_Eléctrico', 'financiacion_disponible',
-                'combustible_Híbrido Enchufable'
-            ]
-            for col in column_order:
-                if col not in input_usuario.columns:
-                    input_usuario[col] = 0
-            input_usuario = input_usuario[column_order]
-
-            input_data = scaler.transform(input_usuario)
+            input_data = preprocesado.transformar(input_usuario)
 
             precio_ml = ml_model.predict(input_data)[0]
             precio_dl = dl_model.predict(input_data)[0][0]
@@ -1,8 +1,13 @@
 import csv
+import os
+import sys
 import mysql.connector
 from mysql.connector import Error
 import pandas as pd
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from comun.esquema import compactar, resumen_memoria
+
 
 config = {
     'user': 'root', # nombre de usuario
@@ -21,7 +26,11 @@ def create_connection():
         print(f"Error al conectar a MySQL: {e}")
         return None
     
-def fetch_data(query):
+def fetch_data(query, compacto=True):
+    """
+    Resultado de la query en un DataFrame; con `compacto`, con los tipos de `comun/esquema.py`.
+    La memoria que ocupa la muestra cada página con `resumen_memoria`.
+    """
     conn = create_connection()
     if conn is None:
         return None
@@ -36,7 +45,9 @@ def fetch_data(query):
     cursor.close()
     conn.close()
     df = pd.DataFrame(data, columns=column_names)
-    
+    if compacto:
+        df = compactar(df)
+
     return df 
 
 fetch_data("""